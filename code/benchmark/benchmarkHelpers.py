@@ -0,0 +1,107 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "clean"))
+import glob
+import json
+import time
+import cleanHelpers
+
+"""
+    Shared helpers for the micro benchmarks in this directory.
+
+    The benchmarks run on the dstat10 fixtures (tests/dstat10). These only
+    hold titles and descriptions, the file name being the ANZSRC division of
+    the records. loadFixtureDocuments turns them into DataCite-like documents
+    with a deterministic mix of subjects (ANZSRC, DDC, bepress and free
+    keywords), so the clean step can be exercised without a harvest.
+"""
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+FIXTURE_DIR = os.path.join(BASE_DIR, "tests", "dstat10")
+CONFIG_FILE = os.path.join(os.path.dirname(BASE_DIR), "config", "m_config.json")
+
+ANZSRC_URI = ("http://www.abs.gov.au/ausstats/abs@.nsf/0/"
+              "6BB427AB9696C225CA2574180004463E")
+BEPRESS_SCHEME = "bepress Digital Commons Three-Tiered Taxonomy"
+
+def getBenchmarkConfig(path=CONFIG_FILE):
+    """
+        Loads a configuration without the side effects of util.loadConfig
+        (no directories, no copies, no logger)
+
+        Arguments
+            path: string path to the configuration file
+
+        Returns dictionary with the configuration and the compiled regexes
+    """
+    with open(path, "r") as f:
+        config = json.load(f)
+    config["regex"] = cleanHelpers.compileRegexes(config)
+    return config
+
+def getSubjects(division, idx, title):
+    words = title.split()
+    return [
+        {
+            "subjectScheme": "ANZSRC",
+            "schemeURI": ANZSRC_URI,
+            "value": "{:02d}{:02d}01 Fixture".format(division, idx % 10)
+        },
+        {
+            "subjectScheme": "ddc",
+            "value": "{:03d}".format((division * 37 + idx * 11) % 1000)
+        },
+        {
+            "subjectScheme": BEPRESS_SCHEME,
+            "value": " ".join(words[:3])
+        },
+        {
+            "value": words[0] if words else ""
+        }
+    ]
+
+def loadFixtureDocuments(fixtureDir=FIXTURE_DIR):
+    """
+        Converts the dstat10 fixtures to DataCite-like documents
+
+        Arguments
+            fixtureDir: directory with the <division>.data.json files
+
+        Returns list of dictionaries
+    """
+    documents = []
+    for fileName in sorted(glob.glob(os.path.join(fixtureDir, "*.data.json"))):
+        division = int(os.path.basename(fileName).split(".")[0])
+        with open(fileName, "r") as f:
+            records = json.load(f)
+        for idx, (doi, record) in enumerate(sorted(records.items())):
+            documents.append({
+                "identifier": {"value": doi, "identifierType": "DOI"},
+                "titles": [{"value": record["title"]}],
+                "descriptions": [{"value": record["description"]}],
+                "subjects": getSubjects(division, idx, record["title"])
+            })
+    return documents
+
+def timeIt(name, function, repeat, items):
+    """
+        Runs function repeat times and prints the throughput
+
+        Arguments
+            name: string to print
+            function: callable without arguments
+            repeat: number of runs
+            items: number of items processed per run
+
+        Returns the result of the last run
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    elapsed = time.perf_counter() - start
+    print("{:<30} {:>10.3f} s {:>14.0f} items/s".format(
+        name,
+        elapsed,
+        repeat * items / elapsed if elapsed else float("inf")
+    ))
+    return result
@@ -0,0 +1,63 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import argparse
+import benchmarkHelpers
+import numpy as np
+import pandas as pd
+import util.util as util
+
+"""
+    Compares the best label assignment of conquer before (util.int2bv and
+    util.getBestLabel applied row by row) and after (util.labels2bm and
+    util.getBestLabels) on random label bit masks.
+"""
+
+def getLabels(rows, seed):
+    """
+        Returns random label bit masks, most of them with a single label
+    """
+    rng = np.random.default_rng(seed)
+    labels = 2 ** rng.integers(1, 21, rows)
+    for _ in range(3):
+        labels |= np.where(rng.random(rows) < 0.2, 2 ** rng.integers(1, 21, rows), 0)
+    return labels
+
+def getSsf(labels):
+    return [int((labels == 2**i).sum()) for i in range(1,21)]
+
+def current(labels):
+    df = pd.DataFrame({"labels": labels})
+    ssf = pd.Series(getSsf(labels))
+    df['labelsI'] = df.labels.apply(lambda x: util.int2bv(x, 21)[1:]).tolist()
+    df['bl'] = df.labelsI.apply(lambda x: util.getBestLabel(ssf, x))
+    df['nol'] = df.labelsI.apply(lambda x: sum(x))
+    return df.bl.values, df.nol.values
+
+def vectorized(labels):
+    ssf = np.array(getSsf(labels), dtype=np.int64)
+    return util.getBestLabels(ssf, util.labels2bm(labels))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='BENCHMARK best label assignment'
+    )
+    parser.add_argument('--rows',
+            default     = 100000,
+            type        = int,
+            help        ="Number of label bit masks")
+    parser.add_argument('--seed',
+            default     = 1234,
+            type        = int,
+            help        ="Seed of the random label bit masks")
+    args = parser.parse_args()
+
+    labels = getLabels(args.rows, args.seed)
+    print("{} rows, {} with more than one label".format(
+        args.rows,
+        int((util.labels2bm(labels).sum(axis=1) > 1).sum())
+    ))
+    (bl, nol) = benchmarkHelpers.timeIt("int2bv/getBestLabel", lambda: current(labels), 1, args.rows)
+    (vbl, vnol) = benchmarkHelpers.timeIt("labels2bm/getBestLabels", lambda: vectorized(labels), 1, args.rows)
+    if not (np.array_equal(bl, vbl) and np.array_equal(nol, vnol)):
+        print("Results differ!")
+        sys.exit(1)
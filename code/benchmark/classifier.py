@@ -0,0 +1,56 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import argparse
+import benchmarkHelpers
+import cleanHelpers
+from cleanClassifierHelpers import SchemeClassifier
+
+"""
+    Compares cleanHelpers.getLabel (scheme tester chain plus one regex per
+    label) with the precompiled cleanClassifierHelpers.SchemeClassifier on
+    the subjects of the dstat10 fixtures.
+"""
+
+def classifyAll(getLabel, rows, subjects):
+    return [getLabel(subject, row) for (subject, row) in zip(subjects, rows)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='BENCHMARK scheme classification of subjects'
+    )
+    parser.add_argument('--config',
+            default     = benchmarkHelpers.CONFIG_FILE,
+            help        ="File with the configuration for the cleaning run")
+    parser.add_argument('--repeat',
+            default     = 50,
+            type        = int,
+            help        ="Number of passes over the fixtures")
+    args = parser.parse_args()
+
+    config = benchmarkHelpers.getBenchmarkConfig(args.config)
+    subjects = []
+    for document in benchmarkHelpers.loadFixtureDocuments():
+        subjects.extend(document["subjects"])
+    classifier = SchemeClassifier(config)
+    currentRows = [cleanHelpers.initResultRow(config) for _ in subjects]
+    compiledRows = [cleanHelpers.initResultRow(config) for _ in subjects]
+
+    print("{} subjects, {} passes".format(len(subjects), args.repeat))
+    current = benchmarkHelpers.timeIt(
+        "cleanHelpers.getLabel",
+        lambda: classifyAll(
+            lambda subject, row: cleanHelpers.getLabel(config, subject, row),
+            currentRows,
+            subjects),
+        args.repeat,
+        len(subjects)
+    )
+    compiled = benchmarkHelpers.timeIt(
+        "SchemeClassifier.getLabel",
+        lambda: classifyAll(classifier.getLabel, compiledRows, subjects),
+        args.repeat,
+        len(subjects)
+    )
+    if current != compiled or currentRows != compiledRows:
+        print("Results differ!")
+        sys.exit(1)
@@ -0,0 +1,69 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+import argparse
+import gzip
+import io
+import json
+import benchmarkHelpers
+import util.jsonBackends as jsonBackends
+
+"""
+    Compares the parser layer of clean (util.jsonBackends) on the dstat10
+    fixtures: documents per second for each available ijson backend on a
+    retrieved json file, for each codec on the lines of a store chunk and for
+    each codec serializing a .chunk.json output.
+"""
+
+def getAvailableBackends():
+    backends = []
+    for name in jsonBackends.IJSON_BACKENDS:
+        try:
+            backends.append(jsonBackends.getIjsonBackend(name))
+        except ImportError:
+            continue
+    return backends
+
+def getAvailableCodecs():
+    codecs = []
+    for name in jsonBackends.CODECS:
+        try:
+            codecs.append(jsonBackends.JsonCodec(name))
+        except ImportError:
+            continue
+    return codecs
+
+def parseDocuments(backend, data):
+    return sum(1 for _ in backend.items(io.BytesIO(data), "documents.item"))
+
+def parseLines(codec, data):
+    return sum(1 for line in gzip.decompress(data).splitlines() if codec.loads(line))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='BENCHMARK json backends of clean'
+    )
+    parser.add_argument('--repeat',
+            default     = 5,
+            type        = int,
+            help        ="Number of runs per backend")
+    parser.add_argument('--copies',
+            default     = 10,
+            type        = int,
+            help        ="Number of copies of the fixture documents")
+    args = parser.parse_args()
+
+    documents = benchmarkHelpers.loadFixtureDocuments() * args.copies
+    n = len(documents)
+    retrieved = json.dumps({"documents": documents}).encode("utf-8")
+    store = gzip.compress("\n".join(json.dumps(d) for d in documents).encode("utf-8"))
+    print("{} documents, {:.1f} MB json".format(n, len(retrieved) / 2**20))
+
+    for backend in getAvailableBackends():
+        benchmarkHelpers.timeIt("ijson " + backend.backend_name,
+            lambda: parseDocuments(backend, retrieved), args.repeat, n)
+    for codec in getAvailableCodecs():
+        benchmarkHelpers.timeIt("store lines " + codec.name,
+            lambda: parseLines(codec, store), args.repeat, n)
+    for codec in getAvailableCodecs():
+        benchmarkHelpers.timeIt("chunk dumps " + codec.name,
+            lambda: codec.dumps({"documents": documents}), args.repeat, n)
@@ -5,19 +5,22 @@ import glob
 import json
 import re
 import util.util as util
+import util.table as table
+import util.jsonBackends as jsonBackends
 import hashlib
 import cleanHelpers
+import cleanClassifierHelpers
+import cleanConquerHelpers
+import cleanManifestHelpers
+import cleanFollowHelpers
+import cleanSplitHelpers
+import cleanDuplicateHelpers
 import pandas as pd
 import numpy as np
-import gc
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 from langdetect.detector_factory import init_factory
 from langdetect import DetectorFactory
-from nltk.stem.lancaster import LancasterStemmer
-from nltk.stem.porter import PorterStemmer
-import nltk
 from random import randint
-import string
 
 """
     The script is divided in three parts:
@@ -47,12 +50,133 @@ def prepare():
     parser.add_argument('--worker',
             default    =  3,
             help        ="Number of workers")
+    parser.add_argument('--labelCacheSize',
+            default    =  2**18,
+            help        ="Number of subjects each worker caches the label of"
+                         " (0 disables the cache)")
+    parser.add_argument('--persistLabelCache',
+            action     = "store_true",
+            help        ="Keep the label cache between runs (per mappingHash)")
+    parser.add_argument('--langCacheSize',
+            default    =  2**16,
+            help        ="Number of texts each worker caches the language of"
+                         " (0 disables the cache)")
+    parser.add_argument('--langBatchSize',
+            default    =  1000,
+            help        ="Number of documents detected as one batch")
+    parser.add_argument('--batchSize',
+            default    =  100000,
+            help        ="Number of rows combined as one batch")
+    parser.add_argument('--formats',
+            default    =  "csv,parquet",
+            help        ="Comma separated formats of result and useable"
+                         " ({})".format(", ".join(table.FORMATS)))
+    parser.add_argument('--incremental',
+            action     = "store_true",
+            help        ="Only re-clean chunks whose retrieved file or mapping"
+                         " changed (cf. manifest.json) and reuse the parts of"
+                         " the others in conquer. Retrieved files are only"
+                         " hashed with this flag, so touched files with the"
+                         " same content are recognized once a run with it"
+                         " recorded their hashes")
+    parser.add_argument('--ijsonBackend',
+            default    =  "auto",
+            choices    =  ("auto", ) + jsonBackends.IJSON_BACKENDS,
+            help        ="ijson backend to stream json files with (auto: fastest available)")
+    parser.add_argument('--jsonCodec',
+            default    =  "auto",
+            choices    =  ("auto", ) + jsonBackends.CODECS,
+            help        ="Codec for store lines and the worker output (auto: orjson if available)")
+    parser.add_argument('--follow',
+            action     = "store_true",
+            help        ="Clean retrieved files as soon as they appear, until"
+                         " retrieve has finished (pipelined with retrieve)")
+    parser.add_argument('--followInterval',
+            default    =  10,
+            help        ="Seconds between two scans for retrieved files with --follow")
+    parser.add_argument('--stemCacheSize',
+            default    =  100000,
+            help        ="Maximum number of tokens whose stems are cached per"
+                         " worker (0 disables the cache)")
+    parser.add_argument('--payloadIndexDir',
+            default    =  None,
+            help        ="Keep the index of the payload hashes for duplicates in"
+                         " memory-mapped files in this directory (default: in memory)")
+    parser.add_argument('--nearDuplicates',
+            action     = "store_true",
+            help        ="Also remove near-duplicate payloads (MinHash/LSH,"
+                         " reported in nearDuplicates.json)")
+    parser.add_argument('--nearDuplicateThreshold',
+            default    =  0.8,
+            help        ="Minimal estimated Jaccard similarity of the payload"
+                         " shingles of near-duplicates")
+    parser.add_argument('--minhashPermutations',
+            default    =  128,
+            help        ="Number of hash functions of the MinHash signatures")
+    parser.add_argument('--lshBands',
+            default    =  16,
+            help        ="Number of LSH bands, must divide --minhashPermutations")
+    parser.add_argument('--shingleSize',
+            default    =  5,
+            help        ="Length of the payload shingles in bytes")
+    parser.add_argument('--splitSize',
+            default    =  256,
+            help        ="Clean retrieved files larger than this (MB) in parts"
+                         " on several workers (0: never split)")
     args = parser.parse_args()
 
     config = util.loadConfig(args.config)
     # This should be the only output, allowing to tail the log
     config["logger"] = util.setupLogging(config, "clean")
     config["worker"] = int(args.worker)
+    config["incremental"] = args.incremental
+    config["json"] = {
+        "ijson": args.ijsonBackend,
+        "codec": args.jsonCodec
+    }
+    try:
+        config["logger"].info("Using ijson backend {} and codec {}".format(
+            *jsonBackends.getJsonBackends(config).getNames()))
+    except ImportError as e:
+        config["logger"].error("JSON backend not available: {}".format(e))
+        os.sys.exit(1)
+    config["follow"] = {
+        "enabled": args.follow,
+        "interval": float(args.followInterval)
+    }
+    config["split"] = {
+        "size": int(float(args.splitSize) * 2**20)
+    }
+    config["stemCache"] = {
+        "size": int(args.stemCacheSize)
+    }
+    config["payloadIndex"] = {
+        "directory": args.payloadIndexDir
+    }
+    config["nearDuplicates"] = {
+        "enabled": args.nearDuplicates,
+        "threshold": float(args.nearDuplicateThreshold),
+        "permutations": int(args.minhashPermutations),
+        "bands": int(args.lshBands),
+        "shingleSize": int(args.shingleSize)
+    }
+    if config["nearDuplicates"]["permutations"] % config["nearDuplicates"]["bands"]:
+        config["logger"].error("--lshBands must divide --minhashPermutations")
+        os.sys.exit(1)
+    config["labelCache"] = {
+        "size": int(args.labelCacheSize),
+        "persist": args.persistLabelCache
+    }
+    config["batchSize"] = int(args.batchSize)
+    config["formats"] = args.formats.split(",")
+    for tableFormat in config["formats"]:
+        if tableFormat not in table.FORMATS or not table.isFormatAvailable(tableFormat):
+            config["logger"].error("Format {} is unknown or not available".format(tableFormat))
+            os.sys.exit(1)
+    config["langDetection"] = {
+        "cacheSize": int(args.langCacheSize),
+        "batchSize": int(args.langBatchSize)
+    }
 
     usedMappingHash = util.getFileHash("clean/cleanDataHelpers.py")
     if usedMappingHash != config["clean"]["mappingHash"]:
@@ -67,13 +191,7 @@ def prepare():
         os.sys.exit(1)
     config["labels"]  = util.getLabels(config)
 
-    config["regex"] = {
-        "ddcValue": re.compile(config["clean"]["regex"]["ddcValue"]),
-        "ddcSchemeURI": re.compile(config["clean"]["regex"]["ddcSchemeURI"]),
-        "special": re.compile(config["clean"]["regex"]["special"]),
-        "dataInput": re.compile(config["clean"]["regex"]["dataInput"]),
-        "dataOutput": re.compile(config["clean"]["regex"]["dataOutput"])
-    }
+    config["regex"] = cleanHelpers.compileRegexes(config)
 
     return config
 
@@ -82,114 +200,235 @@ def divide(config):
     DetectorFactory.seed = config["clean"].get("seed", randint(0,2**32-1))
     config["logger"].info("Initializing DetectorFactory with seed {}".format(DetectorFactory.seed))
 
-    files = []
-    for f in glob.glob(
-        os.path.join(config["retrieve"]["baseDir"], config["clean"]["retrieveHash"]) + "/*"):
-        if config["regex"]["dataInput"].match(f):
-            files.append(f)
-    # Sort the files in decreasing order of size will result in a better
-    # distribution of work.
-    files.sort(key=lambda x: os.path.getsize(x), reverse=True)
-    # Add the config to each file, so workers know about the config
-    workpackage = [(config, f) for f in files]
+    manifest = cleanManifestHelpers.loadManifest(config)
+    if config["follow"]["enabled"]:
+        with ProcessPoolExecutor(
+            max_workers = config["worker"],
+            initializer = init_factory
+        ) as ex:
+            cleanFollowHelpers.followRetrieve(config, ex, manifest, cleanHelpers.processFile)
+        mergeLabelCaches(config)
+        return
+
+    files = cleanConquerHelpers.getRetrievedFiles(config)
+    fileIds = [cleanConquerHelpers.getFileId(config, f) for f in files]
+    if config["incremental"]:
+        for chunkId in cleanManifestHelpers.pruneChunks(config, manifest, fileIds):
+            config["logger"].info("  Removed chunk {} without retrieved file".format(chunkId))
+    # Add the config and manifest entry to each file, so workers know about
+    # the config and the origin of existing output
+    workpackage = []
+    for (fileId, f) in zip(fileIds, files):
+        entry = manifest["chunks"].get(fileId)
+        if config["incremental"] and cleanManifestHelpers.isUnchanged(config, entry, f):
+            continue
+        workpackage.append((config, f, entry))
     # Debug:
     # workpackage = [workpackage[-10], workpackage[-12], workpackage[-34], workpackage[-100]]
-    config["logger"].info("  Will process {} files".format(len(files)))
+    config["logger"].info("  Will process {} of {} files".format(len(workpackage), len(files)))
 
+    # Large files are split into parts (cf. cleanSplitHelpers), which are
+    # submitted first as the files are sorted by size. With --incremental, a
+    # split file whose chunk may be up to date is hashed by a worker first
+    # and only split once its hash shows that its content changed.
+    tasks = []
     with ProcessPoolExecutor(
         max_workers = config["worker"],
         initializer = init_factory
     ) as ex:
-        res = zip(workpackage, ex.map(cleanHelpers.processFile, workpackage))
-    for r in res:
-        if not r[1]:
-            config["logger"].warning("Unsuccesful run for {}".format(r[0][1]))
+        def submitParts(f, parts, inputHash):
+            config["logger"].info("  Splitting {} into {} parts".format(
+                os.path.basename(f), len(parts)))
+            if inputHash is None and config["incremental"]:
+                inputHash = ex.submit(util.getFileHash, f)
+            tasks.append((
+                f,
+                inputHash,
+                [ex.submit(cleanHelpers.processPart, (config, f, part)) for part in parts]
+            ))
+
+        results = []
+        hashing = {}
+        for (_, f, entry) in workpackage:
+            parts = None
+            if cleanSplitHelpers.isSplit(config, f):
+                if cleanSplitHelpers.mayBeUnchanged(config, f, entry):
+                    hashing[ex.submit(util.getFileHash, f)] = (f, entry)
+                    continue
+                parts = cleanSplitHelpers.getSplitParts(config, f)
+            if parts is None:
+                tasks.append((f, ex.submit(cleanHelpers.processFile, (config, f, entry)), None))
+                continue
+            submitParts(f, parts, None)
+        # the content check of processFile for the hashed split files
+        for future in as_completed(hashing):
+            (f, entry) = hashing[future]
+            state = cleanManifestHelpers.getInputState(config, f)
+            state["inputHash"] = future.result()
+            if cleanManifestHelpers.isContentUnchanged(config, entry, state):
+                config["logger"].info("\t{} unchanged".format(os.path.basename(f)))
+                state.update(cleanManifestHelpers.getMapState(entry))
+                results.append((f, state))
+                continue
+            parts = cleanSplitHelpers.getSplitParts(config, f)
+            if parts is None:
+                tasks.append((f, ex.submit(cleanHelpers.processFile, (config, f, entry)), None))
+                continue
+            submitParts(f, parts, state["inputHash"])
+        for (f, future, partFutures) in tasks:
+            if partFutures is None:
+                results.append((f, future.result()))
+            else:
+                inputHash = future.result() if isinstance(future, Future) else future
+                results.append((f, cleanSplitHelpers.mergeParts(
+                    config, f, [p.result() for p in partFutures], inputHash)))
+    for (f, result) in results:
+        if not result:
+            config["logger"].warning("Unsuccesful run for {}".format(f))
+        elif isinstance(result, dict):
+            fileId = cleanConquerHelpers.getFileId(config, result["input"])
+            manifest["chunks"][fileId] = result
+    cleanManifestHelpers.saveManifest(config, manifest)
+    mergeLabelCaches(config)
+
+def mergeLabelCaches(config):
+    if config["labelCache"]["size"] > 0 and config["labelCache"]["persist"]:
+        config["logger"].info("Persisted {} label cache entries".format(
+            cleanClassifierHelpers.mergeLabelCaches(config)))
 
 def conquer(config):
+    """ Combines the worker output as map-reduce (see cleanConquerHelpers).
+    With config["incremental"], chunks whose parts are up to date according
+    to the manifest are not mapped again.
+    The reduce streams the parts of the chunks in two passes:
+        1. resolve duplicates across chunks and write the result table
+        2. determine the best labels of the useable rows and write the useable table
+    The number of single label records per label must be known before the
+    best labels are determined, hence the two passes.
+    """
     config["logger"].info("Combining worker output")
-    resultFields = set([
-        "duplicate",
-        "id",
-        "multiAnnot",
-        "notAnnot",
-        "notFit",
-        "special",
-        "useable",
-        "labels"
-    ])
-    resultFields.update(config["clean"]["schemes"])
+    files = cleanConquerHelpers.getChunkFiles(config)
+    chunkIds = [cleanConquerHelpers.getChunkId(f) for f in files]
+    resultColumns = cleanConquerHelpers.getResultColumns(config)
+    useableColumns = cleanConquerHelpers.getUseableColumns(config)
+
+    manifest = cleanManifestHelpers.loadManifest(config)
+    workpackage = []
+    for (chunkId, f) in zip(chunkIds, files):
+        entry = manifest["chunks"].get(chunkId)
+        if config["incremental"] and cleanManifestHelpers.isMapped(config, entry, chunkId):
+            continue
+        workpackage.append((config, f))
+    config["logger"].info("  Will map {} of {} files".format(len(workpackage), len(files)))
+    if workpackage:
+        util.loadTokenizer(config)
+        with ProcessPoolExecutor(max_workers = config["worker"]) as ex:
+            res = zip(workpackage, ex.map(cleanConquerHelpers.mapChunk, workpackage))
+        for r in res:
+            if not r[1]:
+                config["logger"].warning("Unsuccesful map for {}".format(r[0][1]))
+            elif cleanConquerHelpers.getChunkId(r[0][1]) in manifest["chunks"]:
+                cleanManifestHelpers.setMapped(
+                    config, manifest["chunks"][cleanConquerHelpers.getChunkId(r[0][1])])
+        cleanManifestHelpers.saveManifest(config, manifest)
 
     statistics= {
         "subjectScheme": {},
         "schemeURI"    : {}
     }
-    useablePayloadHashes = {}
-    result    = []
-
-    files = []
-    for f in glob.glob(config["clean"]["outputDir"] + "/*"):
-        if config["regex"]["dataOutput"].match(f):
-            files.append(f)
-
-    for f in files:
-        with open(f, "r") as fh:
-            rows = json.load(fh)
-        for row in rows:
-            if row["useable"]:
-                # Check for duplicates
-                if row["payloadHash"] in useablePayloadHashes.keys():
-                    for alreadyInHash in useablePayloadHashes[row["payloadHash"]]:
-                        row["duplicate"] = True
-                        row["useable"] = False
-                useablePayloadHashes[row["payloadHash"]] = (
-                    useablePayloadHashes.get(row["payloadHash"], []))
-                useablePayloadHashes[row["payloadHash"]].append(row["payload"])
-
-            # fill the result row for the data frame
-            resultRow = {}
-            for field in resultFields:
-                resultRow[field] = row[field]
-            # put each payload field in a separate row
-            for key in config["clean"]["payloadFields"]:
-                resultRow[key] = row["payload"].get(key, " ")
-            resultRow["payload"] = " ".join([resultRow[x] for x in config["clean"]["payloadFields"]])
-
-            result.append(resultRow)
-
-            for field in ("subjectScheme", "schemeURI"):
-                for fieldInstance in row[field]:
-                    statistics[field][fieldInstance] = (
-                        statistics[field].get(fieldInstance, 0) + 1)
-    df = pd.DataFrame(result)
-    del result
-    gc.collect()
-
-    df.to_csv(
-        os.path.join(config["clean"]["outputDir"], "result.csv")
+    for chunkId in chunkIds:
+        with open(cleanConquerHelpers.getPartPath(config, chunkId, "statistics"), "r") as f:
+            cleanConquerHelpers.mergeStatistics(statistics, json.load(f))
+
+    nearDuplicates = {}
+    if config["nearDuplicates"]["enabled"]:
+        nearDuplicates = cleanConquerHelpers.getNearDuplicates(config, chunkIds)
+        resultColumns = resultColumns + ["nearDuplicate"]
+    # representative and near-duplicate ids per cluster for the report
+    clusters = {}
+
+    payloadIndex = cleanDuplicateHelpers.PayloadIndex(config["payloadIndex"]["directory"])
+    # number of useable single label records per label (ssf = selected so far)
+    ssf = np.zeros(20, dtype=np.int64)
+    # per chunk: the local indices of the duplicates (per batch) and the
+    # offset of the index
+    duplicates = {}
+    offsets = {}
+    offset = 0
+    resultWriter = table.TableWriter(
+        os.path.join(config["clean"]["outputDir"], "result"),
+        config["formats"]
     )
+    for chunkId in chunkIds:
+        duplicates[chunkId] = []
+        offsets[chunkId] = offset
+        with open(cleanConquerHelpers.getPartPath(config, chunkId, "result"), "rb") as f:
+            for df in cleanConquerHelpers.iterPickled(f):
+                # Check for duplicates
+                isDuplicate = payloadIndex.add(
+                    cleanDuplicateHelpers.toDigests(df.payloadHash[df.useable].values))
+                batchDuplicates = df.index[df.useable][isDuplicate]
+                duplicates[chunkId].append(batchDuplicates)
+                isDuplicate = df.index.isin(batchDuplicates)
+                df.loc[isDuplicate, "duplicate"] = True
+                if chunkId in nearDuplicates:
+                    near = nearDuplicates[chunkId]
+                    near = near[near.index.isin(df.index)]
+                    for (cluster, representative, rowId, duplicate) in zip(
+                            near.cluster, near.representative,
+                            df.id[near.index], df.duplicate[near.index]):
+                        clusters.setdefault(cluster, {"representative": None, "nearDuplicates": []})
+                        if representative:
+                            clusters[cluster]["representative"] = rowId
+                        elif not duplicate:
+                            clusters[cluster]["nearDuplicates"].append(rowId)
+                    # exact duplicates stay duplicates only, both are removed
+                    isNearDuplicate = (df.index.isin(near.index[~near.representative])
+                                       & ~isDuplicate)
+                    df["nearDuplicate"] = isNearDuplicate
+                    duplicates[chunkId].append(df.index[isNearDuplicate])
+                    isDuplicate = isDuplicate | isNearDuplicate
+                elif config["nearDuplicates"]["enabled"]:
+                    df["nearDuplicate"] = False
+                df.loc[isDuplicate, "useable"] = False
+                bm = util.labels2bm(df.labels[df.candidate & ~isDuplicate].values)
+                ssf += bm[bm.sum(axis=1) == 1].sum(axis=0, dtype=np.int64)
+                df.index = df.index + offsets[chunkId]
+                resultWriter.write(df[resultColumns])
+                offset += len(df)
+    resultWriter.close()
+    config["logger"].info("  Combined {} rows from {} files".format(offset, len(files)))
+    duplicateStatistics = payloadIndex.getStatistics()
+    payloadIndex.close()
+    with open(os.path.join(config["clean"]["outputDir"], "duplicates.json"), "w") as f:
+        json.dump(duplicateStatistics, f)
+    config["logger"].info("  Found {} duplicates of {} distinct payloads".format(
+        duplicateStatistics["duplicates"], duplicateStatistics["distinct"]))
+    if config["nearDuplicates"]["enabled"]:
+        with open(os.path.join(config["clean"]["outputDir"], "nearDuplicates.json"), "w") as f:
+            json.dump([clusters[c] for c in sorted(clusters) if clusters[c]["nearDuplicates"]], f)
+        config["logger"].info("  Found {} near-duplicates in {} clusters".format(
+            sum(len(c["nearDuplicates"]) for c in clusters.values()),
+            sum(1 for c in clusters.values() if c["nearDuplicates"])))
 
-    df = df[~df.duplicate][df.payload.str.len() > 1][df.labels > 0].copy()
-    df["wc"] = df.payload.apply(lambda x: len(x.split()))
-    df.loc[df.wc < config["clean"]["payloadMinLength"], 'useable'] = False
-    df = df[df.useable].copy()
-    df['labelsI'] = df.labels.apply(lambda x: util.int2bv(x, 21)[1:]).tolist()
-    # determine best label (bl) for each record
-    # TODO if there is time, we could parallelize these tasks.
-    ssf = []
-    for i in range(1,21):
-        ssf.append(len(df[df.labels == 2**i]))
-    ssf = pd.Series(ssf)
-    df['bl'] = df.labelsI.apply(lambda x: util.getBestLabel(ssf, x))
-    df['nol'] = df.labelsI.apply(lambda x: sum(x))
-    df.payload = df.payload.apply(lambda x: "".join(list(filter(lambda y: y in set(string.printable), x.lower()))))
-    nltk.download('punkt')
-    lStemmer = LancasterStemmer()
-    df['lancaster'] = df.payload.apply(lambda x: util.stem(x, lStemmer))
-    pStemmer = PorterStemmer()
-    df['porter'] = df.payload.apply(lambda x: util.stem(x, pStemmer))
-    df.to_csv(
-        os.path.join(config["clean"]["outputDir"], "useable.csv")
+    useableWriter = table.TableWriter(
+        os.path.join(config["clean"]["outputDir"], "useable"),
+        config["formats"]
     )
+    for chunkId in chunkIds:
+        chunkDuplicates = np.concatenate(
+            [np.asarray(batchDuplicates) for batchDuplicates in duplicates[chunkId]]
+            + [np.zeros(0, dtype=np.int64)])
+        with open(cleanConquerHelpers.getPartPath(config, chunkId, "useable"), "rb") as f:
+            for df in cleanConquerHelpers.iterPickled(f):
+                df = df[~df.index.isin(chunkDuplicates)].copy()
+                df.index = df.index + offsets[chunkId]
+                # determine best label (bl) for each record, ssf is carried
+                # over from batch to batch
+                (bl, nol) = util.getBestLabels(ssf, util.labels2bm(df.labels.values))
+                df['bl'] = bl
+                useableWriter.write(df[useableColumns])
+    useableWriter.close()
 
     for key in ("subjectScheme", "schemeURI"):
         dumpFile = os.path.join(config["clean"]["outputDir"], key + ".json")
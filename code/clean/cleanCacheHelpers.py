@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+class LRUCache(object):
+    """
+        Bounded least recently used cache of the clean workers
+
+        DataCite records repeat a lot (subjects, titles, descriptions), so
+        most values of a chunk have already been seen in an earlier document.
+        None is not a valid value, get returns None for misses.
+    """
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def update(self, entries):
+        for key, value in entries:
+            self.put(key, value)
+
+    def getStatistics(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "size": len(self.entries)
+        }
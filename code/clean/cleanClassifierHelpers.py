@@ -0,0 +1,288 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import glob
+import multiprocessing.util
+import pickle
+import re
+import util.util as util
+import cleanDataHelpers
+from cleanCacheHelpers import LRUCache
+from cleanSchemeHelpers import getSchemeTester, getSchemeField
+
+# Inline flags that can be scoped to a single alternative of the combined
+# regex, see https://docs.python.org/3/library/re.html#regular-expression-syntax
+SCOPED_FLAGS = (
+    (re.ASCII, "a"),
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.VERBOSE, "x")
+)
+
+# One classifier per worker process, see getSchemeClassifier
+_CLASSIFIER = None
+
+# Whether this worker process saves its label cache on exit, see
+# getSchemeClassifier
+_SAVE_ON_EXIT = False
+
+def getScopedPattern(regex):
+    """
+        Returns the pattern of a compiled regex with its flags inlined, so it
+        can be embedded into a larger regex without changing its semantics
+
+        Arguments
+            regex: compiled regular expression
+
+        Returns string
+    """
+    flags = "".join([f for (flag, f) in SCOPED_FLAGS if regex.flags & flag])
+    if flags:
+        return "(?{}:{})".format(flags, regex.pattern)
+    return "(?:{})".format(regex.pattern)
+
+def compileMapping(mapping):
+    """
+        Combines the regexes of a mapping (cf. cleanDataHelpers.mappings) to a
+        single alternation with one named group per mapping entry. The regex
+        engine tries the alternatives from left to right, hence the first
+        entry of the mapping that matches wins, exactly as when matching the
+        regexes one after another.
+
+        Arguments
+            mapping: list of [label, compiled regex] pairs
+
+        Returns tuple of the combined regex and a dictionary mapping the
+        group names to the labels
+    """
+    alternatives = []
+    groupLabels = {}
+    for idx, (label, regex) in enumerate(mapping):
+        groupName = "l{}".format(idx)
+        alternatives.append("(?P<{}>{})".format(groupName, getScopedPattern(regex)))
+        groupLabels[groupName] = label
+    return re.compile("|".join(alternatives)), groupLabels
+
+def isCaseless(mapping):
+    """
+        Indicates whether all regexes of a mapping ignore the case, i.e. an
+        ASCII value matches the same entry as its lower case version
+
+        Arguments
+            mapping: list of [label, compiled regex] pairs
+
+        Returns boolean
+    """
+    return all(regex.flags & re.IGNORECASE for (label, regex) in mapping)
+
+def getSubjectKey(scheme, value, caseless):
+    """
+        Returns the normalized key of a subject, i.e. the scheme it belongs to
+        and the stripped value its mapping is matched against (lower case if
+        the mapping ignores the case)
+
+        Arguments
+            scheme: name of the scheme of the subject
+            value: stripped value of the field of the scheme
+            caseless: whether the mapping of the scheme ignores the case
+
+        Returns tuple
+    """
+    if caseless and value.isascii():
+        value = value.lower()
+    return (scheme, value)
+
+def getLabelCacheHash(config):
+    """
+        Returns a hash of the configuration the cached labels depend on
+        besides the mapping (mappingHash)
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns string
+    """
+    return util.getDictHash({
+        "schemes": config["clean"]["schemes"],
+        "regex": config["clean"]["regex"],
+        "key": "scheme"
+    })
+
+def getLabelCachePath(config, part=None):
+    """
+        Returns the path of the persisted label cache of the configured
+        mapping. Each worker persists to its own part, divide merges the parts
+        once all workers are done.
+
+        Arguments
+            config: dictionary with the configuration
+            part: optional name of the part (e.g. the pid of the worker)
+
+        Returns string
+    """
+    name = config["clean"]["mappingHash"]
+    if part is not None:
+        name += ".{}.part".format(part)
+    return os.path.join(config["clean"]["baseDir"], "labelCache", name + ".pkl")
+
+def loadLabelCache(cache, config, path):
+    """
+        Fills the cache with the entries persisted to path, if they were
+        computed with the same configuration
+
+        Returns number of loaded entries
+    """
+    if not os.path.isfile(path):
+        return 0
+    with open(path, "rb") as f:
+        persisted = pickle.load(f)
+    if persisted["configHash"] != getLabelCacheHash(config):
+        return 0
+    cache.update(persisted["entries"])
+    return len(persisted["entries"])
+
+def saveLabelCache(cache, config, path):
+    """
+        Persists the entries of the cache to path, along with the hash of
+        the configuration they were computed with
+    """
+    util.createDirIfNotExists(os.path.dirname(path))
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump({
+            "configHash": getLabelCacheHash(config),
+            "entries": list(cache.entries.items())
+        }, f)
+    os.replace(path + ".tmp", path)
+
+def mergeLabelCaches(config):
+    """
+        Merges the label cache parts persisted by the workers into the label
+        cache of the configured mapping
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns number of entries in the merged cache
+    """
+    cache = LRUCache(config["labelCache"]["size"])
+    path = getLabelCachePath(config)
+    loadLabelCache(cache, config, path)
+    parts = glob.glob(getLabelCachePath(config, "*"))
+    for part in parts:
+        loadLabelCache(cache, config, part)
+    saveLabelCache(cache, config, path)
+    for part in parts:
+        os.remove(part)
+    return len(cache)
+
+def saveWorkerLabelCache():
+    """
+        Persists the label cache of this worker process to its part, called
+        once when the worker exits (cf. getSchemeClassifier)
+    """
+    if _CLASSIFIER is not None and _CLASSIFIER.cache is not None:
+        saveLabelCache(_CLASSIFIER.cache, _CLASSIFIER.config,
+                       getLabelCachePath(_CLASSIFIER.config, os.getpid()))
+
+class SchemeClassifier(object):
+    """
+        Precompiled replacement for cleanHelpers.getLabel
+
+        The scheme testers are resolved and the mappings are compiled once,
+        so classifying a subject only costs the scheme tests and a single
+        regex match. With an LRUCache, repeated subjects cost the scheme
+        tests and a lookup of their normalized value (cf. getSubjectKey).
+    """
+    def __init__(self, config, cache=None):
+        self.config = config
+        self.cache = cache
+        self.schemes = []
+        self.fields = {}
+        for scheme in config["clean"]["schemes"]:
+            isScheme = getSchemeTester(scheme)
+            if not isScheme:
+                continue
+            mapping = cleanDataHelpers.mappings[scheme]
+            regex, groupLabels = compileMapping(mapping)
+            self.schemes.append((scheme, isScheme, regex, groupLabels, isCaseless(mapping)))
+            self.fields[scheme] = getSchemeField(scheme)
+
+    def getLabel(self, subject, row):
+        """
+            Returns a label to a given subject and updates the result row
+
+            Arguments
+                subject: text payload as between the subject-tags in DataCite
+                row: Current row of the resulting cleaned data table
+
+            Returns label (id as defined in cleanDataHelpers)
+        """
+        (scheme, label) = self.classify(subject)
+        if scheme:
+            row[scheme].append(subject.get(self.fields[scheme], ""))
+        return label
+
+    def classify(self, subject):
+        """
+            Classifies a subject without side effects
+
+            Arguments
+                subject: text payload as between the subject-tags in DataCite
+
+            Returns tuple of the scheme whose mapping matched (or None) and
+            the label
+        """
+        for (scheme, isScheme, regex, groupLabels, caseless) in self.schemes:
+            if isScheme(self.config, subject):
+                checkAgainst = subject.get(self.fields[scheme], "").strip()
+                if not checkAgainst:
+                    return (None, None)
+                if self.cache is None:
+                    return self.match(scheme, regex, groupLabels, checkAgainst)
+                key = getSubjectKey(scheme, checkAgainst, caseless)
+                cached = self.cache.get(key)
+                if cached is None:
+                    cached = self.match(scheme, regex, groupLabels, checkAgainst)
+                    self.cache.put(key, cached)
+                return cached
+        return (None, None)
+
+    def match(self, scheme, regex, groupLabels, checkAgainst):
+        match = regex.match(checkAgainst)
+        if not match:
+            return (None, None)
+        return (scheme, groupLabels[match.lastgroup])
+
+def getSchemeClassifier(config):
+    """
+        Returns the classifier of this worker process and builds it on first
+        use (or if the configured schemes changed). If config["labelCache"]
+        is set, the classifier caches its results and, if configured, starts
+        with the persisted cache of the mapping and saves its cache once, when
+        the worker exits (merged by mergeLabelCaches).
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns SchemeClassifier
+    """
+    global _CLASSIFIER, _SAVE_ON_EXIT
+    if (_CLASSIFIER is None
+            or _CLASSIFIER.config["clean"]["schemes"] != config["clean"]["schemes"]):
+        cache = None
+        labelCache = config.get("labelCache")
+        if labelCache and labelCache["size"] > 0:
+            cache = LRUCache(labelCache["size"])
+            if labelCache["persist"]:
+                loaded = loadLabelCache(cache, config, getLabelCachePath(config))
+                config["logger"].info(
+                    "\tLoaded {} persisted label cache entries".format(loaded))
+                if not _SAVE_ON_EXIT:
+                    # runs when the process exits, also for the workers of a
+                    # ProcessPoolExecutor once it is shut down
+                    multiprocessing.util.Finalize(None, saveWorkerLabelCache, exitpriority=10)
+                    _SAVE_ON_EXIT = True
+        _CLASSIFIER = SchemeClassifier(config, cache)
+    # the config is pickled for every work package, keep the recent one
+    _CLASSIFIER.config = config
+    return _CLASSIFIER
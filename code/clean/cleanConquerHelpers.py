@@ -0,0 +1,360 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import glob
+import json
+import pickle
+import util.util as util
+import util.recordStore as recordStore
+from util.normalize import getNormalizer
+from util.jsonBackends import getJsonBackends
+import cleanDuplicateHelpers
+import numpy as np
+import pandas as pd
+from cleanStemHelpers import getPayloadStemmer
+
+"""
+    The conquer step is a map-reduce over the worker output of divide:
+        map (mapChunk, in parallel): transforms the rows of one chunk, stems
+            the candidates for the useable table and counts the schemes. The
+            results are saved as parts per chunk.
+        reduce (clean.conquer): merges the statistics, resolves duplicates
+            across chunks and determines the best labels, which depend on
+            the order of the rows.
+"""
+
+# Parts written by mapChunk per chunk
+PART_KINDS = ("result", "useable", "statistics")
+# Parts written with config["nearDuplicates"]["enabled"] only
+NEAR_DUPLICATE_PART_KINDS = ("minhash", "minhashIndex")
+PART_EXTENSIONS = {"statistics": "json", "minhash": "npy", "minhashIndex": "npy"}
+
+def getChunkFiles(config):
+    """
+        Returns the worker output files in a stable order
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns list of paths
+    """
+    files = []
+    for f in glob.glob(config["clean"]["outputDir"] + "/*"):
+        if config["regex"]["dataOutput"].match(f):
+            files.append(f)
+    return sorted(files)
+
+def getFileId(config, fileName):
+    """
+        Returns the id of a retrieved file, which names its chunk: the
+        retrievalId (cf. dataInput) or, for store chunks (cf.
+        util/recordStore.py), retrievalId-shard-chunk
+
+        Arguments
+            config: dictionary with the configuration
+            fileName: name or path of a retrieved file
+
+        Returns string
+    """
+    parsed = recordStore.parseStoreName(fileName)
+    if parsed:
+        return "-".join(parsed)
+    return config["regex"]["dataInput"].match(os.path.basename(fileName)).group(1)
+
+def isRetrievedFile(config, fileName):
+    """
+        Tests whether a file in the output directory of retrieve is a complete
+        retrieved file (a store chunk or a json file matching dataInput)
+    """
+    if recordStore.isStore(fileName):
+        return True
+    return bool(config["regex"]["dataInput"].match(fileName)) and fileName.endswith(".json")
+
+def getRetrieveDir(config):
+    return os.path.join(config["retrieve"]["baseDir"], config["clean"]["retrieveHash"])
+
+def getRetrievedFiles(config):
+    """
+        Returns the complete retrieved files, largest first, which results in
+        a better distribution of work
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns list of paths
+    """
+    files = []
+    for f in glob.glob(getRetrieveDir(config) + "/*"):
+        if isRetrievedFile(config, f):
+            files.append(f)
+    files.sort(key=lambda x: os.path.getsize(x), reverse=True)
+    return files
+
+def getChunkId(fileName):
+    return os.path.basename(fileName).split(".")[0]
+
+def getPartPath(config, chunkId, kind):
+    """
+        Returns the path of a part written by mapChunk
+
+        Arguments
+            config: dictionary with the configuration
+            chunkId: id of the chunk (cf. getChunkId)
+            kind: one of PART_KINDS or NEAR_DUPLICATE_PART_KINDS
+
+        Returns string
+    """
+    extension = PART_EXTENSIONS.get(kind, "pkl")
+    return os.path.join(config["clean"]["outputDir"], "parts",
+                        "{}.{}.{}".format(chunkId, kind, extension))
+
+def getPartKinds(config):
+    if config.get("nearDuplicates", {}).get("enabled"):
+        return PART_KINDS + NEAR_DUPLICATE_PART_KINDS
+    return PART_KINDS
+
+def iterChunkRows(files, backends):
+    """
+        Yields the rows of the worker output files one after another without
+        loading a whole file
+
+        Arguments
+            files: list of paths to *.chunk.json files
+            backends: util.jsonBackends.JsonBackends
+    """
+    for fileName in files:
+        with open(fileName, "rb") as f:
+            for row in backends.ijson.items(f, "item"):
+                yield row
+
+def iterBatches(iterable, size):
+    """
+        Yields lists of at most size items of iterable
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def getResultFields(config):
+    resultFields = set([
+        "duplicate",
+        "id",
+        "multiAnnot",
+        "notAnnot",
+        "notFit",
+        "special",
+        "useable",
+        "labels"
+    ])
+    resultFields.update(config["clean"]["schemes"])
+    return sorted(resultFields)
+
+def getResultColumns(config):
+    """
+        Returns the columns of the result table in a fixed order, so all batches
+        share the same header
+    """
+    return (getResultFields(config)
+            + config["clean"]["payloadFields"]
+            + ["payload"])
+
+def getResultRow(config, resultFields, row):
+    """
+        Transforms a row of the worker output to a row of the result table
+
+        Arguments
+            config: dictionary with the configuration
+            resultFields: list of fields to take over (cf. getResultFields)
+            row: dictionary as saved by cleanHelpers.processFile
+
+        Returns dictionary
+    """
+    resultRow = {}
+    for field in resultFields:
+        resultRow[field] = row[field]
+    # put each payload field in a separate row
+    for key in config["clean"]["payloadFields"]:
+        resultRow[key] = row["payload"].get(key, " ")
+    resultRow["payload"] = " ".join([resultRow[x] for x in config["clean"]["payloadFields"]])
+    return resultRow
+
+def updateStatistics(statistics, row):
+    for field in ("subjectScheme", "schemeURI"):
+        for fieldInstance in row[field]:
+            statistics[field][fieldInstance] = (
+                statistics[field].get(fieldInstance, 0) + 1)
+
+def getUseableColumns(config):
+    return (getResultColumns(config)
+            + ["wc", "labelsI", "bl", "nol", "lancaster", "porter"])
+
+def getUseable(config, df):
+    """
+        Selects the useable rows of a batch of result rows and adds their
+        word count (wc). Duplicates across batches are not known here.
+
+        Arguments
+            config: dictionary with the configuration
+            df: pd.DataFrame with result rows
+
+        Returns pd.DataFrame
+    """
+    df = df[~df.duplicate & (df.payload.str.len() > 1) & (df.labels > 0)].copy()
+    df["wc"] = df.payload.apply(lambda x: len(x.split()))
+    df.loc[df.wc < config["clean"]["payloadMinLength"], 'useable'] = False
+    return df[df.useable].copy()
+
+def transformUseable(df, normalizer, stemmer):
+    """
+        Adds the label vector, number of labels and stemmed payloads to the
+        useable rows and normalizes their payload
+
+        Arguments
+            df: pd.DataFrame as returned by getUseable
+            normalizer: util.normalize.Normalizer
+            stemmer: cleanStemHelpers.PayloadStemmer
+
+        Returns pd.DataFrame
+    """
+    bm = util.labels2bm(df.labels.values)
+    df['labelsI'] = list(bm)
+    df['nol'] = bm.sum(axis=1, dtype=np.int64)
+    df.payload = normalizer.normalizeColumn(df.payload)
+    stems = [stemmer.stem(payload) for payload in df.payload]
+    df['lancaster'] = pd.Series([s[0] for s in stems], index=df.index, dtype=object)
+    df['porter'] = pd.Series([s[1] for s in stems], index=df.index, dtype=object)
+    return df
+
+def mapChunk(instruction):
+    """
+        Transforms the rows of a worker output file in batches and saves
+            result: pickled pd.DataFrames with the rows for the result table, plus
+                the columns payloadHash and candidate (useable unless it is a
+                duplicate of another chunk)
+            useable: pickled pd.DataFrames with the transformed candidates
+            statistics: json with the counts of subjectScheme and schemeURI
+            minhash, minhashIndex: MinHash signatures of the candidates and
+                their index (with config["nearDuplicates"]["enabled"], cf.
+                cleanDuplicateHelpers)
+        The index of the rows is local to the chunk.
+
+        Arguments:
+            instruction: iterable, config dictionary first, filePath second
+
+        Returns boolean indicating success or failure
+    """
+    (config, filePath) = instruction
+    chunkId = getChunkId(filePath)
+    config["logger"].info("\tMapping: {}".format(os.path.basename(filePath)))
+    try:
+        resultFields = getResultFields(config)
+        resultColumns = getResultColumns(config)
+        statistics = {
+            "subjectScheme": {},
+            "schemeURI"    : {}
+        }
+        normalizer = getNormalizer(config)
+        stemmer = getPayloadStemmer(config)
+        util.createDirIfNotExists(os.path.dirname(getPartPath(config, chunkId, "result")))
+        nearDuplicates = config.get("nearDuplicates", {}).get("enabled")
+        if nearDuplicates:
+            permutations = cleanDuplicateHelpers.getPermutations(config)
+            signatures = [np.empty((0, len(permutations[0])), dtype=np.uint32)]
+            signatureIndex = [np.empty(0, dtype=np.int64)]
+        offset = 0
+        with open(getPartPath(config, chunkId, "result"), "wb") as rf, open(
+                getPartPath(config, chunkId, "useable"), "wb") as uf:
+            for batch in iterBatches(iterChunkRows([filePath], getJsonBackends(config)),
+                                     config["batchSize"]):
+                result = []
+                payloadHashes = []
+                for row in batch:
+                    result.append(getResultRow(config, resultFields, row))
+                    payloadHashes.append(row["payloadHash"])
+                    updateStatistics(statistics, row)
+                df = pd.DataFrame(result, columns=resultColumns,
+                                  index=range(offset, offset + len(result)))
+                offset += len(result)
+                useable = transformUseable(getUseable(config, df), normalizer, stemmer)
+                df["payloadHash"] = payloadHashes
+                df["candidate"] = df.index.isin(useable.index)
+                pickle.dump(df, rf)
+                pickle.dump(useable, uf)
+                if nearDuplicates:
+                    signatures.append(cleanDuplicateHelpers.getSignatures(
+                        config, useable.payload.values, permutations))
+                    signatureIndex.append(useable.index.values.astype(np.int64))
+        if nearDuplicates:
+            np.save(getPartPath(config, chunkId, "minhash"), np.concatenate(signatures))
+            np.save(getPartPath(config, chunkId, "minhashIndex"), np.concatenate(signatureIndex))
+        with open(getPartPath(config, chunkId, "statistics"), "w") as f:
+            json.dump(statistics, f)
+        config["logger"].info("\tMapped: {} ({} rows)".format(chunkId, offset))
+        if stemmer.cache is not None:
+            config["logger"].info("\tStem cache of the worker: {hits} hits, {misses} misses"
+                                  " ({hitRate:.1%}), {size} tokens".format(
+                                      **stemmer.cache.getStatistics()))
+        return True
+    except Exception as e:
+        config["logger"].error(
+            "Failure in mapping file {}: {} {} {} {}".format(
+                filePath,
+                sys.exc_info()[-1].tb_lineno,
+                e.__class__,
+                e.__doc__,
+                e
+            )
+        )
+        raise
+
+def getNearDuplicates(config, chunkIds):
+    """
+        Finds clusters of near-duplicate candidates across all chunks (cf.
+        cleanDuplicateHelpers)
+
+        Arguments
+            config: dictionary with the configuration
+            chunkIds: ids of the chunks in the order of the result table
+
+        Returns dictionary with a pd.DataFrame per chunk with clustered rows,
+        indexed by the local index, with the columns cluster (number of the
+        representative over all candidates) and representative (boolean)
+    """
+    signatures = [np.load(getPartPath(config, chunkId, "minhash"), mmap_mode="r")
+                  for chunkId in chunkIds]
+    roots = cleanDuplicateHelpers.findClusters(config, signatures)
+    sizes = np.bincount(roots, minlength=len(roots))
+    nearDuplicates = {}
+    base = 0
+    for (chunkId, chunkSignatures) in zip(chunkIds, signatures):
+        rowIds = np.arange(base, base + len(chunkSignatures))
+        base += len(chunkSignatures)
+        clustered = sizes[roots[rowIds]] > 1
+        if not clustered.any():
+            continue
+        index = np.load(getPartPath(config, chunkId, "minhashIndex"))
+        nearDuplicates[chunkId] = pd.DataFrame({
+            "cluster": roots[rowIds][clustered],
+            "representative": roots[rowIds][clustered] == rowIds[clustered]
+        }, index=index[clustered])
+    return nearDuplicates
+
+def mergeStatistics(statistics, partial):
+    for field in ("subjectScheme", "schemeURI"):
+        for fieldInstance, count in partial[field].items():
+            statistics[field][fieldInstance] = (
+                statistics[field].get(fieldInstance, 0) + count)
+
+def iterPickled(f):
+    """
+        Yields the objects pickled one after another into a file
+    """
+    while True:
+        try:
+            yield pickle.load(f)
+        except EOFError:
+            return
@@ -0,0 +1,379 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import shutil
+import tempfile
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+"""
+    Exact duplicates (PayloadIndex): conquer marks a useable row as duplicate
+    if an earlier row has the same payloadHash. The index keeps the first
+    16 bytes of each hash (as two uint64) and how often it occurred in sorted
+    arrays (a main run and a small run of recent hashes, merged when the
+    latter grows), i.e. 20 bytes per distinct payload. With a directory, the main run is a
+    memory-mapped file for runs that do not fit into memory, it is merged
+    with the recent run in blocks of MERGE_BLOCK_SIZE hashes.
+
+    Near-duplicate detection of conquer (config["nearDuplicates"]):
+        map (cleanConquerHelpers.mapChunk): computes a MinHash signature of
+            the payload of each candidate, i.e. the minimum of each of
+            "permutations" hash functions over the hashed character shingles
+            ("shingleSize" bytes) of the payload
+        reduce (findClusters): an LSH index splits the signatures into
+            "bands" bands, rows sharing a band are candidate pairs, which are
+            near-duplicates if the share of equal minimums (the estimated
+            Jaccard similarity of the shingles) is at least "threshold"
+    Clusters are the connected components of the near-duplicate pairs, the
+    row with the lowest index is their representative. The reduce handles one
+    band at a time with a few numbers per row, the signatures stay on disk
+    (memory-mapped parts of mapChunk). With --incremental, chunks whose
+    parts were mapped with other "permutations" or "shingleSize" are mapped
+    again (cf. cleanManifestHelpers.isMapped).
+"""
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+FNV_PRIME = np.uint64(1099511628211)
+# The recent run is merged into the main run once it holds this many
+# hashes or a quarter of the main run
+MERGE_SIZE = 1 << 16
+# Number of hashes of the memory-mapped main run merged at once
+MERGE_BLOCK_SIZE = 1 << 20
+# Seed of the hash functions, fixed so signatures of different runs match
+SEED = 1
+# Number of candidate pairs verified at once
+VERIFY_BATCH = 100000
+
+def toDigests(payloadHashes):
+    """
+        Converts hex sha256 hashes (cf. util.getDictHash) to 16 byte digests
+
+        Arguments
+            payloadHashes: iterable of strings
+
+        Returns np.array (number of hashes x 2, uint64)
+    """
+    return np.frombuffer(
+        b"".join(bytes.fromhex(payloadHash[:32]) for payloadHash in payloadHashes),
+        dtype=">u8"
+    ).astype(np.uint64).reshape(-1, 2)
+
+def getUnique(digests):
+    """
+        Returns the distinct digests (sorted), the position of their first
+        occurrence and their number of occurrences
+    """
+    order = np.lexsort((digests[:, 1], digests[:, 0]))
+    ordered = digests[order]
+    isFirst = np.ones(len(digests), dtype=bool)
+    isFirst[1:] = (ordered[1:] != ordered[:-1]).any(axis=1)
+    starts = np.flatnonzero(isFirst)
+    counts = np.diff(np.append(starts, len(digests)))
+    return (ordered[starts], order[starts], counts)
+
+def findDigests(keys, digests):
+    """
+        Looks digests up in sorted keys
+
+        Returns boolean np.array (found) and np.array with the positions
+    """
+    left = np.searchsorted(keys[:, 0], digests[:, 0], side="left")
+    right = np.searchsorted(keys[:, 0], digests[:, 0], side="right")
+    positions = left.copy()
+    # the first 8 bytes are almost always distinct
+    single = np.flatnonzero(right - left == 1)
+    positions[single] += keys[left[single], 1] < digests[single, 1]
+    for i in np.flatnonzero(right - left > 1):
+        positions[i] += np.searchsorted(keys[left[i]:right[i], 1], digests[i, 1])
+    found = positions < right
+    found[found] = keys[positions[found], 1] == digests[found, 1]
+    return (found, positions)
+
+def mergeRuns(keys, counts, otherKeys, otherCounts, positions):
+    """
+        Merges two sorted and disjoint runs of digests with their counts
+
+        Arguments
+            keys, counts: first run
+            otherKeys, otherCounts: second run
+            positions: np.array with the positions of otherKeys in keys (cf.
+                       findDigests)
+
+        Returns tuple of np.arrays (keys and counts)
+    """
+    isOther = np.zeros(len(keys) + len(otherKeys), dtype=bool)
+    isOther[positions + np.arange(len(otherKeys))] = True
+    mergedKeys = np.empty((len(isOther), 2), dtype=np.uint64)
+    mergedKeys[isOther] = otherKeys
+    mergedKeys[~isOther] = keys
+    mergedCounts = np.empty(len(isOther), dtype=np.uint32)
+    mergedCounts[isOther] = otherCounts
+    mergedCounts[~isOther] = counts
+    return (mergedKeys, mergedCounts)
+
+class PayloadIndex(object):
+    """ Set of payload digests with the number of their occurrences
+    """
+    def __init__(self, directory=None):
+        """
+            Arguments
+                directory: optional directory for the memory-mapped main run,
+                           the index works in memory without it
+        """
+        self.directory = tempfile.mkdtemp(dir=directory) if directory else None
+        self.generation = 0
+        self.keys = np.empty((0, 2), dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.uint32)
+        self.recentKeys = np.empty((0, 2), dtype=np.uint64)
+        self.recentCounts = np.empty(0, dtype=np.uint32)
+
+    def __len__(self):
+        return len(self.keys) + len(self.recentKeys)
+
+    def add(self, digests):
+        """
+            Adds digests in their order
+
+            Arguments
+                digests: np.array as returned by toDigests
+
+            Returns np.array (boolean), True for the digests added before
+            (earlier in digests or by an earlier call)
+        """
+        (unique, first, counts) = getUnique(digests)
+        (inMain, mainPositions) = findDigests(self.keys, unique)
+        (inRecent, recentPositions) = findDigests(self.recentKeys, unique)
+        self.counts[mainPositions[inMain]] += counts[inMain].astype(np.uint32)
+        self.recentCounts[recentPositions[inRecent]] += counts[inRecent].astype(np.uint32)
+        isNew = ~inMain & ~inRecent
+        isDuplicate = np.ones(len(digests), dtype=bool)
+        isDuplicate[first[isNew]] = False
+        if isNew.any():
+            (self.recentKeys, self.recentCounts) = self.merge(
+                self.recentKeys, self.recentCounts, unique[isNew], counts[isNew])
+            if len(self.recentKeys) >= max(MERGE_SIZE, len(self.keys) // 4):
+                self.mergeRecent()
+        return isDuplicate
+
+    def merge(self, keys, counts, otherKeys, otherCounts, path=None):
+        # both runs are sorted and disjoint
+        (_, positions) = findDigests(keys, otherKeys)
+        if path is None:
+            return mergeRuns(keys, counts, otherKeys, otherCounts, positions)
+        size = len(keys) + len(otherKeys)
+        mergedKeys = np.lib.format.open_memmap(
+            path + ".keys.npy", mode="w+", dtype=np.uint64, shape=(size, 2))
+        mergedCounts = np.lib.format.open_memmap(
+            path + ".counts.npy", mode="w+", dtype=np.uint32, shape=(size,))
+        # a block of keys with the other keys before its end (the last one
+        # with the remaining other keys)
+        other = 0
+        for start in range(0, len(keys) + 1, MERGE_BLOCK_SIZE):
+            stop = min(start + MERGE_BLOCK_SIZE, len(keys))
+            if stop == len(keys):
+                otherStop = len(otherKeys)
+            else:
+                otherStop = int(np.searchsorted(positions, stop))
+            (blockKeys, blockCounts) = mergeRuns(
+                keys[start:stop], counts[start:stop], otherKeys[other:otherStop],
+                otherCounts[other:otherStop], positions[other:otherStop] - start)
+            mergedKeys[start + other:stop + otherStop] = blockKeys
+            mergedCounts[start + other:stop + otherStop] = blockCounts
+            other = otherStop
+        mergedKeys.flush()
+        mergedCounts.flush()
+        del mergedKeys, mergedCounts
+        return (np.load(path + ".keys.npy", mmap_mode="r"),
+                np.load(path + ".counts.npy", mmap_mode="r+"))
+
+    def mergeRecent(self):
+        path = None
+        if self.directory:
+            self.generation += 1
+            path = os.path.join(self.directory, "main.{}".format(self.generation))
+        (self.keys, self.counts) = self.merge(
+            self.keys, self.counts, self.recentKeys, self.recentCounts, path)
+        self.recentKeys = np.empty((0, 2), dtype=np.uint64)
+        self.recentCounts = np.empty(0, dtype=np.uint32)
+        if path and self.generation > 1:
+            for extension in (".keys.npy", ".counts.npy"):
+                os.remove(os.path.join(self.directory,
+                                       "main.{}{}".format(self.generation - 1, extension)))
+
+    def getCounts(self, digests):
+        """
+            Returns the number of occurrences of digests (0 if unknown)
+        """
+        (inMain, mainPositions) = findDigests(self.keys, digests)
+        (inRecent, recentPositions) = findDigests(self.recentKeys, digests)
+        counts = np.zeros(len(digests), dtype=np.int64)
+        counts[inMain] = self.counts[mainPositions[inMain]]
+        counts[inRecent] = self.recentCounts[recentPositions[inRecent]]
+        return counts
+
+    def getStatistics(self):
+        """
+            Returns dictionary with the number of payloads, distinct payloads
+            and duplicates as well as the number of distinct payloads per
+            number of occurrences
+        """
+        occurrences = {}
+        payloads = 0
+        for counts in [self.counts[start:start + MERGE_BLOCK_SIZE]
+                       for start in range(0, len(self.counts), MERGE_BLOCK_SIZE)] + [
+                           self.recentCounts]:
+            counts = np.asarray(counts, dtype=np.int64)
+            payloads += int(counts.sum())
+            for (o, h) in zip(*np.unique(counts, return_counts=True)):
+                occurrences[int(o)] = occurrences.get(int(o), 0) + int(h)
+        return {
+            "payloads": payloads,
+            "distinct": len(self),
+            "duplicates": payloads - len(self),
+            "occurrences": {str(o): h for (o, h) in sorted(occurrences.items())}
+        }
+
+    def close(self):
+        self.keys = self.counts = None
+        if self.directory:
+            shutil.rmtree(self.directory)
+
+def getPermutations(config):
+    """
+        Returns the parameters (a, b) of the hash functions
+        (a * x + b) % MERSENNE_PRIME of the signatures
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns tuple of np.arrays (uint64)
+    """
+    nearDuplicates = config["nearDuplicates"]
+    rng = np.random.RandomState(SEED)
+    a = rng.randint(1, (1 << 61) - 1, nearDuplicates["permutations"], dtype=np.uint64)
+    b = rng.randint(0, (1 << 61) - 1, nearDuplicates["permutations"], dtype=np.uint64)
+    return (a, b)
+
+def getShingleHashes(text, shingleSize):
+    """
+        Returns the distinct 32 bit hashes of the byte shingles of a text, a
+        text shorter than a shingle is a single shingle
+    """
+    data = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    size = min(shingleSize, len(data))
+    if size == 0:
+        return np.empty(0, dtype=np.uint64)
+    n = len(data) - size + 1
+    hashes = np.zeros(n, dtype=np.uint64)
+    for i in range(size):
+        hashes = hashes * FNV_PRIME + data[i:i + n]
+    return np.unique((hashes ^ (hashes >> np.uint64(32))) & MAX_HASH)
+
+def getSignatures(config, texts, permutations):
+    """
+        Computes the MinHash signatures of texts
+
+        Arguments
+            config: dictionary with the configuration
+            texts: iterable of strings
+            permutations: tuple as returned by getPermutations
+
+        Returns np.array (number of texts x permutations, uint32)
+    """
+    (a, b) = permutations
+    signatures = np.full((len(texts), len(a)), MAX_HASH, dtype=np.uint32)
+    for (i, text) in enumerate(texts):
+        hashes = getShingleHashes(" ".join(text.split()), config["nearDuplicates"]["shingleSize"])
+        if len(hashes):
+            signatures[i] = (((np.outer(hashes, a) + b) % MERSENNE_PRIME) & MAX_HASH).min(axis=0)
+    return signatures
+
+def getBandKeys(signatures, band, rows):
+    """
+        Returns a 64 bit key per signature for a band of rows minimums
+    """
+    keys = np.zeros(len(signatures), dtype=np.uint64)
+    for column in range(band * rows, (band + 1) * rows):
+        keys = keys * FNV_PRIME + signatures[:, column].astype(np.uint64)
+    return keys
+
+def getSignatureRows(signatures, bases, rowIds):
+    """
+        Returns the signatures of rows given by their index over all chunks
+
+        Arguments
+            signatures: list of np.arrays (signatures per chunk)
+            bases: np.array with the index of the first row per chunk
+            rowIds: np.array with the rows
+
+        Returns np.array
+    """
+    result = np.empty((len(rowIds), signatures[0].shape[1]), dtype=np.uint32)
+    chunks = np.searchsorted(bases, rowIds, side="right") - 1
+    for chunk in np.unique(chunks):
+        selected = chunks == chunk
+        result[selected] = signatures[chunk][rowIds[selected] - bases[chunk]]
+    return result
+
+def mergeClusters(roots, left, right):
+    """
+        Joins the clusters of the pairs (left, right)
+
+        Arguments
+            roots: np.array with the representative of each row's cluster
+            left, right: np.arrays with the rows of the pairs
+
+        Returns np.array with the new representatives
+    """
+    n = len(roots)
+    graph = coo_matrix(
+        (np.ones(n + len(left), dtype=np.int8),
+         (np.concatenate([np.arange(n), left]), np.concatenate([roots, right]))),
+        shape=(n, n)
+    )
+    (components, labels) = connected_components(graph, directed=False)
+    lowest = np.full(components, n, dtype=np.int64)
+    np.minimum.at(lowest, labels, np.arange(n))
+    return lowest[labels]
+
+def findClusters(config, signatures):
+    """
+        Finds clusters of near-duplicates with an LSH index
+
+        Arguments
+            config: dictionary with the configuration
+            signatures: list of np.arrays (signatures per chunk, may be
+                        memory-mapped), rows are numbered over all chunks
+
+        Returns np.array with the representative (lowest row) of the cluster
+        of each row
+    """
+    nearDuplicates = config["nearDuplicates"]
+    rows = nearDuplicates["permutations"] // nearDuplicates["bands"]
+    sizes = [len(s) for s in signatures]
+    bases = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    n = int(sum(sizes))
+    roots = np.arange(n, dtype=np.int64)
+    if n < 2:
+        return roots
+    for band in range(nearDuplicates["bands"]):
+        keys = np.concatenate([getBandKeys(s, band, rows) for s in signatures if len(s)])
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        isFirst = np.concatenate([[True], keys[1:] != keys[:-1]])
+        # the first (lowest) row of each bucket is compared with the others
+        first = order[np.maximum.accumulate(np.where(isFirst, np.arange(n), 0))]
+        (left, right) = (first[~isFirst], order[~isFirst])
+        unknown = roots[left] != roots[right]
+        (left, right) = (left[unknown], right[unknown])
+        similar = np.zeros(len(left), dtype=bool)
+        for start in range(0, len(left), VERIFY_BATCH):
+            stop = start + VERIFY_BATCH
+            similar[start:stop] = (
+                getSignatureRows(signatures, bases, left[start:stop])
+                == getSignatureRows(signatures, bases, right[start:stop])
+            ).mean(axis=1) >= nearDuplicates["threshold"]
+        if similar.any():
+            roots = mergeClusters(roots, left[similar], right[similar])
+    return roots
@@ -0,0 +1,76 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+import util.recordStore as recordStore
+import cleanConquerHelpers
+import cleanManifestHelpers
+
+"""
+    Pipelined clean (--follow): instead of cleaning the output of a finished
+    retrieve, the output directory of retrieve is scanned every
+    config["follow"]["interval"] seconds and each new (or changed) retrieved
+    file is cleaned as soon as it appears. Retrieve makes files visible only
+    once they are complete and writes recordStore.DONE_MARKER when it has
+    finished, which ends the pipeline.
+"""
+
+def getFileState(filePath):
+    stat = os.stat(filePath)
+    return (stat.st_size, stat.st_mtime)
+
+def followRetrieve(config, executor, manifest, process):
+    """
+        Cleans retrieved files while retrieve is running
+
+        Arguments
+            config: dictionary with the configuration
+            executor: concurrent.futures.Executor for the cleaning
+            manifest: dictionary as returned by
+                      cleanManifestHelpers.loadManifest, updated in place and
+                      saved whenever a file was cleaned
+            process: function cleaning a file (cleanHelpers.processFile)
+
+        Returns number of submitted files
+    """
+    donePath = recordStore.getDonePath(cleanConquerHelpers.getRetrieveDir(config))
+    seen = {}
+    running = {}
+    submitted = 0
+    while True:
+        # files complete before the marker are found by the following scan
+        isDone = os.path.isfile(donePath)
+        for f in cleanConquerHelpers.getRetrievedFiles(config):
+            if f in running.values():
+                # a change while it is cleaned is noticed by a later scan
+                continue
+            state = getFileState(f)
+            if seen.get(f) == state:
+                continue
+            seen[f] = state
+            fileId = cleanConquerHelpers.getFileId(config, f)
+            entry = manifest["chunks"].get(fileId)
+            if config["incremental"] and cleanManifestHelpers.isUnchanged(config, entry, f):
+                continue
+            config["logger"].info("  Following: {}".format(os.path.basename(f)))
+            running[executor.submit(process, (config, f, entry))] = f
+            submitted += 1
+        if isDone and not running:
+            break
+        if not running:
+            time.sleep(config["follow"]["interval"])
+            continue
+        finished, _ = wait(list(running.keys()),
+                           timeout=config["follow"]["interval"],
+                           return_when=FIRST_COMPLETED)
+        for future in finished:
+            f = running.pop(future)
+            result = future.result()
+            if not result:
+                config["logger"].warning("Unsuccesful run for {}".format(f))
+            elif isinstance(result, dict):
+                manifest["chunks"][cleanConquerHelpers.getFileId(config, f)] = result
+        if finished:
+            cleanManifestHelpers.saveManifest(config, manifest)
+    config["logger"].info("  Retrieve finished, cleaned {} files".format(submitted))
+    return submitted
@@ -1,18 +1,39 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-import ijson
 import json
 import re
 import util.util as util
-from langdetect import detect_langs
-from langdetect.lang_detect_exception import LangDetectException
+import util.recordStore as recordStore
+from util.jsonBackends import getJsonBackends
 from cleanSchemeHelpers import getLabelFromScheme, getSchemeTester
+from cleanClassifierHelpers import getSchemeClassifier
+from cleanLangHelpers import getLangDetector
+from cleanConquerHelpers import getFileId
+from cleanManifestHelpers import getChunkPath, getInputState, getMapState, isContentUnchanged
+from cleanSplitHelpers import getSplitPartPath, iterPartDocuments
 from nltk.tokenize import word_tokenize
 import string
+def compileRegexes(config):
+    """
+        Compiles the regexes configured for the cleaning run
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns dictionary with the compiled regexes
+    """
+    return {
+        key: re.compile(config["clean"]["regex"][key])
+        for key in ("ddcValue", "ddcSchemeURI", "special", "dataInput", "dataOutput")
+    }
+
 def getLabel(config, subject, row):
     """
         Returns a label to a given subject and updates the result row
 
+        Note: processFile uses the equivalent, precompiled
+        cleanClassifierHelpers.SchemeClassifier.getLabel
+
         Arguments
             config: dictionary with the configuration
             subject: text payload as between the subject-tags in DataCite
@@ -26,24 +47,36 @@ def getLabel(config, subject, row):
             return getLabelFromScheme(scheme, config, subject, row)
     return None
 
-def getLangProbability(string, lang):
-    probabilities = detect_langs(string)
-    for p in probabilities:
-        if p.lang == lang:
-            return p.prob
-    return 0
+def getPayloadTexts(config, document):
+    """
+        Yields the texts of a document which are subject to language detection
+
+        Arguments
+            config: dictionary with the configuration
+            document: dictionary encoding DataCite-compliant metadata
+    """
+    for field in config["clean"]["payloadFields"]:
+        for instance in document.get(field, []):
+            if instance["value"]:
+                yield instance["value"]
 
-def getPayload(config, document):
+def getPayload(config, document, langProbabilities=None):
     """
         Returns the payload if it has the right language and is long enough
 
         Arguments
             config: dictionary with the configuration
             document: dictionary encoding DataCite-compliant metadata
+            langProbabilities: optional dictionary with the language
+                probabilities of the payload texts (cf. addPayloads), they
+                are detected if not given
 
         Returns dictionary including only valid text payloads
         (keys are as configured in config["clean"]["payload"])
     """
+    if langProbabilities is None:
+        langProbabilities = getLangDetector(config).getProbabilities(
+            getPayloadTexts(config, document))
     payload= {}
     for field in config["clean"]["payloadFields"]:
         if field not in document.keys():
@@ -55,10 +88,7 @@ def getPayload(config, document):
             if not instance["value"]:
                 continue
             # Exclusion criterion 2: not the language configured
-            try:
-                if not getLangProbability(instance["value"], config["clean"]["lang"]) > config["clean"]["langCert"]:
-                    continue
-            except LangDetectException as e:
+            if not langProbabilities[instance["value"]] > config["clean"]["langCert"]:
                 continue
             # Exclusion criterion 3: already extracted the information
             if not instance["value"] in fieldInstances and len(instance["value"].split()) > 0:
@@ -67,6 +97,22 @@ def getPayload(config, document):
             payload[field] = " ".join(fieldInstances)
     return payload
 
+def getRetrievedFileName(fileName):
+    """
+        Returns the name of the retrieved json file a file stems from, i.e.
+        <retrievalId>.json for store chunks (cf. util/recordStore.py) and the
+        file name itself otherwise
+
+        Arguments
+            fileName: name or path of a retrieved file
+
+        Returns string
+    """
+    parsed = recordStore.parseStoreName(fileName)
+    if parsed:
+        return parsed[0] + ".json"
+    return os.path.basename(fileName)
+
 def isSpecialChunk(config, fileName):
     """
         Indicates whether the file is configured as "special", meaning that
@@ -78,7 +124,7 @@ def isSpecialChunk(config, fileName):
 
         Returns boolean
     """
-    if config["regex"]["special"].match(os.path.basename(fileName)):
+    if config["regex"]["special"].match(getRetrievedFileName(fileName)):
         return True
     return False
 
@@ -124,83 +170,223 @@ def finalizeRow(config, row):
         row[scheme] = "|".join(row[scheme])
     return row
 
+def addPayloads(config, detector, pending):
+    """
+        Detects the language of the payload texts of a batch of annotated
+        documents at once and completes their result rows
+
+        Arguments
+            config: dictionary with the configuration
+            detector: cleanLangHelpers.LangDetector of the worker
+            pending: list of (row, document) tuples
+    """
+    texts = []
+    for (row, document) in pending:
+        texts.extend(getPayloadTexts(config, document))
+    langProbabilities = detector.getProbabilities(texts)
+    for (row, document) in pending:
+        payload = getPayload(config, document, langProbabilities)
+        if len(payload.keys()) < 1:
+            row["notFit"] == True
+            finalizeRow(config, row)
+            continue
+        row["useable"] = True
+        row["payloadHash"] = util.getDictHash(payload)
+        row["payload"] = payload
+        finalizeRow(config, row)
+
+def logCacheStatistics(config, name, cache, fileId, before):
+    """
+        Logs the hits and misses of a cache for a file and in total for this
+        worker
+
+        Arguments
+            config: dictionary with the configuration
+            name: name of the cache to log
+            cache: cleanCacheHelpers.LRUCache of the worker
+            fileId: id of the processed file
+            before: statistics of the cache before processing the file
+    """
+    after = cache.getStatistics()
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    config["logger"].info(
+        "\t{} cache for {}: {} hits, {} misses ({:.1%}), "
+        "worker total: {} hits, {} misses ({:.1%}), {} entries".format(
+            name,
+            fileId,
+            hits,
+            misses,
+            hits / (hits + misses) if hits + misses else 0.0,
+            after["hits"],
+            after["misses"],
+            after["hitRate"],
+            after["size"]
+        )
+    )
+
+def cleanDocuments(config, fileName, fileId, documents):
+    """
+        Cleans documents of a retrieved file, i.e. determines their labels
+        and payload
+
+        Arguments:
+            config: dictionary with the configuration
+            fileName: name of the retrieved file
+            fileId: id of the chunk (for logging)
+            documents: iterable of (index, document) tuples, index being the
+                       position of the document in the retrieved file
+
+        Returns list of (index, row) tuples, one per document
+    """
+    classifier = getSchemeClassifier(config)
+    detector = getLangDetector(config)
+    caches = {"Label": classifier.cache, "Language": detector.cache}
+    cacheStatistics = {
+        name: cache.getStatistics() for (name, cache) in caches.items() if cache is not None
+    }
+    prefiltered = detector.prefiltered
+    result = []
+    pending = []
+    for (docIndex, document) in documents:
+        row = initResultRow(config)
+        if isSpecialChunk(config, fileName):
+            row["id"] = fileName + "_" + str(docIndex)
+            row["labels"] |= 1 << config["clean"]["special"][getRetrievedFileName(fileName)]
+            row["special"] = True
+        else:
+            row["id"] = document["identifier"]["value"]
+            for subject in document["subjects"]:
+                if "schemeURI" in subject.keys():
+                    row["schemeURI"].add(subject["schemeURI"])
+                if "subjectScheme" in subject.keys():
+                    row["subjectScheme"].add(subject["subjectScheme"])
+                label = classifier.getLabel(subject, row)
+                if label:
+                    row["labels"] |= 1 << label
+                elif "payloadSubjects" in config["clean"]["payloadFields"]:
+                    document.setdefault("payloadSubjects", []).append(subject)
+        if not row["labels"]:
+            row["notAnnot"] = True
+            result.append((docIndex, finalizeRow(config, row)))
+            continue
+        elif not util.power_of_two(row["labels"]):
+            row["multiAnnot"] = True
+
+        # the payload is added in batches, see addPayloads
+        result.append((docIndex, row))
+        pending.append((row, document))
+        if len(pending) >= config["langDetection"]["batchSize"]:
+            addPayloads(config, detector, pending)
+            pending = []
+    addPayloads(config, detector, pending)
+
+    for (name, before) in cacheStatistics.items():
+        logCacheStatistics(config, name, caches[name], fileId, before)
+    if detector.prefilter:
+        config["logger"].info("\tLanguage pre-filter for {}: {} texts accepted".format(
+            fileId,
+            detector.prefiltered - prefiltered
+        ))
+    return result
+
+def writeAtomic(backends, path, obj):
+    # an interrupted run must not leave a seemingly processed chunk (the
+    # temporary file does not match the dataOutput regex)
+    tmpFile = os.path.splitext(path)[0] + ".tmp"
+    with open(tmpFile, "wb") as f:
+        f.write(backends.codec.dumps(obj))
+    os.replace(tmpFile, path)
+
+def logFailure(config, fileName, e):
+    config["logger"].error(
+        "Failure in processing file {}: {} {} {} {}".format(
+            fileName,
+            sys.exc_info()[-1].tb_lineno,
+            e.__class__,
+            e.__doc__,
+            e
+        )
+    )
+
 def processFile(instruction):
     """
         Processes a file of metadata and saves the result in a json file
 
         Arguments:
-            instruction: iterable, config dictionary first, filePath second
+            instruction: iterable, config dictionary first, filePath second,
+                         manifest entry of the chunk (or None) third
 
-        Returns boolean indicating success or failure
+        Returns the new manifest entry of the chunk (cf. cleanManifestHelpers)
+        or True if the output was kept without knowing its origin
     """
-    (config, filePath) = instruction
+    (config, filePath, entry) = instruction
     fileName = os.path.basename(filePath)
-    fileId = config["regex"]["dataInput"].match(fileName).group(1)
-    resultFile = os.path.join(config["clean"]["outputDir"], fileId + ".chunk.json")
-    if os.path.isfile(resultFile):
+    fileId = getFileId(config, fileName)
+    resultFile = getChunkPath(config, fileId)
+    if not config.get("incremental") and os.path.isfile(resultFile):
         config["logger"].info("\t{} already processed: {}".format(
             os.path.basename(fileName),
             resultFile
         ))
-        return True
+        return entry or True
+    state = getInputState(config, filePath)
+    # the content check needs the hash of the previous run, which is only
+    # recorded with --incremental (reading the file is not worth it otherwise)
+    state["inputHash"] = None
+    if config.get("incremental"):
+        state["inputHash"] = util.getFileHash(filePath)
+        if isContentUnchanged(config, entry, state) and os.path.isfile(resultFile):
+            config["logger"].info("\t{} unchanged: {}".format(fileName, resultFile))
+            state.update(getMapState(entry))
+            return state
+    state["mapped"] = False
     config["logger"].info("\tProcessing: {}".format(fileName))
     try:
-        with open(filePath) as f:
-            result = []
-            docCounter = 0
-            for document in ijson.items(f, 'documents.item'):
-                row = initResultRow(config)
-                if isSpecialChunk(config, fileName):
-                    row["id"] = fileName + "_" + str(docCounter)
-                    row["labels"] |= 1 << config["clean"]["special"][fileName]
-                    row["special"] = True
-                    docCounter += 1
-                else:
-                    row["id"] = document["identifier"]["value"]
-                    for subject in document["subjects"]:
-                        if "schemeURI" in subject.keys():
-                            row["schemeURI"].add(subject["schemeURI"])
-                        if "subjectScheme" in subject.keys():
-                            row["subjectScheme"].add(subject["subjectScheme"])
-                        label = getLabel(config, subject, row)
-                        if label:
-                            row["labels"] |= 1 << label
-                        elif "payloadSubjects" in config["clean"]["payloadFields"]:
-                            document.setdefault("payloadSubjects", []).append(subject)
-                if not row["labels"]:
-                    row["notAnnot"] = True
-                    result.append(finalizeRow(config, row))
-                    continue
-                elif not util.power_of_two(row["labels"]):
-                    row["multiAnnot"] = True
-
-                payload = getPayload(config, document)
-                if len(payload.keys()) < 1:
-                    row["notFit"] == True
-                    result.append(finalizeRow(config, row))
-                    continue
-                row["useable"] = True
-                row["payloadHash"] = util.getDictHash(payload)
-                row["payload"] = payload
-                result.append(finalizeRow(config, row))
-
-        with open(resultFile, "w") as f:
-            json.dump(result, f)
+        backends = getJsonBackends(config)
+        with recordStore.openDocuments(filePath, backends=backends) as documents:
+            result = cleanDocuments(config, fileName, fileId, enumerate(documents))
+        writeAtomic(backends, resultFile, [row for (_, row) in result])
         config["logger"].info(
             "\tSave results for: {} ({} documents)".format(
                 fileId,
                 len(result)
             )
         )
-        return True
+        return state
     except Exception as e:
-        config["logger"].error(
-            "Failure in processing file {}: {} {} {} {}".format(
-                fileName,
-                sys.exc_info()[-1].tb_lineno,
-                e.__class__,
-                e.__doc__,
-                e
+        logFailure(config, fileName, e)
+        raise
+
+def processPart(instruction):
+    """
+        Processes a part of a large file of metadata (cf. cleanSplitHelpers)
+        and saves the rows of its documents in order
+
+        Arguments:
+            instruction: iterable, config dictionary first, filePath second,
+                         part (as returned by getSplitParts) third
+
+        Returns the path of the saved part
+    """
+    (config, filePath, part) = instruction
+    fileName = os.path.basename(filePath)
+    fileId = getFileId(config, fileName)
+    partId = "{} part {}/{}".format(fileId, part["index"] + 1, part["parts"])
+    config["logger"].info("\tProcessing: {}".format(partId))
+    try:
+        backends = getJsonBackends(config)
+        result = cleanDocuments(config, fileName, partId,
+                                iterPartDocuments(filePath, part, backends))
+        partFile = getSplitPartPath(config, fileId, part)
+        writeAtomic(backends, partFile, [row for (_, row) in result])
+        config["logger"].info(
+            "\tSave results for: {} ({} documents)".format(
+                partId,
+                len(result)
             )
         )
+        return partFile
+    except Exception as e:
+        logFailure(config, fileName, e)
         raise
@@ -0,0 +1,156 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import hashlib
+import re
+from langdetect import detect_langs
+from langdetect.lang_detect_exception import LangDetectException
+from cleanCacheHelpers import LRUCache
+
+# Probability cached for texts langdetect cannot handle (LangDetectException),
+# lower than any configured certainty
+UNDETECTABLE = -1.0
+
+# Most frequent English function words, used by the pre-filter only
+ENGLISH_STOP_WORDS = frozenset([
+    "a", "about", "after", "all", "also", "an", "and", "are", "as", "at", "be",
+    "been", "between", "both", "but", "by", "can", "during", "each", "for",
+    "from", "has", "have", "in", "into", "is", "it", "its", "more", "not",
+    "of", "on", "or", "other", "our", "than", "that", "the", "their", "these",
+    "this", "those", "through", "to", "was", "we", "were", "which", "while",
+    "with", "within"
+])
+
+WORD = re.compile(r"[a-z]+")
+
+# One detector per worker process, see getLangDetector
+_DETECTOR = None
+
+def getTextHash(text):
+    """
+        Returns a compact digest of a text to key the language cache with
+
+        Arguments
+            text: string
+
+        Returns bytes (16)
+    """
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+def getLangProbability(string, lang):
+    probabilities = detect_langs(string)
+    for p in probabilities:
+        if p.lang == lang:
+            return p.prob
+    return 0
+
+def isObviouslyEnglish(text, prefilter):
+    """
+        Cheap heuristic which recognizes long, plain ASCII texts with many
+        English function words. It only ever accepts texts, everything else
+        is left to langdetect.
+
+        Arguments
+            text: string
+            prefilter: dictionary with the thresholds asciiRatio,
+                       stopWordRatio and minWords
+
+        Returns boolean
+    """
+    if not text:
+        return False
+    asciiChars = len(text.encode("ascii", "ignore"))
+    if asciiChars / len(text) < prefilter["asciiRatio"]:
+        return False
+    words = WORD.findall(text.lower())
+    if len(words) < prefilter["minWords"]:
+        return False
+    stopWords = sum(1 for word in words if word in ENGLISH_STOP_WORDS)
+    return stopWords / len(words) >= prefilter["stopWordRatio"]
+
+def getPrefilter(config):
+    """
+        Returns the configured pre-filter thresholds (config["clean"]
+        ["langPrefilter"]), None if there are none or the configured language
+        is not English
+    """
+    if config["clean"]["lang"] != "en":
+        return None
+    return config["clean"].get("langPrefilter")
+
+class LangDetector(object):
+    """
+        Language detection stage of the clean workers
+
+        Every text is detected at most once per worker: results are cached by
+        a digest of the text. langdetect reseeds with DetectorFactory.seed for
+        each detection, so a cached result equals a repeated detection.
+        Texts accepted by the (optional) pre-filter skip langdetect.
+    """
+    def __init__(self, config, cache=None):
+        self.lang = config["clean"]["lang"]
+        self.cache = cache
+        self.prefilter = getPrefilter(config)
+        self.prefiltered = 0
+
+    def detect(self, text):
+        if self.prefilter and isObviouslyEnglish(text, self.prefilter):
+            self.prefiltered += 1
+            return 1.0
+        try:
+            return getLangProbability(text, self.lang)
+        except LangDetectException:
+            return UNDETECTABLE
+
+    def getProbability(self, text):
+        """
+            Returns the probability that text is in the configured language
+
+            Arguments
+                text: string
+
+            Returns float (UNDETECTABLE if langdetect failed)
+        """
+        if self.cache is None:
+            return self.detect(text)
+        key = getTextHash(text)
+        probability = self.cache.get(key)
+        if probability is None:
+            probability = self.detect(text)
+            self.cache.put(key, probability)
+        return probability
+
+    def getProbabilities(self, texts):
+        """
+            Detects a batch of texts, each distinct text once
+
+            Arguments
+                texts: iterable of strings
+
+            Returns dictionary mapping each text to its probability
+        """
+        probabilities = {}
+        for text in texts:
+            if text not in probabilities:
+                probabilities[text] = self.getProbability(text)
+        return probabilities
+
+def getLangDetector(config):
+    """
+        Returns the language detector of this worker process and builds it on
+        first use (or if the configured language changed)
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns LangDetector
+    """
+    global _DETECTOR
+    if (_DETECTOR is None
+            or _DETECTOR.lang != config["clean"]["lang"]
+            or _DETECTOR.prefilter != getPrefilter(config)):
+        cache = None
+        langDetection = config.get("langDetection")
+        if langDetection and langDetection["cacheSize"] > 0:
+            cache = LRUCache(langDetection["cacheSize"])
+        _DETECTOR = LangDetector(config, cache)
+    return _DETECTOR
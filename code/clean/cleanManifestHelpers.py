@@ -0,0 +1,189 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import json
+from cleanConquerHelpers import getFileId, getPartPath, getPartKinds
+from cleanConquerHelpers import PART_KINDS, NEAR_DUPLICATE_PART_KINDS
+
+"""
+    The manifest (manifest.json in the output directory of clean) records
+    per chunk (fileId) what its output was computed from:
+        input, size, mtime: name and stat of the retrieved file
+        inputHash: sha256 of the retrieved file (None if it was cleaned
+            without --incremental)
+        mappingHash: hash of the mapping (cleanDataHelpers) used
+        mapped: whether the parts of conquer are up to date
+        minhash: parameters the minhash parts were mapped with (None without
+            config["nearDuplicates"]["enabled"])
+    It is only written by the parent process. With --incremental, divide
+    re-cleans a chunk only if it is stale and conquer only maps re-cleaned
+    chunks; the others are merged from their cached parts. Files are only
+    hashed with --incremental, hence a touched file whose chunk stems from a
+    run without it is cleaned again, even if its content is the same. Run
+    with --incremental once to record the hashes.
+"""
+
+def getManifestPath(config):
+    return os.path.join(config["clean"]["outputDir"], "manifest.json")
+
+def getChunkPath(config, fileId):
+    return os.path.join(config["clean"]["outputDir"], fileId + ".chunk.json")
+
+def loadManifest(config):
+    """
+        Returns the manifest of the cleaning run, an empty one if there is
+        none yet or it cannot be read
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns dictionary
+    """
+    path = getManifestPath(config)
+    if os.path.isfile(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            config["logger"].warning("Ignoring unreadable manifest {}".format(path))
+    return {"chunks": {}}
+
+def saveManifest(config, manifest):
+    path = getManifestPath(config)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def getInputState(config, filePath):
+    """
+        Returns the part of a manifest entry that is cheap to determine
+        (without reading the retrieved file)
+
+        Arguments
+            config: dictionary with the configuration
+            filePath: path of the retrieved file
+
+        Returns dictionary
+    """
+    stat = os.stat(filePath)
+    return {
+        "input": os.path.basename(filePath),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "mappingHash": config["clean"]["mappingHash"]
+    }
+
+def isUnchanged(config, entry, filePath):
+    """
+        Tests by stat whether the output of a chunk is up to date, i.e. the
+        retrieved file was neither touched nor replaced since it was cleaned
+        with the same mapping
+
+        Arguments
+            config: dictionary with the configuration
+            entry: manifest entry of the chunk (or None)
+            filePath: path of the retrieved file
+
+        Returns boolean
+    """
+    if not entry:
+        return False
+    state = getInputState(config, filePath)
+    for key, value in state.items():
+        if entry.get(key) != value:
+            return False
+    fileId = getFileId(config, state["input"])
+    return os.path.isfile(getChunkPath(config, fileId))
+
+def isContentUnchanged(config, entry, state):
+    """
+        Tests by content whether the output of a chunk is up to date, e.g.
+        if a re-harvest rewrote the retrieved file with the same documents
+
+        Arguments
+            config: dictionary with the configuration
+            entry: manifest entry of the chunk (or None)
+            state: new manifest entry of the chunk including inputHash
+
+        Returns boolean
+    """
+    return bool(entry
+                and state["inputHash"] is not None
+                and entry.get("inputHash") == state["inputHash"]
+                and entry.get("mappingHash") == state["mappingHash"])
+
+def getMinhashParameters(config):
+    """
+        Returns the parameters of config["nearDuplicates"] the minhash parts
+        of mapChunk depend on, None if they are not written
+    """
+    nearDuplicates = config.get("nearDuplicates", {})
+    if not nearDuplicates.get("enabled"):
+        return None
+    return {key: nearDuplicates[key] for key in ("permutations", "shingleSize")}
+
+def getMapState(entry):
+    """
+        Returns the part of a manifest entry describing the parts of conquer,
+        which is kept if the chunk is unchanged
+
+        Arguments
+            entry: manifest entry of the chunk
+
+        Returns dictionary
+    """
+    return {"mapped": entry.get("mapped", False), "minhash": entry.get("minhash")}
+
+def setMapped(config, entry):
+    entry["mapped"] = True
+    entry["minhash"] = getMinhashParameters(config)
+
+def isMapped(config, entry, fileId):
+    """
+        Tests whether the parts of a chunk are up to date, i.e. it was mapped
+        since it was cleaned, with the current minhash parameters
+
+        Arguments
+            config: dictionary with the configuration
+            entry: manifest entry of the chunk (or None)
+            fileId: id of the chunk
+
+        Returns boolean
+    """
+    if not entry or not entry.get("mapped"):
+        return False
+    minhash = getMinhashParameters(config)
+    if minhash is not None and entry.get("minhash") != minhash:
+        return False
+    return hasParts(config, fileId)
+
+def hasParts(config, fileId):
+    return all(os.path.isfile(getPartPath(config, fileId, kind))
+               for kind in getPartKinds(config))
+
+def pruneChunks(config, manifest, fileIds):
+    """
+        Removes the output, parts and manifest entries of chunks whose
+        retrieved file does not exist anymore
+
+        Arguments
+            config: dictionary with the configuration
+            manifest: dictionary as returned by loadManifest
+            fileIds: ids of the retrieved files
+
+        Returns list of removed ids
+    """
+    removed = []
+    chunkIds = set(manifest["chunks"].keys())
+    for f in os.listdir(config["clean"]["outputDir"]):
+        if config["regex"]["dataOutput"].match(f):
+            chunkIds.add(f.split(".")[0])
+    for chunkId in sorted(chunkIds - set(fileIds)):
+        paths = [getChunkPath(config, chunkId)]
+        paths += [getPartPath(config, chunkId, kind)
+                  for kind in PART_KINDS + NEAR_DUPLICATE_PART_KINDS]
+        for path in paths:
+            if os.path.isfile(path):
+                os.remove(path)
+        manifest["chunks"].pop(chunkId, None)
+        removed.append(chunkId)
+    return removed
@@ -3,6 +3,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 import re
 import cleanDataHelpers
 
+ANZSRC_VALUE = re.compile(r'^\d{5}.*')
+ANZSRC_SCHEME_URI = ("http://www.abs.gov.au/ausstats"
+                     "/abs@.nsf/0/6BB427AB9696C225CA2574180004463E")
+BEPRESS_SCHEME_NAMES = (
+    "bepress digital commons three-tiered taxonomy",
+    "digital commons three-tiered list of academic disciplines"
+)
+
 def getSchemeTester(scheme):
     if scheme == "anzsrc":
         return isAnzsrc
@@ -19,19 +27,21 @@ def getSchemeTester(scheme):
     else:
         return None
 
-def getLabelFromScheme(scheme, config, subject, row):
+def getSchemeField(scheme):
     if scheme == "narcis":
-        return getLabelFromMapping(scheme, "valueURI", subject, row)
+        return "valueURI"
     else:
-        return getLabelFromMapping(scheme, "value", subject, row)
+        return "value"
+
+def getLabelFromScheme(scheme, config, subject, row):
+    return getLabelFromMapping(scheme, getSchemeField(scheme), subject, row)
 
 def isAnzsrc(config, subject):
-    if not re.match(r'^\d{5}.*', subject["value"]):
+    if not ANZSRC_VALUE.match(subject["value"]):
         return False
     if "schemeURI" not in subject.keys():
         return False
-    if (subject["schemeURI"] == "http://www.abs.gov.au/ausstats"
-            "/abs@.nsf/0/6BB427AB9696C225CA2574180004463E"):
+    if subject["schemeURI"] == ANZSRC_SCHEME_URI:
         return True
     return False
 
@@ -63,12 +73,7 @@ def isBk(config, subject):
 
 def isBepress(config, subject):
     subjectScheme = subject.get("subjectScheme", "").strip().lower()
-    for bsn in (
-        "bepress digital commons three-tiered taxonomy",
-        "digital commons three-tiered list of academic disciplines"):
-        if subjectScheme == bsn:
-            return True
-    return False
+    return subjectScheme in BEPRESS_SCHEME_NAMES
 
 def getLabelFromMapping(scheme, field, subject, row):
     checkAgainst = subject.get(field, "").strip()
@@ -0,0 +1,299 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import math
+import re
+import numpy as np
+import util.recordStore as recordStore
+from cleanConquerHelpers import getFileId
+from cleanManifestHelpers import getChunkPath, getInputState
+
+"""
+    Intra-file parallelism of divide: a retrieved file larger than
+    config["split"]["size"] bytes is cleaned in parts by several workers
+    (cleanHelpers.processPart) instead of pinning a single one. Each part is
+    a range of consecutive documents:
+        store chunk with index: a range of blocks
+        other files: a byte range from the start of its first to the end of
+            its last document, found by a single scan of the file (cf.
+            getDocumentOffsets), the part only parses this range
+    Each part saves the rows of its documents in order, hence mergeParts
+    concatenates the parts without parsing them again and the chunk is the
+    same as if the file was cleaned at once (including the ids of special
+    chunks, which are derived from the position).
+"""
+
+SCAN_BLOCK_SIZE = 2**24
+COPY_BLOCK_SIZE = 2**20
+# Bytes before a list that are searched for its key
+SCAN_KEY_SIZE = 64
+DOCUMENTS_KEY = re.compile(rb'"documents"\s*:\s*$')
+QUOTE, BACKSLASH = ord('"'), ord("\\")
+OPEN, CLOSE = (ord("{"), ord("[")), (ord("}"), ord("]"))
+# change of the nesting by a byte outside of strings
+NESTING = np.zeros(256, dtype=np.int8)
+NESTING[list(OPEN)] = 1
+NESTING[list(CLOSE)] = -1
+
+def getDocumentOffsets(filePath):
+    """
+        Finds the documents of a json file with a list of documents
+        ({"documents": [...]}) without parsing it, i.e. by tracking strings
+        and the nesting of its objects and lists with numpy
+
+        Arguments
+            filePath: path of the file
+
+        Returns tuple of numpy arrays with the offsets of the first byte and
+        of the byte after the last byte of each document, None if the file
+        is no valid list of documents
+    """
+    starts = []
+    ends = []
+    depth = 0
+    inString = False
+    inDocuments = False
+    tail = b""
+    offset = 0
+    with open(filePath, "rb") as f:
+        for block in iter(lambda: f.read(SCAN_BLOCK_SIZE), b""):
+            # the tail of the last block holds the key of a list and the
+            # backslashes before a quote of this block
+            raw = tail + block
+            data = np.frombuffer(raw, dtype=np.uint8)
+            isCandidate = data == QUOTE
+            for character in OPEN + CLOSE:
+                isCandidate |= data == character
+            isCandidate[:len(tail)] = False
+            candidates = np.flatnonzero(isCandidate)
+            values = data[candidates]
+            # a quote is escaped by an odd number of backslashes before it
+            isQuote = values == QUOTE
+            quotes = np.flatnonzero(isQuote)
+            escaped = quotes[data[np.maximum(candidates[quotes] - 1, 0)] == BACKSLASH]
+            backslashes = np.ones(len(escaped), dtype=np.int64)
+            pending = np.ones(len(escaped), dtype=bool)
+            while pending.any():
+                before = candidates[escaped] - backslashes - 1
+                pending &= before >= 0
+                pending[pending] = data[before[pending]] == BACKSLASH
+                backslashes += pending
+            isQuote[escaped[backslashes % 2 == 1]] = False
+            isString = np.bitwise_xor.accumulate(isQuote.view(np.uint8)) ^ inString
+            change = NESTING[values] * (isString == 0)
+            after = depth + np.cumsum(change, dtype=np.int32)
+            before = after - change
+            # the lists on the first level, only the one of documents counts
+            lists = np.flatnonzero(((change == 1) & (before == 1) & (values == OPEN[1]))
+                                   | ((change == -1) & (after == 1)))
+            if len(lists):
+                listStates = np.zeros(len(lists) + 1, dtype=bool)
+                listStates[0] = inDocuments
+                for (i, j) in enumerate(lists, 1):
+                    if change[j] == 1:
+                        position = candidates[j]
+                        key = raw[max(0, position - SCAN_KEY_SIZE):position]
+                        listStates[i] = DOCUMENTS_KEY.search(key) is not None
+                last = np.zeros(len(values), dtype=np.int64)
+                last[lists] = np.arange(1, len(lists) + 1)
+                isDocuments = listStates[np.maximum.accumulate(last)]
+                inDocuments = bool(listStates[-1])
+            else:
+                isDocuments = inDocuments
+            position = offset - len(tail) + candidates
+            starts.append(position[(change == 1) & (before == 2) & (values == OPEN[0])
+                                   & isDocuments])
+            ends.append(position[(change == -1) & (after == 2) & (values == CLOSE[0])
+                                 & isDocuments] + 1)
+            if len(values):
+                depth = int(after[-1])
+                inString = bool(isString[-1])
+            offset += len(block)
+            tail = raw[-(SCAN_KEY_SIZE + len(raw) - len(raw.rstrip(b"\\"))):]
+    starts = np.concatenate(starts + [np.zeros(0, dtype=np.int64)])
+    ends = np.concatenate(ends + [np.zeros(0, dtype=np.int64)])
+    if depth or inString or len(starts) != len(ends) or np.any(starts >= ends):
+        return None
+    return (starts, ends)
+
+def isSplit(config, filePath):
+    """
+        Indicates whether a retrieved file is large enough to be cleaned in
+        parts
+
+        Arguments
+            config: dictionary with the configuration
+            filePath: path of the retrieved file
+
+        Returns boolean
+    """
+    splitSize = config.get("split", {}).get("size", 0)
+    if not splitSize or os.path.getsize(filePath) <= splitSize:
+        return False
+    fileId = getFileId(config, os.path.basename(filePath))
+    # existing output is kept by processFile
+    return config.get("incremental") or not os.path.isfile(getChunkPath(config, fileId))
+
+def getSplitParts(config, filePath):
+    """
+        Returns the parts a retrieved file is cleaned in
+
+        Arguments
+            config: dictionary with the configuration
+            filePath: path of the retrieved file
+
+        Returns list of dictionaries (index, parts, first document and
+        either blocks or bytes), None if the file is cleaned at once
+    """
+    if not isSplit(config, filePath):
+        return None
+    size = os.path.getsize(filePath)
+    parts = min(config["worker"], math.ceil(size / config["split"]["size"]))
+    index = recordStore.loadIndex(filePath) if recordStore.isStore(filePath) else None
+    if index is not None:
+        ranges = [
+            {"blocks": blocks, "bytes": None, "first": blocks[0] * index["blockSize"]}
+            for blocks in recordStore.getBlockRanges(index, parts)
+        ]
+    else:
+        offsets = getDocumentOffsets(filePath)
+        if offsets is None:
+            return None
+        (starts, ends) = offsets
+        # parts of (nearly) equal size in bytes
+        bounds = np.unique(np.searchsorted(
+            ends, [size * part / parts for part in range(1, parts)]))
+        bounds = [0] + [int(b) for b in bounds if 0 < b < len(starts)] + [len(starts)]
+        ranges = [
+            {"blocks": None, "bytes": (int(starts[a]), int(ends[b - 1])), "first": a}
+            for (a, b) in zip(bounds[:-1], bounds[1:])
+        ]
+    if len(ranges) < 2:
+        return None
+    for (i, part) in enumerate(ranges):
+        part.update({"index": i, "parts": len(ranges)})
+    return ranges
+
+def getSplitPartPath(config, fileId, part):
+    # does not match the dataOutput regex
+    return os.path.join(config["clean"]["outputDir"],
+                        "{}.split{:02d}.json".format(fileId, part["index"]))
+
+class PartReader(object):
+    """
+        File-like object reading the byte range of a part of a json file
+        (cf. getSplitParts) as a list of documents
+    """
+    def __init__(self, f, part):
+        self.f = f
+        self.f.seek(part["bytes"][0])
+        self.remaining = part["bytes"][1] - part["bytes"][0]
+        self.prefix = b"["
+        self.suffix = b"]"
+
+    def read(self, size=-1):
+        if size == 0:
+            # ijson tests the type of the data
+            return b""
+        if size is None or size < 0:
+            size = self.remaining + 2
+        data = self.prefix
+        self.prefix = b""
+        if self.remaining and len(data) < size:
+            block = self.f.read(min(size - len(data), self.remaining))
+            self.remaining -= len(block)
+            data += block
+        if not self.remaining and len(data) < size:
+            data += self.suffix
+            self.suffix = b""
+        return data
+
+def iterPartDocuments(filePath, part, backends):
+    """
+        Yields the documents of a part of a retrieved file
+
+        Arguments
+            filePath: path of the retrieved file
+            part: dictionary as returned by getSplitParts
+            backends: util.jsonBackends.JsonBackends
+
+        Returns generator of (index, document) tuples, index being the
+        position of the document in the file
+    """
+    if part["blocks"] is not None:
+        with recordStore.openDocuments(filePath, part["blocks"], backends) as documents:
+            for (docIndex, document) in enumerate(documents, part["first"]):
+                yield (docIndex, document)
+        return
+    with open(filePath, "rb") as f:
+        documents = backends.ijson.items(PartReader(f, part), "item")
+        for (docIndex, document) in enumerate(documents, part["first"]):
+            yield (docIndex, document)
+
+def removeParts(partFiles):
+    for partFile in partFiles:
+        if partFile and os.path.isfile(partFile):
+            os.remove(partFile)
+
+def mayBeUnchanged(config, filePath, entry):
+    """
+        Indicates whether the chunk of a split file may be up to date, i.e.
+        it is worth hashing the file for the content check of
+        cleanHelpers.processFile before its parts are cleaned
+
+        Arguments
+            config: dictionary with the configuration
+            filePath: path of the retrieved file
+            entry: manifest entry of the chunk (or None)
+
+        Returns boolean
+    """
+    fileId = getFileId(config, os.path.basename(filePath))
+    return bool(config.get("incremental") and entry
+                and os.path.isfile(getChunkPath(config, fileId)))
+
+def mergeParts(config, filePath, partFiles, inputHash):
+    """
+        Concatenates the parts of a retrieved file to its chunk, the parts
+        holding consecutive documents in order
+
+        Arguments
+            config: dictionary with the configuration
+            filePath: path of the retrieved file
+            partFiles: list of paths as returned by cleanHelpers.processPart,
+                       False for a failed part
+            inputHash: sha256 of the retrieved file (None without
+                       --incremental)
+
+        Returns the new manifest entry of the chunk, False if a part failed
+    """
+    if not all(partFiles):
+        removeParts(partFiles)
+        return False
+    fileId = getFileId(config, os.path.basename(filePath))
+    resultFile = getChunkPath(config, fileId)
+    tmpFile = os.path.splitext(resultFile)[0] + ".tmp"
+    count = 0
+    with open(tmpFile, "wb") as f:
+        f.write(b"[")
+        for partFile in partFiles:
+            # the rows of a part without the brackets of its list
+            remaining = os.path.getsize(partFile) - 2
+            if remaining <= 0:
+                continue
+            if count:
+                f.write(b",")
+            with open(partFile, "rb") as part:
+                part.seek(1)
+                while remaining:
+                    block = part.read(min(remaining, COPY_BLOCK_SIZE))
+                    f.write(block)
+                    remaining -= len(block)
+            count += 1
+        f.write(b"]")
+    os.replace(tmpFile, resultFile)
+    removeParts(partFiles)
+    config["logger"].info("\tMerged {} parts of {}".format(len(partFiles), fileId))
+    state = getInputState(config, filePath)
+    state["inputHash"] = inputHash
+    state["mapped"] = False
+    return state
@@ -0,0 +1,61 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import util.util as util
+from nltk.stem.lancaster import LancasterStemmer
+from nltk.stem.porter import PorterStemmer
+from nltk.tokenize import word_tokenize
+from cleanCacheHelpers import LRUCache
+
+"""
+    Stemming of the useable payloads in mapChunk (which runs per chunk in
+    parallel): each payload is tokenized once and both stems of a token are
+    taken from a cache of the worker, the results equal util.stem with a
+    LancasterStemmer and a PorterStemmer.
+"""
+
+# One stemmer per worker process, see getPayloadStemmer
+_STEMMER = None
+
+class PayloadStemmer(object):
+    def __init__(self, cache=None):
+        self.lancaster = LancasterStemmer()
+        self.porter = PorterStemmer()
+        self.cache = cache
+
+    def stemToken(self, token):
+        if self.cache is not None:
+            stems = self.cache.get(token)
+            if stems is not None:
+                return stems
+        stems = (self.lancaster.stem(token), self.porter.stem(token))
+        if self.cache is not None:
+            self.cache.put(token, stems)
+        return stems
+
+    def stem(self, payload):
+        """
+            Stems a payload with both stemmers
+
+            Arguments
+                payload: string
+
+            Returns tuple of strings (lancaster, porter)
+        """
+        stems = [self.stemToken(token) for token in word_tokenize(payload)]
+        return (" ".join(s[0] for s in stems), " ".join(s[1] for s in stems))
+
+def getPayloadStemmer(config):
+    """
+        Returns the stemmer of this worker process and builds it on first use
+
+        Arguments
+            config: dictionary with the configuration
+
+        Returns PayloadStemmer
+    """
+    global _STEMMER
+    if _STEMMER is None:
+        util.addNltkDataDir(config)
+        cacheSize = config.get("stemCache", {}).get("size", 0)
+        _STEMMER = PayloadStemmer(LRUCache(cacheSize) if cacheSize > 0 else None)
+    return _STEMMER
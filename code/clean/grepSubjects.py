@@ -3,7 +3,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 import argparse
 import glob
 import util.util as util
-import ijson
+import util.recordStore as recordStore
 import json
 import pprint
 import re
@@ -32,6 +32,10 @@ def prepare():
             required    = True,
             help        ="Grep expression")
 
+    parser.add_argument('--identifier',
+            default     = None,
+            help        ="Only grep the record with this identifier (uses"
+                         " the index of the record store)")
 
 
     args = parser.parse_args()
@@ -39,6 +43,7 @@ def prepare():
 
     config["field"] = args.field
     config["grep"] = args.grep
+    config["identifier"] = args.identifier
 
     if "regex" in config["clean"].keys():
         config["regex"] = {
@@ -50,19 +55,28 @@ def prepare():
         }
     return config
 
+def grepDocument(config, fileName, document):
+    for subject in document["subjects"]:
+        if re.match(config["grep"], subject.get(config["field"], "")):
+            print(
+                "-------- Match for {} - {}".format(
+                    fileName,
+                    document["identifier"]["value"]
+                )
+            )
+            pprint.pprint(subject)
+
 if __name__ == "__main__":
     config = prepare()
     for fileName in glob.glob(
         os.path.join(config["retrieve"]["baseDir"], config["clean"]["retrieveHash"]) + "/*"):
-        if config["regex"]["dataInput"].match(fileName):
-            with open(fileName) as f:
-                for document in ijson.items(f, 'documents.item'):
-                    for subject in document["subjects"]:
-                        if re.match(config["grep"], subject.get(config["field"], "")):
-                            print(
-                                "-------- Match for {} - {}".format(
-                                    fileName,
-                                    document["identifier"]["value"]
-                                )
-                            )
-                            pprint.pprint(subject)
+        if recordStore.isStore(fileName) and config["identifier"]:
+            document = recordStore.findRecord(fileName, config["identifier"])
+            if document:
+                grepDocument(config, fileName, document)
+        elif recordStore.isStore(fileName) or (
+                config["regex"]["dataInput"].match(fileName) and fileName.endswith(".json")):
+            with recordStore.openDocuments(fileName) as documents:
+                for document in documents:
+                    if config["identifier"] in (None, recordStore.getRecordId(document)):
+                        grepDocument(config, fileName, document)
@@ -1,14 +1,16 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 import retrieveHelpers
+import retrieveShardHelpers
 from concurrent.futures import ProcessPoolExecutor
 from ctypes import c_bool
 import multiprocessing as mp
-from datetime import datetime
+from datetime import datetime, timedelta
 import argparse
 import json
 import re
 import util.util as util
+import util.recordStore as recordStore
 
 def prepare():
     parser = argparse.ArgumentParser(
@@ -19,10 +21,38 @@ def prepare():
             help = "File with the configuration, must contain key 'retrieve'")
     parser.add_argument('--sleep',
             default = 20,
-            help = "Time period to sleep until a harvester is checked during harvesting")
+            help = "Maximal time period to sleep until a harvester is checked during harvesting")
+    parser.add_argument('--minSleep',
+            default = 1,
+            help = "Initial time period to sleep until a harvester is checked,"
+                   " doubled up to --sleep while its state does not change")
+    parser.add_argument('--shardHours',
+            default = 168,
+            help = "Maximal length of the date range of a shard in hours (0 disables sharding)")
+    parser.add_argument('--maxAttempts',
+            default = 3,
+            help = "Number of attempts to harvest a shard")
+    parser.add_argument('--store',
+            default = "jsonl",
+            choices = ["json", "jsonl"],
+            help = "json: copy the records of a harvester (hvUnloadCmd), jsonl:"
+                   " stream them into compressed line-delimited chunks (hvStreamCmd)")
+    parser.add_argument('--storeChunkSize',
+            default = 20000,
+            help = "Number of documents per chunk of the jsonl store (0: one chunk per shard)")
+    parser.add_argument('--hvStreamCmd',
+            default = "docker exec {} cat /var/lib/jetty/cache/records/OaiPmhETL.json",
+            help = "Command writing the records of a harvester to stdout")
     args = parser.parse_args()
     config = util.loadConfig(args.config)
     config["retrieve"]["sleep"] = int(args.sleep)
+    config["retrieve"]["minSleep"] = float(args.minSleep)
+    config["retrieve"]["shardSize"] = timedelta(hours=float(args.shardHours))
+    config["retrieve"]["maxAttempts"] = int(args.maxAttempts)
+    config["retrieve"]["worker"] = len(config["retrieve"]["hvs"])
+    config["retrieve"]["store"] = args.store
+    config["retrieve"]["storeChunkSize"] = int(args.storeChunkSize)
+    config["retrieve"]["hvStreamCmd"] = args.hvStreamCmd
     config["logger"] = util.setupLogging(config, "retrieve")
     return config
 
@@ -33,24 +63,37 @@ if __name__ == "__main__":
     )
 
     # Setup work
-    workpackage = []
+    # clean --follow stops once the marker is written again
+    if os.path.isfile(recordStore.getDonePath(config["retrieve"]["outputDir"])):
+        os.remove(recordStore.getDonePath(config["retrieve"]["outputDir"]))
+    shards = []
     config["retrieve"]["hvConfigRegexCompiled"] = re.compile(config["retrieve"]["hvConfigRegex"])
     config["logger"].info("Load hvConfigs from {}".format(config["retrieve"]["configDir"]))
-    for f in os.listdir(config["retrieve"]["configDir"]):
-        if config["retrieve"]["hvConfigRegexCompiled"].match(f):
-            workpackage.append((config, os.path.join(config["retrieve"]["configDir"],f)))
+    for f in sorted(os.listdir(config["retrieve"]["configDir"])):
+        match = config["retrieve"]["hvConfigRegexCompiled"].match(f)
+        if not match:
+            continue
+        retrievalId = match.group(1)
+        if os.path.isfile(retrieveShardHelpers.getTargetPath(config, retrievalId)):
+            config["logger"].info("{} already exists, skipping".format(retrievalId))
+            continue
+        hvConfig = retrieveHelpers.loadHvConfig(config, os.path.join(config["retrieve"]["configDir"], f))
+        shards += retrieveShardHelpers.planShards(config, retrievalId, hvConfig)
+    util.createDirIfNotExists(retrieveShardHelpers.getShardDir(config))
+    journal = retrieveShardHelpers.Journal(retrieveShardHelpers.getJournalPath(config))
     # And distribute it
     # hvs is necessary to safeguard against race conditions)
     hvs = mp.Array(c_bool, [True]*len(config["retrieve"]["hvs"]))
-    config["logger"].info("Starting {} workers".format(len(config["retrieve"]["hvs"])))
+    config["logger"].info("Starting {} workers".format(config["retrieve"]["worker"]))
     with ProcessPoolExecutor(
-        max_workers=len(config["retrieve"]["hvs"]),
+        max_workers=config["retrieve"]["worker"],
         initializer = retrieveHelpers.init_globals,
         initargs = (hvs, )
     ) as ex:
-        res = zip(workpackage, ex.map(retrieveHelpers.doHarvest, workpackage))
-    for r in res:
-        if r[1]:
-            config["logger"].debug("Success for {}: {}".format(r[0][1], r[1]))
-        else:
-            config["logger"].warn("Unsuccesful run for {}".format(r[0][1]))
+        failed = retrieveShardHelpers.runShards(
+            config, ex, shards, journal, retrieveHelpers.doHarvestShard)
+    if failed:
+        config["logger"].warn("Unsuccesful run for shards {}, run again to resume".format(
+            ", ".join(failed)))
+    with open(recordStore.getDonePath(config["retrieve"]["outputDir"]), "w") as f:
+        json.dump({"failed": failed}, f)
@@ -1,27 +1,44 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+import ijson
+import itertools
 import json
 import logging
-import os
 import random
 import re
-import requests
 import subprocess
-import sys
 import time
+import util.recordStore as recordStore
+from retrieveMonitorHelpers import getSession, getBackoff, waitForHarvester
 
-def doHarvest(payload):
+# Number of unloads tried until the harvester finalized its IO
+UNLOAD_ATTEMPTS = 6
+# Blocks of an unloaded harvest parsed at once and bytes compared to test
+# that a copy continues the previous one, cf. HarvestCheck
+HARVEST_BLOCK_SIZE = 2**20
+HARVEST_TAIL_SIZE = 4096
+
+def doHarvestShard(payload):
+    """
+        Harvests a shard (cf. retrieveShardHelpers.planShards) with a free
+        harvester and unloads it to the target of the shard
+
+        Arguments:
+            payload: iterable, config dictionary first, shard second
+
+        Returns boolean indicating success or failure
+    """
     config = payload[0]
-    fileName = payload[1]
-    config["logger"].info("Starting worker with config {} and fileName {}".format(
-        config["retrieve"]["hash"],
-        fileName
-    ))
-    retrievalId = config["retrieve"]["hvConfigRegexCompiled"].match(fileName).group(1)
-    target = os.path.join(config["retrieve"]["outputDir"], retrievalId + ".json")
-    if os.path.isfile(target):
-        config["logger"].info("{} already exists, skipping".format(retrievalId))
+    shard = payload[1]
+    if os.path.isfile(shard["target"]):
+        config["logger"].info("{} already exists, skipping".format(shard["id"]))
         return True
     config["logger"].info(
-        "================> do harvest with {} ({})".format(retrievalId, fileName)
+        "================> do harvest with {} ({} - {})".format(
+            shard["id"],
+            shard["hvConfig"].get("OaiPmhETL.from"),
+            shard["hvConfig"].get("OaiPmhETL.until")
+        )
     )
     hvIdx = getFreeHarvester(config)
     if not hvIdx in range(len(config["retrieve"]["hvs"])):
@@ -29,49 +46,39 @@ def doHarvest(payload):
         return False
 
     hv = config["retrieve"]["hvs"][hvIdx]
-    hvConfig = loadHvConfig(config, fileName)
-    config["logger"].info(
-        "Loading Harvester {} \n\tfor target {} \n\tunload to {}".format(
-            hv,
-            retrievalId,
-            config["retrieve"]["hvUnloadSrc"][hvIdx]
-        )
-    )
-    loadHarvester(config, hvConfig, hv)
-    startHarvester(config, hv)
-    hvState = "HARVESTING"
-    while hvState in ["HARVESTING", "QUEUED"]:
-        time.sleep(config["retrieve"]["sleep"])
-        config["logger"].debug(
-            "Harvester {} for {} slept {} seconds, checking harvester".format(
-            hv,
-            retrievalId,
-            config["retrieve"]["sleep"])
-        )
-        (hvState, hvHealth) = checkHarvester(config, hv)
-    config["logger"].info(
-        "Harvester {} for {} finished with state {} and health {}".format(
-            hv,
-            retrievalId,
-            hvState,
-            hvHealth
+    try:
+        config["logger"].info(
+            "Loading Harvester {} \n\tfor target {} \n\tunload to {}".format(
+                hv,
+                shard["id"],
+                config["retrieve"]["hvUnloadSrc"][hvIdx]
+            )
         )
-    )
-
-    if hvState == "IDLE":
-        # wait for the harvester to finalize IO of harvest
-        time.sleep(5)
-        unloadHarvester(config, hvIdx, target)
-        returnHarvester(config, hvIdx)
-        return True
-    else:
-        config["logger"].error("Could not unload Harvester {} for {}".format(
+        loadHarvester(config, dict(shard["hvConfig"]), hv)
+        startHarvester(config, hv)
+        (hvState, hvHealth) = waitForHarvester(config, hv)
+        config["logger"].info(
+            "Harvester {} for {} finished with state {} and health {}".format(
                 hv,
-                retrievalId
+                shard["id"],
+                hvState,
+                hvHealth
             )
         )
+
+        if hvState == "IDLE" and config["retrieve"].get("store") == "jsonl":
+            return streamHarvester(config, hvIdx, shard)
+        elif hvState == "IDLE":
+            return unloadHarvester(config, hvIdx, shard["target"])
+        else:
+            config["logger"].error("Could not unload Harvester {} for {}".format(
+                    hv,
+                    shard["id"]
+                )
+            )
+            return False
+    finally:
         returnHarvester(config, hvIdx)
-        return False
 
 def loadHarvester(config, hvConfig, hv):
     headers = {'Content-Type': "application/json"}
@@ -87,7 +94,7 @@ def loadHarvester(config, hvConfig, hv):
     # neutralize parameters since Harvester do not care about
     # meaningful order to change params
     try:
-        r = requests.post(hvUrl, data=json.dumps(neutConfig), headers=headers)
+        r = getSession(hv).post(hvUrl, data=json.dumps(neutConfig), headers=headers)
         config["logger"].debug(
             "Neutralizing difficult hv params: {} {}".format(r.status_code, r.reason))
     except Exception as e:
@@ -95,36 +102,143 @@ def loadHarvester(config, hvConfig, hv):
         raise
 
     try:
-        r = requests.post(hvUrl, data=json.dumps(hvConfig), headers=headers)
+        r = getSession(hv).post(hvUrl, data=json.dumps(hvConfig), headers=headers)
         config["logger"].debug("{} {}".format(r.status_code, r.reason))
     except Exception as e:
         config["logger"].error(e)
         raise
 
-def checkHarvester(config, hv):
-    config["logger"].debug("Checking harvester {}".format(hv))
-    hvUrl = hv
-    r = requests.get(hvUrl)
-    config["logger"].debug("{} {} {}".format(r.status_code, r.reason, r.text))
-    return (
-        json.loads(r.text)["state"],
-        json.loads(r.text)["health"]
-    )
-
 def startHarvester(config, hv):
     hvUrl = hv
-    r = requests.post(hvUrl)
+    r = getSession(hv).post(hvUrl)
     config["logger"].debug("{} {} {}".format(r.status_code, r.reason, r.text))
 
+class HarvestCheck(object):
+    """
+        Tests whether the unloaded harvest at path is complete JSON, i.e. the
+        harvester had finalized its IO. The harvester only appends to its
+        records, so every copy starts with the previous one: the parser is kept
+        between the checks and only the bytes appended since the last check are
+        parsed. A copy that does not continue the previous one is parsed again.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.depth = 0
+        self.closed = False
+        # the bytes before offset, to test that a copy continues the last one
+        self.tail = b""
+        self.parser = ijson.basic_parse_coro(self.count())
+
+    @ijson.utils.coroutine
+    def count(self):
+        while True:
+            (event, value) = yield
+            if event in ("start_map", "start_array"):
+                self.depth += 1
+            elif event in ("end_map", "end_array"):
+                self.depth -= 1
+                self.closed = self.depth == 0
+
+    def isComplete(self):
+        with open(self.path, "rb") as f:
+            f.seek(max(0, self.offset - len(self.tail)))
+            if f.read(len(self.tail)) != self.tail:
+                self.reset()
+                f.seek(0)
+            try:
+                for block in iter(lambda: f.read(HARVEST_BLOCK_SIZE), b""):
+                    self.parser.send(block)
+                    self.offset += len(block)
+                    self.tail = (self.tail + block)[-HARVEST_TAIL_SIZE:]
+            except ijson.JSONError:
+                # not the beginning of the records of the last copy
+                self.reset()
+                return False
+        return self.closed
+
 def unloadHarvester(config, hvIdx, target):
+    """
+        Copies the records of a harvester to target. The copy is repeated
+        with backoff (cf. retrieveMonitorHelpers.getBackoff) while the
+        harvester has not finalized its IO. A failed copy leaves no target
+        behind, so the shard is harvested again.
+
+        Returns boolean indicating success or failure
+    """
     command =  config["retrieve"]["hvUnloadCmd"].format(
-        config["retrieve"]["hvUnloadSrc"][hvIdx], target)
+        config["retrieve"]["hvUnloadSrc"][hvIdx], target + ".tmp")
     config["logger"].debug("unload harvester with {}".format(command))
-    cp = subprocess.run(command.split())
-    if not cp.returncode == 0:
-        emptyPayload = { "documents": [] }
-        with open(target, "w") as f:
-            json.dump(emptyPayload, f)
+    check = HarvestCheck(target + ".tmp")
+    for sleep in itertools.chain([0], itertools.islice(getBackoff(config), UNLOAD_ATTEMPTS - 1)):
+        time.sleep(sleep)
+        cp = subprocess.run(command.split())
+        if not cp.returncode == 0:
+            config["logger"].error("Unloading {} failed with {}".format(target, cp.returncode))
+            return False
+        if check.isComplete():
+            os.replace(target + ".tmp", target)
+            return True
+        config["logger"].debug("Harvest for {} is not finalized yet".format(target))
+    os.remove(target + ".tmp")
+    config["logger"].error("Harvest for {} was never finalized".format(target))
+    return False
+
+def streamHarvester(config, hvIdx, shard):
+    """
+        Streams the records of a harvester into store chunks (cf.
+        util/recordStore.py) without an intermediate copy and marks the shard
+        as done by writing its target. As in unloadHarvester, the stream is
+        repeated with backoff while the harvester has not finalized its IO.
+        Complete chunks are published at once (cf. clean --follow) and kept
+        when the stream is repeated: the harvester only appends to its
+        records, so the repeated stream continues after the documents of the
+        complete chunks.
+
+        Returns boolean indicating success or failure
+    """
+    command = config["retrieve"]["hvStreamCmd"].format(config["retrieve"]["hvUnloadSrc"][hvIdx])
+    config["logger"].debug("stream harvester with {}".format(command))
+    # chunks of an earlier harvest of the shard
+    recordStore.removeShard(config["retrieve"]["outputDir"], shard["id"])
+    writer = recordStore.StoreWriter(
+        config["retrieve"]["outputDir"],
+        shard["id"],
+        config["retrieve"]["storeChunkSize"]
+    )
+    for sleep in itertools.chain([0], itertools.islice(getBackoff(config), UNLOAD_ATTEMPTS - 1)):
+        time.sleep(sleep)
+        process = subprocess.Popen(command.split(), stdout=subprocess.PIPE)
+        try:
+            documents = ijson.items(process.stdout, "documents.item", use_float=True)
+            for document in itertools.islice(documents, writer.count, None):
+                writer.write(document)
+        except ijson.JSONError:
+            process.kill()
+            process.wait()
+            writer.discard()
+            config["logger"].debug("Harvest for {} is not finalized yet, {} documents"
+                                   " are stored".format(shard["id"], writer.count))
+            continue
+        if process.wait() != 0:
+            writer.abort()
+            config["logger"].error("Streaming {} failed with {}".format(
+                shard["id"], process.returncode))
+            return False
+        paths = writer.close()
+        with open(shard["target"], "w") as f:
+            json.dump({
+                "documents": writer.count,
+                "chunks": [os.path.basename(path) for path in paths]
+            }, f)
+        config["logger"].info("Streamed {} documents of {} into {} chunks".format(
+            writer.count, shard["id"], len(paths)))
+        return True
+    config["logger"].error("Harvest for {} was never finalized".format(shard["id"]))
+    return False
 
 def loadHvConfig(config, hvConfigPath):
     with open(hvConfigPath, "r") as f:
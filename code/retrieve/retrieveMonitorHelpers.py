@@ -0,0 +1,242 @@
+import asyncio
+import json
+import ssl
+import urllib.parse
+import requests
+
+"""
+    Monitoring of harvesters with asyncio: each harvester is checked with
+    its own pooled HTTP session and an adaptive backoff. The interval between
+    two checks starts at config["retrieve"]["minSleep"] and grows by
+    BACKOFF_FACTOR up to config["retrieve"]["sleep"] as long as the state of
+    the harvester does not change. Any number of harvesters can be watched
+    concurrently from a single process (watchHarvesters), every retrieve
+    worker watches the harvester it has loaded (waitForHarvester).
+"""
+
+BACKOFF_FACTOR = 2
+BUSY_STATES = ("HARVESTING", "QUEUED")
+
+# One session per harvester and process, see getSession and getAsyncSession
+_SESSIONS = {}
+_ASYNC_SESSIONS = {}
+
+# One event loop per process, so the connections of the async sessions
+# outlive a single wait, see getLoop
+_LOOP = None
+
+def getSession(hv):
+    """
+        Returns the HTTP session of a harvester, so its connection is reused
+        for all requests of this process
+
+        Arguments
+            hv: url of the harvester
+
+        Returns requests.Session
+    """
+    if hv not in _SESSIONS:
+        _SESSIONS[hv] = requests.Session()
+    return _SESSIONS[hv]
+
+def getAsyncSession(hv):
+    """
+        Returns the non-blocking HTTP session of a harvester, so its
+        connection is reused for all checks of this process
+
+        Arguments
+            hv: url of the harvester
+
+        Returns AsyncSession
+    """
+    if hv not in _ASYNC_SESSIONS:
+        _ASYNC_SESSIONS[hv] = AsyncSession(hv)
+    return _ASYNC_SESSIONS[hv]
+
+def getLoop():
+    """
+        Returns the event loop of this process and creates it on first use
+    """
+    global _LOOP
+    if _LOOP is None or _LOOP.is_closed():
+        _LOOP = asyncio.new_event_loop()
+    return _LOOP
+
+def getBackoff(config):
+    """
+        Yields the intervals between two checks of a harvester
+    """
+    sleep = min(config["retrieve"]["minSleep"], config["retrieve"]["sleep"])
+    while True:
+        yield sleep
+        sleep = min(sleep * BACKOFF_FACTOR, config["retrieve"]["sleep"])
+
+class AsyncSession(object):
+    """
+        Minimal HTTP/1.1 client on asyncio streams for the state requests of
+        a harvester. It keeps one connection alive between the requests and
+        reconnects once if the harvester closed it in the meantime.
+    """
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.ssl = ssl.create_default_context() if parsed.scheme == "https" else None
+        self.port = parsed.port or (443 if self.ssl else 80)
+        self.netloc = parsed.netloc
+        self.path = urllib.parse.urlunsplit(("", "", parsed.path or "/", parsed.query, ""))
+        self.reader = None
+        self.writer = None
+        self.loop = None
+
+    async def connect(self):
+        (self.reader, self.writer) = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl)
+        self.loop = asyncio.get_running_loop()
+
+    def close(self):
+        if self.writer is not None and self.loop is asyncio.get_running_loop():
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    async def get(self):
+        """
+            Requests the url of the session
+
+            Returns tuple of status code, reason and body (bytes)
+        """
+        # the streams belong to the loop they were opened with
+        if self.loop is not asyncio.get_running_loop():
+            self.close()
+        reused = self.writer is not None
+        if not reused:
+            await self.connect()
+        try:
+            return await self.request()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+        await self.connect()
+        return await self.request()
+
+    async def request(self):
+        self.writer.write((
+            "GET {} HTTP/1.1\r\n"
+            "Host: {}\r\n"
+            "Accept: application/json\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).format(self.path, self.netloc).encode("latin-1"))
+        await self.writer.drain()
+        statusLine = await self.reader.readline()
+        if not statusLine:
+            raise ConnectionError("Connection closed by {}".format(self.netloc))
+        (version, status, reason) = (statusLine.decode("latin-1").rstrip("\r\n") + " ").split(" ", 2)
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            (name, value) = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        keepAlive = (headers.get("connection", "").lower() != "close"
+                     and version != "HTTP/1.0")
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self.readChunked()
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+            keepAlive = False
+        if not keepAlive:
+            self.close()
+        return (int(status), reason.strip(), body)
+
+    async def readChunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                break
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+        # trailers
+        while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        return b"".join(chunks)
+
+class HarvesterMonitor(object):
+    """
+        Watches a single harvester until it is not busy anymore
+    """
+    def __init__(self, config, hv, session=None):
+        self.config = config
+        self.hv = hv
+        self.session = session if session is not None else getAsyncSession(hv)
+        self.checks = 0
+
+    async def check(self):
+        """
+            Requests the state of the harvester without blocking the other
+            monitors of the loop
+
+            Returns tuple of state and health
+        """
+        (status, reason, body) = await self.session.get()
+        self.checks += 1
+        text = body.decode("utf-8")
+        self.config["logger"].debug("{} {} {}".format(status, reason, text))
+        payload = json.loads(text)
+        return (payload["state"], payload["health"])
+
+    async def waitUntilDone(self, state="HARVESTING"):
+        """
+            Checks the harvester with adaptive backoff until it leaves the
+            busy states
+
+            Arguments
+                state: state the harvester is assumed to be in
+
+            Returns tuple of state and health
+        """
+        health = None
+        backoff = getBackoff(self.config)
+        while state in BUSY_STATES:
+            await asyncio.sleep(next(backoff))
+            (newState, health) = await self.check()
+            if newState != state:
+                backoff = getBackoff(self.config)
+            state = newState
+            self.config["logger"].debug("Harvester {} is {} after {} checks".format(
+                self.hv, state, self.checks))
+        return (state, health)
+
+async def watchHarvesters(config, hvs):
+    """
+        Waits for several harvesters concurrently
+
+        Arguments
+            config: dictionary with the configuration
+            hvs: list of urls of the harvesters
+
+        Returns list of (state, health) tuples in the order of hvs
+    """
+    monitors = [HarvesterMonitor(config, hv) for hv in hvs]
+    return await asyncio.gather(*[monitor.waitUntilDone() for monitor in monitors])
+
+def waitForHarvesters(config, hvs):
+    """
+        Blocks until several harvesters are not busy anymore, cf.
+        watchHarvesters
+
+        Returns list of (state, health) tuples in the order of hvs
+    """
+    return getLoop().run_until_complete(watchHarvesters(config, hvs))
+
+def waitForHarvester(config, hv):
+    """
+        Blocks until a harvester is not busy anymore, cf. HarvesterMonitor
+
+        Returns tuple of state and health
+    """
+    return waitForHarvesters(config, [hv])[0]
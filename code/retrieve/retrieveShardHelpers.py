@@ -0,0 +1,261 @@
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+
+"""
+    Sharded harvesting: the date range (OaiPmhETL.from/until) of each hv
+    config is split into shards which are harvested separately. The state
+    of each shard is appended to a journal (shards/journal.jsonl in the
+    output directory), so an interrupted or partially failed retrieve resumes
+    with the shards that are not done. Once all shards of a retrieval are
+    done, they are merged into <retrievalId>.json as expected by clean.
+    With config["retrieve"]["store"] == "jsonl", shards are streamed into
+    store chunks (cf. util/recordStore.py) instead; the target of a shard
+    or a retrieval is then only a marker (shards/<id>.done).
+"""
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+PENDING = "pending"
+STARTED = "started"
+DONE = "done"
+FAILED = "failed"
+
+def getShardDir(config):
+    return os.path.join(config["retrieve"]["outputDir"], "shards")
+
+def getJournalPath(config):
+    return os.path.join(getShardDir(config), "journal.jsonl")
+
+def isStreamed(config):
+    return config["retrieve"].get("store") == "jsonl"
+
+def getShardPath(config, shardId):
+    if isStreamed(config):
+        return os.path.join(getShardDir(config), shardId + ".done")
+    return os.path.join(getShardDir(config), shardId + ".json")
+
+def getTargetPath(config, retrievalId):
+    if isStreamed(config):
+        return os.path.join(getShardDir(config), retrievalId + ".done")
+    return os.path.join(config["retrieve"]["outputDir"], retrievalId + ".json")
+
+def splitRange(hvConfig, shardSize):
+    """
+        Splits the date range of a hv config into consecutive ranges of at
+        most shardSize. OAI-PMH ranges include both ends, hence a range ends
+        a second before the next one starts.
+
+        Arguments
+            hvConfig: dictionary with the configuration of a harvester
+            shardSize: datetime.timedelta (None disables splitting)
+
+        Returns list of (from, until) tuples of strings, [None] if the range
+        cannot be split
+    """
+    rangeFrom = hvConfig.get("OaiPmhETL.from")
+    rangeUntil = hvConfig.get("OaiPmhETL.until")
+    if not shardSize or not rangeFrom or not rangeUntil:
+        return [None]
+    start = datetime.strptime(rangeFrom, TIME_FORMAT)
+    end = datetime.strptime(rangeUntil, TIME_FORMAT)
+    ranges = []
+    while start + shardSize < end:
+        ranges.append((start.strftime(TIME_FORMAT),
+                       (start + shardSize - timedelta(seconds=1)).strftime(TIME_FORMAT)))
+        start += shardSize
+    ranges.append((start.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT)))
+    return ranges
+
+def getShardWeight(shard):
+    """
+        Estimates the work of a shard by the length of its date range, shards
+        without a range are assumed to be heavy
+    """
+    hvConfig = shard["hvConfig"]
+    if not hvConfig.get("OaiPmhETL.from") or not hvConfig.get("OaiPmhETL.until"):
+        return float("inf")
+    return (datetime.strptime(hvConfig["OaiPmhETL.until"], TIME_FORMAT)
+            - datetime.strptime(hvConfig["OaiPmhETL.from"], TIME_FORMAT)).total_seconds()
+
+def planShards(config, retrievalId, hvConfig):
+    """
+        Returns the shards of a retrieval
+
+        Arguments
+            config: dictionary with the configuration
+            retrievalId: id of the hv config (cf. hvConfigRegex)
+            hvConfig: dictionary with the configuration of the harvester
+
+        Returns list of dictionaries with the keys id, retrievalId, hvConfig
+        and target
+    """
+    shards = []
+    for idx, dateRange in enumerate(splitRange(hvConfig, config["retrieve"].get("shardSize"))):
+        shardConfig = dict(hvConfig)
+        if dateRange:
+            (shardConfig["OaiPmhETL.from"], shardConfig["OaiPmhETL.until"]) = dateRange
+        shardId = "{}.{:04d}".format(retrievalId, idx)
+        shards.append({
+            "id": shardId,
+            "retrievalId": retrievalId,
+            "hvConfig": shardConfig,
+            "target": getShardPath(config, shardId)
+        })
+    return shards
+
+class Journal(object):
+    """
+        Append-only log of the shard states. Only the parent process writes
+        to it; replaying it yields the last state and the number of failed
+        attempts of each shard.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last line of an interrupted run may be partial
+                        continue
+                    self.entries[record["shard"]] = record
+
+    def getState(self, shardId):
+        return self.entries.get(shardId, {}).get("state", PENDING)
+
+    def getAttempts(self, shardId):
+        return self.entries.get(shardId, {}).get("attempts", 0)
+
+    def record(self, shardId, state, attempts=None):
+        record = {
+            "shard": shardId,
+            "state": state,
+            "attempts": self.getAttempts(shardId) if attempts is None else attempts,
+            "time": time.time()
+        }
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        self.entries[shardId] = record
+
+def mergeShards(config, retrievalId, shards):
+    """
+        Concatenates the documents of the shards of a retrieval into its
+        target file and removes the shards (for streamed shards, only their
+        markers are combined)
+
+        Arguments
+            config: dictionary with the configuration
+            retrievalId: id of the retrieval
+            shards: list of shards as returned by planShards, in order
+
+        Returns number of documents
+    """
+    target = getTargetPath(config, retrievalId)
+    count = 0
+    if isStreamed(config):
+        # the documents are in the store chunks already
+        chunks = []
+        for shard in shards:
+            with open(shard["target"], "r") as f:
+                marker = json.load(f)
+            count += marker["documents"]
+            chunks += marker["chunks"]
+        with open(target, "w") as f:
+            json.dump({"documents": count, "chunks": chunks}, f)
+        for shard in shards:
+            os.remove(shard["target"])
+        return count
+    with open(target + ".tmp", "w") as out:
+        out.write('{"documents": [')
+        for shard in shards:
+            with open(shard["target"], "r") as f:
+                documents = json.load(f).get("documents", [])
+            for document in documents:
+                if count:
+                    out.write(", ")
+                out.write(json.dumps(document))
+                count += 1
+        out.write("]}")
+    os.replace(target + ".tmp", target)
+    for shard in shards:
+        os.remove(shard["target"])
+    return count
+
+def runShards(config, executor, shards, journal, harvest):
+    """
+        Harvests the shards which are not done yet. Shards are submitted
+        heaviest first and one at a time per free worker, failed shards are
+        queued again until config["retrieve"]["maxAttempts"] is reached, so
+        all workers stay busy until the queue drains. Retrievals are merged
+        as soon as all their shards are done.
+
+        Arguments
+            config: dictionary with the configuration
+            executor: concurrent.futures.Executor with one worker per harvester
+            shards: list of shards as returned by planShards
+            journal: Journal
+            harvest: function harvesting a shard, called with (config, shard)
+                     and returning a boolean
+
+        Returns list of ids of the shards that failed finally
+    """
+    byRetrieval = {}
+    for shard in shards:
+        byRetrieval.setdefault(shard["retrievalId"], []).append(shard)
+    remaining = {retrievalId: 0 for retrievalId in byRetrieval}
+    queue = deque()
+    for shard in sorted(shards, key=getShardWeight, reverse=True):
+        if journal.getState(shard["id"]) == DONE and os.path.isfile(shard["target"]):
+            continue
+        if journal.getState(shard["id"]) == FAILED:
+            # a new run grants failed shards new attempts
+            journal.record(shard["id"], PENDING, 0)
+        remaining[shard["retrievalId"]] += 1
+        queue.append(shard)
+    failed = []
+    for retrievalId, count in remaining.items():
+        if not count:
+            mergeShards(config, retrievalId, byRetrieval[retrievalId])
+    config["logger"].info("  {} of {} shards to harvest".format(len(queue), len(shards)))
+
+    running = {}
+    while queue or running:
+        while queue and len(running) < config["retrieve"]["worker"]:
+            shard = queue.popleft()
+            journal.record(shard["id"], STARTED)
+            running[executor.submit(harvest, (config, shard))] = shard
+        finished, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+        for future in finished:
+            shard = running.pop(future)
+            try:
+                success = future.result()
+            except Exception as e:
+                config["logger"].error("Shard {} raised {}".format(shard["id"], e))
+                success = False
+            if success:
+                journal.record(shard["id"], DONE)
+                remaining[shard["retrievalId"]] -= 1
+                if not remaining[shard["retrievalId"]]:
+                    count = mergeShards(config, shard["retrievalId"],
+                                        byRetrieval[shard["retrievalId"]])
+                    config["logger"].info("Merged {} ({} documents)".format(
+                        shard["retrievalId"], count))
+                continue
+            attempts = journal.getAttempts(shard["id"]) + 1
+            if attempts < config["retrieve"]["maxAttempts"]:
+                config["logger"].warning("Retrying shard {} (attempt {})".format(
+                    shard["id"], attempts + 1))
+                journal.record(shard["id"], PENDING, attempts)
+                queue.append(shard)
+            else:
+                config["logger"].error("Giving up shard {} after {} attempts".format(
+                    shard["id"], attempts))
+                journal.record(shard["id"], FAILED, attempts)
+                failed.append(shard["id"])
+    return failed
@@ -0,0 +1,162 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+import json
+import re
+import cleanHelpers
+import tempfile
+from cleanCacheHelpers import LRUCache
+import cleanClassifierHelpers
+from cleanClassifierHelpers import (SchemeClassifier, compileMapping, getSchemeClassifier,
+                                    getLabelCachePath, loadLabelCache, mergeLabelCaches,
+                                    saveLabelCache, saveWorkerLabelCache)
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+def getTestConfig():
+    with open(os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.realpath(__file__))))),
+            "config", "m_config.json"), "r") as f:
+        config = json.load(f)
+    config["clean"]["schemes"].append("linsearch")
+    config["regex"] = cleanHelpers.compileRegexes(config)
+    return config
+
+def getTestSubjects():
+    subjects = []
+    for code in range(0, 100000, 997):
+        subjects.append({
+            "value": "{:06d} some text".format(code),
+            "schemeURI": "http://www.abs.gov.au/ausstats"
+                         "/abs@.nsf/0/6BB427AB9696C225CA2574180004463E"
+        })
+    for code in range(1000):
+        subjects.append({"value": "{:03d}".format(code), "subjectScheme": "ddc"})
+        subjects.append({"value": "ddc {:03d}".format(code), "subjectScheme": "dewey"})
+        subjects.append({"value": "{:02d}.{:02d}".format(code // 10, code % 100),
+                         "subjectScheme": "bk"})
+    for code in range(13000, 42000, 37):
+        subjects.append({
+            "value": "narcis",
+            "valueURI": "http://www.narcis.nl/classfication/D{}".format(code),
+            "subjectScheme": "NARCIS-classification"
+        })
+    for value in ("Applied Mathematics", "Other Religion", "Unknown",
+                  "Earth Sciences and Geology", "history", "Law", " "):
+        for scheme in ("bepress Digital Commons Three-Tiered Taxonomy",
+                       "linsearch", "ddc", "keyword"):
+            subjects.append({"value": value, "subjectScheme": scheme})
+    return subjects
+
+config = getTestConfig()
+
+################################################################################
+# TESTS
+################################################################################
+def testCompileMappingFirstMatchWins():
+    regex, groupLabels = compileMapping([
+        [1, re.compile('^ab')],
+        [2, re.compile('^a')],
+        [3, re.compile('^B', re.IGNORECASE)]
+    ])
+    assert groupLabels[regex.match("abc").lastgroup] == 1
+    assert groupLabels[regex.match("ac").lastgroup] == 2
+    assert groupLabels[regex.match("bc").lastgroup] == 3
+    assert regex.match("c") is None
+
+def testClassifierEqualsGetLabel():
+    classifier = SchemeClassifier(config)
+    labelled = 0
+    for subject in getTestSubjects():
+        row = cleanHelpers.initResultRow(config)
+        compiledRow = cleanHelpers.initResultRow(config)
+        label = cleanHelpers.getLabel(config, subject, row)
+        assert classifier.getLabel(subject, compiledRow) == label
+        assert compiledRow == row
+        if label:
+            labelled += 1
+    assert labelled > 0
+
+def testGetSchemeClassifierIsBuiltOnce():
+    classifier = getSchemeClassifier(config)
+    assert getSchemeClassifier(config) is classifier
+
+def testLRUCacheEvictsLeastRecentlyUsed():
+    cache = LRUCache(2)
+    cache.put("a", (None, None))
+    cache.put("b", ("ddc", 1))
+    assert cache.get("a") == (None, None)
+    cache.put("c", ("bk", 2))
+    assert cache.get("b") is None
+    assert cache.get("c") == ("bk", 2)
+    assert cache.getStatistics()["hits"] == 2
+    assert cache.getStatistics()["misses"] == 1
+    assert len(cache) == 2
+
+def testCachedClassifierEqualsGetLabel():
+    classifier = SchemeClassifier(config, LRUCache(10000))
+    # twice, to classify from the cache in the second pass
+    for subject in getTestSubjects() + getTestSubjects():
+        row = cleanHelpers.initResultRow(config)
+        cachedRow = cleanHelpers.initResultRow(config)
+        assert (classifier.getLabel(subject, cachedRow)
+                == cleanHelpers.getLabel(config, subject, row))
+        assert cachedRow == row
+    assert classifier.cache.hits > 0
+
+def testCacheKeyIsNormalized():
+    classifier = SchemeClassifier(config, LRUCache(100))
+    bepress = "bepress Digital Commons Three-Tiered Taxonomy"
+    variants = [
+        {"value": "Applied Mathematics", "subjectScheme": bepress},
+        {"value": "  applied mathematics ", "subjectScheme": bepress},
+        {"value": "APPLIED MATHEMATICS",
+         "subjectScheme": " Bepress digital commons three-tiered taxonomy"},
+        {"value": "Unknown", "subjectScheme": bepress},
+        {"value": "unknown ", "subjectScheme": bepress},
+        # the ddc mapping is case sensitive, its values are not lowered
+        {"value": "550 ", "subjectScheme": "ddc"},
+        {"value": "550", "subjectScheme": "ddc"},
+        {"value": "ddc 550", "subjectScheme": "dewey"},
+        {"value": "DDC 550", "subjectScheme": "dewey"}
+    ]
+    for subject in variants:
+        row = cleanHelpers.initResultRow(config)
+        cachedRow = cleanHelpers.initResultRow(config)
+        assert (classifier.getLabel(subject, cachedRow)
+                == cleanHelpers.getLabel(config, subject, row))
+        assert cachedRow == row
+    assert classifier.cache.getStatistics()["hits"] == 4
+    assert len(classifier.cache) == 5
+
+def testPersistedLabelCache():
+    cache = LRUCache(10)
+    cache.put(("ddc", None, "550", None), ("ddc", 4))
+    with tempfile.TemporaryDirectory() as tmpDir:
+        path = os.path.join(tmpDir, "labelCache", "test.pkl")
+        saveLabelCache(cache, config, path)
+        loaded = LRUCache(10)
+        assert loadLabelCache(loaded, config, path) == 1
+        assert loaded.get(("ddc", None, "550", None)) == ("ddc", 4)
+        otherConfig = dict(config, clean=dict(config["clean"], schemes=["ddc"]))
+        assert loadLabelCache(LRUCache(10), otherConfig, path) == 0
+
+def testWorkerLabelCacheIsMerged():
+    with tempfile.TemporaryDirectory() as tmpDir:
+        tmpConfig = dict(config, clean=dict(config["clean"], baseDir=tmpDir))
+        classifier = SchemeClassifier(tmpConfig, LRUCache(10))
+        classifier.getLabel({"value": "550", "subjectScheme": "ddc"},
+                            cleanHelpers.initResultRow(tmpConfig))
+        previous = cleanClassifierHelpers._CLASSIFIER
+        cleanClassifierHelpers._CLASSIFIER = classifier
+        try:
+            saveWorkerLabelCache()
+        finally:
+            cleanClassifierHelpers._CLASSIFIER = previous
+        assert os.path.isfile(getLabelCachePath(tmpConfig, os.getpid()))
+        tmpConfig["labelCache"] = {"size": 10, "persist": True}
+        assert mergeLabelCaches(tmpConfig) == 1
+        assert not os.path.isfile(getLabelCachePath(tmpConfig, os.getpid()))
@@ -0,0 +1,104 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+import numpy as np
+import cleanDuplicateHelpers
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+config = {
+    "nearDuplicates": {
+        "enabled": True,
+        "threshold": 0.8,
+        "permutations": 128,
+        "bands": 16,
+        "shingleSize": 5
+    }
+}
+
+series = ("daily temperature and precipitation measurements of the weather "
+          "station on the research vessel polarstern during cruise {}")
+texts = [
+    series.format("ps101"),
+    "sediment cores of the north sea collected in spring",
+    series.format("ps102"),
+    "interview transcripts on urban mobility",
+    series.format("ps103"),
+    "sediment  cores of the north sea collected in spring"
+]
+
+def getSignatures(texts):
+    permutations = cleanDuplicateHelpers.getPermutations(config)
+    return cleanDuplicateHelpers.getSignatures(config, texts, permutations)
+
+################################################################################
+# TESTS
+################################################################################
+def testSignatures():
+    signatures = getSignatures(texts + [""])
+    assert signatures.shape == (7, 128) and signatures.dtype == np.uint32
+    # whitespace is normalized, signatures are deterministic
+    assert (signatures[1] == signatures[5]).all()
+    assert (signatures == getSignatures(texts + [""])).all()
+    similarity = (signatures[0] == signatures[2]).mean()
+    assert similarity > 0.8
+    assert (signatures[0] == signatures[3]).mean() < 0.2
+
+def testFindClustersAcrossChunks():
+    signatures = getSignatures(texts)
+    roots = cleanDuplicateHelpers.findClusters(
+        config, [signatures[:2], signatures[2:2], signatures[2:]])
+    assert list(roots) == [0, 1, 0, 3, 0, 1]
+    config["nearDuplicates"]["threshold"] = 1.0
+    try:
+        roots = cleanDuplicateHelpers.findClusters(config, [signatures])
+    finally:
+        config["nearDuplicates"]["threshold"] = 0.8
+    assert list(roots) == [0, 1, 2, 3, 4, 1]
+
+def testPayloadIndex(tmp_path, monkeypatch):
+    monkeypatch.setattr(cleanDuplicateHelpers, "MERGE_SIZE", 2)
+    monkeypatch.setattr(cleanDuplicateHelpers, "MERGE_BLOCK_SIZE", 2)
+    hashes = ["{:032x}".format(i * 7919) + "0" * 32 for i in range(6)]
+    for directory in (None, str(tmp_path)):
+        index = cleanDuplicateHelpers.PayloadIndex(directory)
+        batches = [hashes[:3] + hashes[:1], hashes[2:5], hashes[4:] + hashes[4:], hashes[:2]]
+        isDuplicate = [list(index.add(cleanDuplicateHelpers.toDigests(batch)))
+                       for batch in batches]
+        assert isDuplicate == [
+            [False, False, False, True],
+            [True, False, False],
+            [True, False, True, True],
+            [True, True]
+        ]
+        assert len(index) == 6
+        assert list(index.getCounts(cleanDuplicateHelpers.toDigests(hashes + ["f" * 64]))) == [
+            3, 2, 2, 1, 3, 2, 0]
+        assert index.getStatistics() == {
+            "payloads": 13,
+            "distinct": 6,
+            "duplicates": 7,
+            "occurrences": {"1": 1, "2": 3, "3": 2}
+        }
+        index.close()
+    assert os.listdir(str(tmp_path)) == []
+
+def testMergeInBlocks(tmp_path, monkeypatch):
+    rng = np.random.RandomState(0)
+    digests = np.unique(rng.randint(0, 1 << 8, (400, 2)).astype(np.uint64), axis=0)
+    isOther = rng.rand(len(digests)) < 0.3
+    counts = rng.randint(1, 5, len(digests)).astype(np.uint32)
+    index = cleanDuplicateHelpers.PayloadIndex(str(tmp_path))
+    expected = index.merge(digests[~isOther], counts[~isOther],
+                           digests[isOther], counts[isOther])
+    for (blockSize, mainSize) in ((1, len(digests)), (7, 0), (64, 3), (1 << 20, len(digests))):
+        monkeypatch.setattr(cleanDuplicateHelpers, "MERGE_BLOCK_SIZE", blockSize)
+        isMain = ~isOther & (np.cumsum(~isOther) <= mainSize)
+        isRest = ~isMain
+        (keys, mergedCounts) = index.merge(digests[isMain], counts[isMain], digests[isRest],
+                                           counts[isRest], str(tmp_path / "run"))
+        assert np.array_equal(keys, digests) and np.array_equal(mergedCounts, counts)
+    assert np.array_equal(expected[0], digests) and np.array_equal(expected[1], counts)
+    index.close()
@@ -0,0 +1,61 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import util.recordStore as recordStore
+import cleanFollowHelpers
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+def getConfig(tmp_path):
+    (tmp_path / "retrieve" / "rh").mkdir(parents=True)
+    (tmp_path / "clean").mkdir()
+    return {
+        "retrieve": {"baseDir": str(tmp_path / "retrieve")},
+        "clean": {"retrieveHash": "rh", "outputDir": str(tmp_path / "clean")},
+        "regex": {"dataInput": re.compile(r".*([a-f0-9]{2})\.json")},
+        "incremental": False,
+        "follow": {"enabled": True, "interval": 0.01},
+        "logger": logging.getLogger("test")
+    }
+
+def retrieve(directory):
+    """ Writes store chunks one after another, then the done marker """
+    for shard in range(3):
+        writer = recordStore.StoreWriter(directory, "0a.{:04d}".format(shard))
+        writer.write({"shard": shard})
+        writer.close()
+        time.sleep(0.05)
+    with open(recordStore.getDonePath(directory), "w") as f:
+        f.write("{}")
+
+################################################################################
+# TESTS
+################################################################################
+def testFollowRetrieve(tmp_path):
+    config = getConfig(tmp_path)
+    directory = str(tmp_path / "retrieve" / "rh")
+    processed = []
+    def process(instruction):
+        (config, filePath, entry) = instruction
+        # the retrieve is still running while the first chunks are cleaned
+        processed.append((os.path.basename(filePath),
+                          os.path.isfile(recordStore.getDonePath(directory))))
+        return {"input": os.path.basename(filePath)}
+    retriever = threading.Thread(target=retrieve, args=(directory, ))
+    retriever.start()
+    manifest = {"chunks": {}}
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        submitted = cleanFollowHelpers.followRetrieve(config, ex, manifest, process)
+    retriever.join()
+    assert submitted == 3
+    assert sorted(name for (name, _) in processed) == [
+        "0a.0000.0000.jsonl.gz", "0a.0001.0000.jsonl.gz", "0a.0002.0000.jsonl.gz"]
+    assert not processed[0][1]
+    assert sorted(manifest["chunks"].keys()) == ["0a-0000-0000", "0a-0001-0000", "0a-0002-0000"]
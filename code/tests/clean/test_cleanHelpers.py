@@ -0,0 +1,50 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+import json
+import logging
+import cleanHelpers
+import util.recordStore as recordStore
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+def getTestConfig():
+    with open(os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+                os.path.realpath(__file__))))),
+            "config", "m_config.json"), "r") as f:
+        config = json.load(f)
+    config["regex"] = cleanHelpers.compileRegexes(config)
+    config["clean"]["special"] = {"f1.json": 7}
+    config["langDetection"] = {"cacheSize": 0, "batchSize": 10}
+    config["logger"] = logging.getLogger("test")
+    return config
+
+# a DOAJ record, it has neither identifier nor subjects
+documents = [{"titles": [{"value": "A special record of the ocean floor"}]}]
+
+################################################################################
+# TESTS
+################################################################################
+def testGetRetrievedFileName():
+    assert cleanHelpers.getRetrievedFileName("/data/f1.0002.0001.jsonl.gz") == "f1.json"
+    assert cleanHelpers.getRetrievedFileName("/data/f1.json") == "f1.json"
+
+def testSpecialStoreChunk(tmp_path):
+    config = getTestConfig()
+    writer = recordStore.StoreWriter(str(tmp_path), "f1.0000")
+    for document in documents:
+        writer.write(document)
+    (path,) = writer.close()
+    fileName = os.path.basename(path)
+    assert cleanHelpers.isSpecialChunk(config, fileName)
+    assert not cleanHelpers.isSpecialChunk(config, "05.0000.0000.jsonl.gz")
+    with recordStore.openDocuments(path) as chunkDocuments:
+        result = cleanHelpers.cleanDocuments(config, fileName, "f1-0000-0000",
+                                             enumerate(chunkDocuments))
+    ((_, row),) = result
+    assert row["id"] == "f1.0000.0000.jsonl.gz_0"
+    assert row["labels"] == 1 << 7
+    assert row["special"]
@@ -0,0 +1,51 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+from langdetect import DetectorFactory
+from cleanCacheHelpers import LRUCache
+from cleanLangHelpers import LangDetector, isObviouslyEnglish, getLangProbability, UNDETECTABLE
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+DetectorFactory.seed = 1234
+prefilter = {"asciiRatio": 0.99, "stopWordRatio": 0.2, "minWords": 8}
+config = {"clean": {"lang": "en", "langPrefilter": prefilter}}
+texts = [
+    "We propose new methods for finding confidence intervals on the attributable"
+    " treatment effect in such settings.",
+    "Die Ergebnisse der Untersuchung werden in diesem Bericht dargestellt.",
+    "Complex Procrustes problems",
+    "1234 5678",
+    "Complex Procrustes problems"
+]
+
+################################################################################
+# TESTS
+################################################################################
+def testIsObviouslyEnglish():
+    assert isObviouslyEnglish(texts[0], prefilter)
+    assert not isObviouslyEnglish(texts[1], prefilter)
+    assert not isObviouslyEnglish(texts[2], prefilter)
+    assert not isObviouslyEnglish("", prefilter)
+
+def testCachedDetectionEqualsDetection():
+    detector = LangDetector({"clean": {"lang": "en"}}, LRUCache(10))
+    for text in texts:
+        try:
+            expected = getLangProbability(text, "en")
+        except Exception:
+            expected = UNDETECTABLE
+        assert detector.getProbability(text) == expected
+    assert detector.cache.hits == 1
+    assert detector.prefiltered == 0
+
+def testBatchDetection():
+    detector = LangDetector(config, LRUCache(10))
+    probabilities = detector.getProbabilities(texts)
+    assert len(probabilities) == 4
+    assert probabilities[texts[0]] == 1.0
+    assert probabilities[texts[3]] == UNDETECTABLE
+    assert detector.prefiltered == 1
+    assert detector.getProbabilities(texts) == probabilities
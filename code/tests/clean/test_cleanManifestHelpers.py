@@ -0,0 +1,97 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+import re
+import util.util as util
+import cleanManifestHelpers
+from cleanConquerHelpers import getPartPath, PART_KINDS, NEAR_DUPLICATE_PART_KINDS
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+def getConfig(tmp_path):
+    outputDir = tmp_path / "clean"
+    outputDir.mkdir()
+    return {
+        "clean": {"outputDir": str(outputDir), "mappingHash": "m1"},
+        "regex": {
+            "dataInput": re.compile(r".*([a-f0-9]{2})\.json"),
+            "dataOutput": re.compile(r".*[a-f0-9]{2}\.chunk\.json")
+        }
+    }
+
+def getEntry(config, filePath):
+    entry = cleanManifestHelpers.getInputState(config, filePath)
+    entry["inputHash"] = util.getFileHash(filePath)
+    entry["mapped"] = True
+    return entry
+
+################################################################################
+# TESTS
+################################################################################
+def testStaleness(tmp_path):
+    config = getConfig(tmp_path)
+    filePath = str(tmp_path / "0a.json")
+    with open(filePath, "w") as f:
+        f.write('{"documents": []}')
+    entry = getEntry(config, filePath)
+    assert not cleanManifestHelpers.isUnchanged(config, entry, filePath)
+    with open(cleanManifestHelpers.getChunkPath(config, "0a"), "w") as f:
+        f.write("[]")
+    assert cleanManifestHelpers.isUnchanged(config, entry, filePath)
+    assert not cleanManifestHelpers.isUnchanged(config, None, filePath)
+    # a rewrite with the same content is only recognized by its hash
+    os.utime(filePath, (0, 0))
+    assert not cleanManifestHelpers.isUnchanged(config, entry, filePath)
+    assert cleanManifestHelpers.isContentUnchanged(config, entry, getEntry(config, filePath))
+    # without --incremental, files are not hashed
+    unhashed = dict(entry, inputHash=None)
+    assert not cleanManifestHelpers.isContentUnchanged(config, unhashed, dict(unhashed))
+    config["clean"]["mappingHash"] = "m2"
+    assert not cleanManifestHelpers.isContentUnchanged(config, entry, getEntry(config, filePath))
+
+def testSaveLoadAndPrune(tmp_path):
+    config = getConfig(tmp_path)
+    manifest = cleanManifestHelpers.loadManifest(config)
+    assert manifest == {"chunks": {}}
+    manifest["chunks"]["0a"] = {"input": "0a.json"}
+    manifest["chunks"]["0b"] = {"input": "0b.json"}
+    cleanManifestHelpers.saveManifest(config, manifest)
+    for chunkId in ("0a", "0b", "0c"):
+        with open(cleanManifestHelpers.getChunkPath(config, chunkId), "w") as f:
+            f.write("[]")
+    util.createDirIfNotExists(os.path.dirname(getPartPath(config, "0b", "result")))
+    for kind in PART_KINDS:
+        with open(getPartPath(config, "0b", kind), "w") as f:
+            f.write("")
+    manifest = cleanManifestHelpers.loadManifest(config)
+    assert cleanManifestHelpers.hasParts(config, "0b")
+    assert cleanManifestHelpers.pruneChunks(config, manifest, ["0a"]) == ["0b", "0c"]
+    assert list(manifest["chunks"].keys()) == ["0a"]
+    assert not cleanManifestHelpers.hasParts(config, "0b")
+    assert sorted(os.listdir(config["clean"]["outputDir"])) == ["0a.chunk.json", "manifest.json", "parts"]
+
+def testIsMapped(tmp_path):
+    config = getConfig(tmp_path)
+    util.createDirIfNotExists(os.path.dirname(getPartPath(config, "0a", "result")))
+    for kind in PART_KINDS + NEAR_DUPLICATE_PART_KINDS:
+        with open(getPartPath(config, "0a", kind), "w") as f:
+            f.write("")
+    entry = {"mapped": False}
+    assert not cleanManifestHelpers.isMapped(config, entry, "0a")
+    cleanManifestHelpers.setMapped(config, entry)
+    assert entry == {"mapped": True, "minhash": None}
+    assert cleanManifestHelpers.isMapped(config, entry, "0a")
+    # minhash parts mapped without or with other parameters are mapped again
+    config["nearDuplicates"] = {"enabled": True, "permutations": 128, "shingleSize": 5}
+    assert not cleanManifestHelpers.isMapped(config, entry, "0a")
+    cleanManifestHelpers.setMapped(config, entry)
+    assert cleanManifestHelpers.isMapped(config, entry, "0a")
+    assert cleanManifestHelpers.getMapState(entry) == {
+        "mapped": True, "minhash": {"permutations": 128, "shingleSize": 5}}
+    for (key, value) in (("permutations", 64), ("shingleSize", 4)):
+        changed = dict(config, nearDuplicates=dict(config["nearDuplicates"], **{key: value}))
+        assert not cleanManifestHelpers.isMapped(changed, entry, "0a")
+    config["nearDuplicates"]["enabled"] = False
+    assert cleanManifestHelpers.isMapped(config, entry, "0a")
@@ -0,0 +1,114 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+import json
+import logging
+import re
+import util.recordStore as recordStore
+from util.jsonBackends import getJsonBackends
+import cleanSplitHelpers
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+documents = [{"identifier": {"value": str(i)}, "subjects": []} for i in range(5)]
+
+def getConfig(tmp_path):
+    (tmp_path / "clean").mkdir()
+    return {
+        "clean": {"outputDir": str(tmp_path / "clean"), "mappingHash": "mh"},
+        "regex": {"dataInput": re.compile(r".*([a-f0-9]{2})\.json")},
+        "split": {"size": 1},
+        "worker": 3,
+        "incremental": False,
+        "logger": logging.getLogger("test")
+    }
+
+def cleanParts(config, path, parts):
+    """ Cleans the parts like processPart, a row being the document id """
+    backends = getJsonBackends(config)
+    fileId = cleanSplitHelpers.getFileId(config, os.path.basename(path))
+    partFiles = []
+    for part in parts:
+        rows = [{"id": d["identifier"]["value"], "index": i}
+                for (i, d) in cleanSplitHelpers.iterPartDocuments(path, part, backends)]
+        partFiles.append(cleanSplitHelpers.getSplitPartPath(config, fileId, part))
+        with open(partFiles[-1], "wb") as f:
+            f.write(backends.codec.dumps(rows))
+    return partFiles
+
+def checkMerged(config, path, partFiles):
+    state = cleanSplitHelpers.mergeParts(config, path, partFiles, "hash")
+    assert state["inputHash"] == "hash" and not state["mapped"]
+    fileId = cleanSplitHelpers.getFileId(config, os.path.basename(path))
+    with open(cleanSplitHelpers.getChunkPath(config, fileId), "r") as f:
+        assert json.load(f) == [{"id": str(i), "index": i} for i in range(5)]
+    assert not any(os.path.isfile(p) for p in partFiles)
+
+################################################################################
+# TESTS
+################################################################################
+def testSplitStoreChunk(tmp_path):
+    config = getConfig(tmp_path)
+    writer = recordStore.StoreWriter(str(tmp_path), "0a.0000", blockSize=2)
+    for document in documents:
+        writer.write(document)
+    [path] = writer.close()
+    parts = cleanSplitHelpers.getSplitParts(config, path)
+    assert [part["blocks"] for part in parts] == [(0, 1), (1, 2), (2, 3)]
+    checkMerged(config, path, cleanParts(config, path, parts))
+
+def testSplitJsonFile(tmp_path):
+    config = getConfig(tmp_path)
+    path = str(tmp_path / "0a.json")
+    with open(path, "w") as f:
+        json.dump({"documents": documents}, f)
+    parts = cleanSplitHelpers.getSplitParts(config, path)
+    assert [(part["index"], part["parts"], part["blocks"]) for part in parts] == [
+        (0, 3, None), (1, 3, None), (2, 3, None)]
+    # consecutive documents, each part only reads its bytes
+    assert [part["first"] for part in parts] == [0, 1, 3]
+    with open(path, "rb") as f:
+        text = f.read()
+    assert [text[slice(*part["bytes"])].count(b"identifier") for part in parts] == [1, 2, 2]
+    checkMerged(config, path, cleanParts(config, path, parts))
+    # small files and existing output are not split
+    config["split"]["size"] = os.path.getsize(path)
+    assert cleanSplitHelpers.getSplitParts(config, path) is None
+    config["split"]["size"] = 1
+    assert cleanSplitHelpers.getSplitParts(config, path) is None
+
+def testGetDocumentOffsets(tmp_path, monkeypatch):
+    path = str(tmp_path / "0a.json")
+    tricky = [
+        {"titles": [{"value": 'a "quoted" {[list]} \\'}], "subjects": [{"value": "}]"}]},
+        {"titles": [{"value": "\\\"[{"}]},
+        {}
+    ]
+    with open(path, "w") as f:
+        json.dump({"meta": [{"documents": [{}]}], "documents": tricky, "more": [{}]}, f)
+    with open(path, "rb") as f:
+        text = f.read()
+    for blockSize in (2**24, 1, 7):
+        monkeypatch.setattr(cleanSplitHelpers, "SCAN_BLOCK_SIZE", blockSize)
+        (starts, ends) = cleanSplitHelpers.getDocumentOffsets(path)
+        assert [json.loads(text[start:end]) for (start, end) in zip(starts, ends)] == tricky
+    with open(path, "w") as f:
+        f.write('{"documents": [{"id": "0"}, {"id"')
+    assert cleanSplitHelpers.getDocumentOffsets(path) is None
+
+def testMayBeUnchanged(tmp_path):
+    config = getConfig(tmp_path)
+    path = str(tmp_path / "0a.json")
+    with open(path, "w") as f:
+        json.dump({"documents": documents}, f)
+    entry = {"inputHash": "old", "mappingHash": "mh"}
+    # without output, the file is cleaned anyway
+    assert not cleanSplitHelpers.mayBeUnchanged(config, path, entry)
+    with open(cleanSplitHelpers.getChunkPath(config, "0a"), "w") as f:
+        json.dump([], f)
+    assert not cleanSplitHelpers.mayBeUnchanged(config, path, entry)
+    config["incremental"] = True
+    assert cleanSplitHelpers.mayBeUnchanged(config, path, entry)
+    assert not cleanSplitHelpers.mayBeUnchanged(config, path, None)
@@ -0,0 +1,52 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "clean"))
+import nltk
+import pytest
+from nltk.stem.lancaster import LancasterStemmer
+from nltk.stem.porter import PorterStemmer
+import util.util as util
+import cleanStemHelpers
+from cleanCacheHelpers import LRUCache
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+payloads = [
+    "measurements of running rivers and the rivers running dry",
+    "generalized running measurements",
+    ""
+]
+
+@pytest.fixture
+def tokenize(monkeypatch):
+    # the punkt models are not needed to compare the stemmers
+    monkeypatch.setattr(util, "word_tokenize", str.split)
+    monkeypatch.setattr(cleanStemHelpers, "word_tokenize", str.split)
+
+################################################################################
+# TESTS
+################################################################################
+def testPayloadStemmerEqualsStem(tokenize):
+    stemmer = cleanStemHelpers.PayloadStemmer(LRUCache(100))
+    for payload in payloads:
+        assert stemmer.stem(payload) == (
+            util.stem(payload, LancasterStemmer()),
+            util.stem(payload, PorterStemmer())
+        )
+    statistics = stemmer.cache.getStatistics()
+    assert statistics["size"] == 8
+    assert statistics["hits"] == 4
+    assert cleanStemHelpers.PayloadStemmer().stem(payloads[0]) == stemmer.stem(payloads[0])
+
+def testLoadTokenizerUsesLocalCache(tmp_path, monkeypatch):
+    config = {"base": {"dir": str(tmp_path)}}
+    (name, path) = util.TOKENIZER_RESOURCE
+    os.makedirs(os.path.join(util.getNltkDataDir(config), path))
+    def download(*args, **kwargs):
+        raise AssertionError("no download expected")
+    monkeypatch.setattr(nltk, "download", download)
+    monkeypatch.setattr(nltk.data, "path", list(nltk.data.path))
+    util.loadTokenizer(config)
+    assert nltk.data.path[0] == util.getNltkDataDir(config)
@@ -0,0 +1,86 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "retrieve"))
+import asyncio
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import retrieveMonitorHelpers as monitorHelpers
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+config = {
+    "retrieve": {"minSleep": 0.01, "sleep": 0.04},
+    "logger": logging.getLogger("test")
+}
+
+class FakeHarvester(BaseHTTPRequestHandler):
+    """ Each path is a harvester that is busy for a number of checks """
+    protocol_version = "HTTP/1.1"
+    busyChecks = {"/a": 3, "/b": 6, "/c": 2}
+    checks = {}
+    connections = set()
+    log = []
+
+    def do_GET(self):
+        FakeHarvester.connections.add(self.client_address)
+        FakeHarvester.log.append(self.path)
+        checks = FakeHarvester.checks.get(self.path, 0) + 1
+        FakeHarvester.checks[self.path] = checks
+        state = "HARVESTING" if checks <= self.busyChecks[self.path] else "IDLE"
+        body = json.dumps({"state": state, "health": "OK"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    FakeHarvester.checks = {}
+    FakeHarvester.connections = set()
+    FakeHarvester.log = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeHarvester)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+################################################################################
+# TESTS
+################################################################################
+def testBackoff():
+    backoff = monitorHelpers.getBackoff(config)
+    assert [next(backoff) for _ in range(4)] == [0.01, 0.02, 0.04, 0.04]
+
+def testWaitForHarvester(server):
+    assert monitorHelpers.waitForHarvester(config, server + "/a") == ("IDLE", "OK")
+    assert FakeHarvester.checks["/a"] == 4
+    # all checks share the pooled connection of the harvester, also across
+    # waits
+    assert monitorHelpers.waitForHarvester(config, server + "/a") == ("IDLE", "OK")
+    assert FakeHarvester.checks["/a"] == 5
+    assert len(FakeHarvester.connections) == 1
+
+def testWatchHarvesters(server):
+    states = monitorHelpers.waitForHarvesters(config, [server + "/b", server + "/c"])
+    assert states == [("IDLE", "OK"), ("IDLE", "OK")]
+    assert FakeHarvester.checks == {"/b": 7, "/c": 3}
+    # one pooled connection per harvester
+    assert len(FakeHarvester.connections) == 2
+
+def testWatchHarvestersConcurrently(server):
+    async def watch():
+        return await monitorHelpers.watchHarvesters(config, [server + "/b", server + "/c"])
+    assert asyncio.run(watch()) == [("IDLE", "OK"), ("IDLE", "OK")]
+    # the monitors share the loop, all checks of /c are done while /b is
+    # still busy
+    assert FakeHarvester.log[:6].count("/c") == 3
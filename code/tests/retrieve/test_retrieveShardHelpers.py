@@ -0,0 +1,178 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "retrieve"))
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import retrieveHelpers
+import retrieveShardHelpers as shardHelpers
+import util.recordStore as recordStore
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+hvConfig = {
+    "OaiPmhETL.hostURL": "https://oai.datacite.org/oai",
+    "OaiPmhETL.from": "2014-12-07T00:00:00Z",
+    "OaiPmhETL.until": "2014-12-07T09:30:00Z"
+}
+
+def getConfig(tmp_path):
+    config = {
+        "retrieve": {
+            "outputDir": str(tmp_path),
+            "shardSize": timedelta(hours=4),
+            "maxAttempts": 2,
+            "worker": 2
+        },
+        "logger": logging.getLogger("test")
+    }
+    os.makedirs(shardHelpers.getShardDir(config))
+    return config
+
+def getFakeHarvest(failures):
+    """ Harvests the shard id as only document, fails failures[id] times """
+    def harvest(payload):
+        (config, shard) = payload
+        if failures.get(shard["id"], 0) > 0:
+            failures[shard["id"]] -= 1
+            return False
+        with open(shard["target"], "w") as f:
+            json.dump({"documents": [{"id": shard["id"]}]}, f)
+        return True
+    return harvest
+
+################################################################################
+# TESTS
+################################################################################
+def testSplitRange():
+    ranges = shardHelpers.splitRange(hvConfig, timedelta(hours=4))
+    assert ranges == [
+        ("2014-12-07T00:00:00Z", "2014-12-07T03:59:59Z"),
+        ("2014-12-07T04:00:00Z", "2014-12-07T07:59:59Z"),
+        ("2014-12-07T08:00:00Z", "2014-12-07T09:30:00Z")
+    ]
+    assert shardHelpers.splitRange(hvConfig, None) == [None]
+    assert shardHelpers.splitRange({"OaiPmhETL.from": ""}, timedelta(hours=4)) == [None]
+
+def testRunShardsRetriesAndMerges(tmp_path):
+    config = getConfig(tmp_path)
+    shards = shardHelpers.planShards(config, "05", hvConfig)
+    journal = shardHelpers.Journal(shardHelpers.getJournalPath(config))
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        failed = shardHelpers.runShards(config, ex, shards, journal,
+                                        getFakeHarvest({"05.0001": 1}))
+    assert failed == []
+    with open(shardHelpers.getTargetPath(config, "05"), "r") as f:
+        documents = json.load(f)["documents"]
+    assert [d["id"] for d in documents] == ["05.0000", "05.0001", "05.0002"]
+    assert shardHelpers.Journal(journal.path).getAttempts("05.0001") == 1
+
+def testRunShardsResumes(tmp_path):
+    config = getConfig(tmp_path)
+    shards = shardHelpers.planShards(config, "05", hvConfig)
+    journal = shardHelpers.Journal(shardHelpers.getJournalPath(config))
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        failed = shardHelpers.runShards(config, ex, shards, journal,
+                                        getFakeHarvest({"05.0002": 2}))
+    assert failed == ["05.0002"]
+    assert not os.path.isfile(shardHelpers.getTargetPath(config, "05"))
+    # a new run only harvests the failed shard
+    harvested = []
+    def harvest(payload):
+        harvested.append(payload[1]["id"])
+        return getFakeHarvest({})(payload)
+    journal = shardHelpers.Journal(shardHelpers.getJournalPath(config))
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        failed = shardHelpers.runShards(config, ex, shards, journal, harvest)
+    assert failed == []
+    assert harvested == ["05.0002"]
+    assert os.path.isfile(shardHelpers.getTargetPath(config, "05"))
+
+def testStreamHarvester(tmp_path):
+    config = getConfig(tmp_path)
+    config["retrieve"].update({
+        "store": "jsonl",
+        "storeChunkSize": 2,
+        "hvStreamCmd": "cat {}",
+        "minSleep": 0.01,
+        "sleep": 0.01
+    })
+    records = str(tmp_path / "OaiPmhETL.json")
+    with open(records, "w") as f:
+        json.dump({"documents": [{"id": i} for i in range(3)]}, f)
+    config["retrieve"]["hvUnloadSrc"] = [records]
+    shard = shardHelpers.planShards(config, "05", {})[0]
+    assert retrieveHelpers.streamHarvester(config, 0, shard)
+    with open(shard["target"], "r") as f:
+        assert json.load(f) == {
+            "documents": 3,
+            "chunks": ["05.0000.0000.jsonl.gz", "05.0000.0001.jsonl.gz"]
+        }
+    # records the harvester has not finalized are never stored
+    with open(records, "w") as f:
+        f.write('{"documents": [{"id": 0}, {"id"')
+    assert not retrieveHelpers.streamHarvester(config, 0, shard)
+    assert sorted(os.listdir(str(tmp_path))) == ["OaiPmhETL.json", "shards"]
+
+def testHarvestCheck(tmp_path):
+    path = str(tmp_path / "harvest.json")
+    documents = {"documents": [{"id": i, "subjects": [{"subject": "x" * 100}]}
+                               for i in range(100)]}
+    text = json.dumps(documents, indent=1) + "\n"
+    check = retrieveHelpers.HarvestCheck(path)
+    # the first half ends with the end of a document and its subjects
+    for (end, complete) in ((len(text) // 2, False), (len(text) - 3, False),
+                            (len(text), True)):
+        with open(path, "w") as f:
+            f.write(text[:end])
+        assert check.isComplete() == complete
+        # only the appended bytes are parsed
+        assert check.offset == end
+    # a copy that does not continue the last one is parsed again
+    for (payload, complete) in (('{"documents": []}', True), (text[:100], False)):
+        with open(path, "w") as f:
+            f.write(payload)
+        assert check.isComplete() == complete
+        assert check.offset == len(payload)
+
+def testStreamHarvesterKeepsCompleteChunks(tmp_path):
+    config = getConfig(tmp_path)
+    config["retrieve"].update({
+        "store": "jsonl",
+        "storeChunkSize": 2,
+        "minSleep": 0.01,
+        "sleep": 0.01
+    })
+    records = str(tmp_path / "OaiPmhETL.json")
+    with open(records, "w") as f:
+        json.dump({"documents": [{"id": i} for i in range(5)]}, f)
+    # the first stream ends in the third document, the harvester is not done
+    script = str(tmp_path / "stream.py")
+    with open(script, "w") as f:
+        f.write("\n".join([
+            "import os, sys",
+            "attempts = sys.argv[1] + '.attempts'",
+            "first = not os.path.exists(attempts)",
+            "open(attempts, 'a').close()",
+            "text = open(sys.argv[1]).read()",
+            "sys.stdout.write(text[:text.index('{\"id\": 2}') + 5] if first else text)"
+        ]))
+    config["retrieve"]["hvStreamCmd"] = "{} {} {{}}".format(sys.executable, script)
+    config["retrieve"]["hvUnloadSrc"] = [records]
+    shard = shardHelpers.planShards(config, "05", {})[0]
+    assert retrieveHelpers.streamHarvester(config, 0, shard)
+    with open(shard["target"], "r") as f:
+        assert json.load(f) == {
+            "documents": 5,
+            "chunks": ["05.0000.0000.jsonl.gz", "05.0000.0001.jsonl.gz", "05.0000.0002.jsonl.gz"]
+        }
+    documents = []
+    for chunk in ("0000", "0001", "0002"):
+        path = str(tmp_path / "05.0000.{}.jsonl.gz".format(chunk))
+        with recordStore.openDocuments(path) as chunkDocuments:
+            documents += [document["id"] for document in chunkDocuments]
+    assert documents == [0, 1, 2, 3, 4]
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith(".tmp")]
@@ -0,0 +1,48 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+import io
+import json
+from decimal import Decimal
+import pytest
+import util.jsonBackends as jsonBackends
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+documents = [
+    {"identifier": {"value": "10.1/a"}, "size": 1.5, "titles": [{"value": "Ünïcode"}]},
+    {"identifier": {"value": "10.1/b"}, "titles": [{"value": "lone \ud800 surrogate"}]}
+]
+
+def getCodecs():
+    codecs = [jsonBackends.JsonCodec("json")]
+    if jsonBackends.orjson is not None:
+        codecs.append(jsonBackends.JsonCodec("orjson"))
+    return codecs
+
+################################################################################
+# TESTS
+################################################################################
+@pytest.mark.parametrize("codec", getCodecs(), ids=lambda c: c.name)
+def testCodecRoundTrip(codec):
+    for document in documents:
+        data = codec.dumps(document)
+        assert isinstance(data, bytes)
+        assert codec.loads(data) == document
+        assert codec.loads(json.dumps(document)) == document
+    # numbers parsed by ijson
+    assert codec.loads(codec.dumps({"size": Decimal("1.5")})) == {"size": 1.5}
+
+def testIjsonBackends():
+    data = json.dumps({"documents": documents}).encode("utf-8")
+    backend = jsonBackends.getIjsonBackend("python")
+    assert list(backend.items(io.BytesIO(data), "documents.item")) == [
+        {**documents[0], "size": Decimal("1.5")}, documents[1]]
+    with pytest.raises(ValueError):
+        jsonBackends.JsonCodec("yaml")
+
+def testGetJsonBackendsPerConfig():
+    config = {"json": {"ijson": "python", "codec": "json"}}
+    backends = jsonBackends.getJsonBackends(config)
+    assert backends.getNames() == ("python", "json")
+    assert jsonBackends.getJsonBackends(config) is backends
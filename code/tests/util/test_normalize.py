@@ -0,0 +1,36 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+import string
+import pandas as pd
+import util.normalize as normalize
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+texts = [
+    "Plain ASCII Title\twith Tabs\x0band\x00 controls\x7f",
+    "Über die Größe İstanbuls – naïve “quotes”",
+    "数据 Dataset 2019",
+    ""
+]
+
+def original(text):
+    return "".join(list(filter(lambda y: y in set(string.printable), text.lower())))
+
+################################################################################
+# TESTS
+################################################################################
+def testNormalizeEqualsFilter():
+    normalizer = normalize.getNormalizer({})
+    for text in texts:
+        assert normalizer.normalize(text) == original(text)
+    column = pd.Series(texts, index=[3, 5, 7, 9])
+    normalized = normalizer.normalizeColumn(column)
+    assert list(normalized.index) == [3, 5, 7, 9]
+    assert list(normalized) == [original(text) for text in texts]
+
+def testConfiguredNormalizer():
+    normalizer = normalize.getNormalizer({"clean": {"normalize": {"lowercase": False}}})
+    assert normalizer.getSettings() == {"lowercase": False, "printable": True}
+    assert normalizer.normalize("Größe ABC") == "Gre ABC"
+    assert normalize.Normalizer(False, False).normalize(texts[1]) == texts[1]
@@ -0,0 +1,74 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+import importlib.util
+import json
+import pandas as pd
+import util.table as table
+import util.util as util
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+def loadPaper(monkeypatch):
+    # paper.py is run from code/util and imports util.py and table.py directly
+    monkeypatch.setitem(sys.modules, "util", util)
+    monkeypatch.setitem(sys.modules, "table", table)
+    spec = importlib.util.spec_from_file_location(
+        "paper", os.path.join(os.path.dirname(util.__file__), "paper.py"))
+    paper = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(paper)
+    return paper
+
+def writeTable(path, df):
+    writer = table.TableWriter(path)
+    writer.write(df)
+    writer.close()
+
+def getConfig(tmp_path):
+    configDir = tmp_path / "config"
+    outputDir = tmp_path / "vectorize"
+    cleanDir = tmp_path / "clean" / "cleanHash"
+    for directory in (configDir, outputDir, cleanDir):
+        os.makedirs(str(directory))
+    with open(str(configDir / "labels.json"), "w") as f:
+        json.dump(["none"] + ["label{}".format(i) for i in range(1, 21)], f)
+    with open(str(configDir / "stop_words.json"), "w") as f:
+        json.dump(["of", "the"], f)
+    with open(str(outputDir / "info.json"), "w") as f:
+        json.dump({"allFeatures_bow": 10, "noTrain": 2, "noTest": 1,
+                   "noTrain_train": 1, "noTrain_val": 1}, f)
+    writeTable(str(cleanDir / "result"), pd.DataFrame({
+        "id": ["a", "b", "c", "d", "e"],
+        "labels": [2, 2, 8, 0, 2],
+        "notAnnot": [False, False, False, True, False],
+        "duplicate": [False, False, False, False, True]
+    }))
+    writeTable(str(cleanDir / "useable"), pd.DataFrame({
+        "id": ["a", "b", "c"],
+        "useable": [True, True, True],
+        "labels": [2, 2, 8],
+        "nol": [1, 1, 1],
+        "special": [False, True, False],
+        "wc": [10, 20, 30]
+    }))
+    return {
+        "base": {"configDir": str(configDir)},
+        "clean": {"baseDir": str(tmp_path / "clean"), "payloadMinLength": 5},
+        "vectorize": {"cleanHash": "cleanHash", "outputDir": str(outputDir)}
+    }
+
+################################################################################
+# TESTS
+################################################################################
+def testGetBaseData(tmp_path, monkeypatch):
+    paper = loadPaper(monkeypatch)
+    (data, ) = paper.get_base_data(getConfig(tmp_path))
+    assert data["all"] == 5
+    assert data["annot"] == 4
+    assert data["duplicates"] == 1
+    assert data["useable"] == 3
+    assert data["labelsets"] == 2
+    assert data["labelsetsOnce"] == 1
+    assert data["special"] == 1
+    assert data["labelDensity"] == 3 / (3 * 20)
+    assert data["wc_median"] == 20
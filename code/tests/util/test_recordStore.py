@@ -0,0 +1,58 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+import json
+import util.recordStore as recordStore
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+documents = [{"identifier": {"value": str(i)}, "subjects": []} for i in range(5)]
+
+################################################################################
+# TESTS
+################################################################################
+def testStoreWriterChunks(tmp_path):
+    writer = recordStore.StoreWriter(str(tmp_path), "0a.0001", 2)
+    for document in documents:
+        writer.write(document)
+    paths = writer.close()
+    assert [os.path.basename(p) for p in paths] == [
+        "0a.0001.0000.jsonl.gz", "0a.0001.0001.jsonl.gz", "0a.0001.0002.jsonl.gz"]
+    assert recordStore.parseStoreName(paths[1]) == ("0a", "0001", "0001")
+    read = []
+    for path in paths:
+        with recordStore.openDocuments(path) as chunk:
+            read += list(chunk)
+    assert read == documents
+    recordStore.removeShard(str(tmp_path), "0a.0001")
+    assert os.listdir(str(tmp_path)) == []
+
+def testOpenJsonDocuments(tmp_path):
+    path = str(tmp_path / "0a.json")
+    with open(path, "w") as f:
+        json.dump({"documents": documents}, f)
+    assert not recordStore.isStore(path)
+    with recordStore.openDocuments(path) as read:
+        assert list(read) == documents
+
+def testIndexedAccess(tmp_path):
+    writer = recordStore.StoreWriter(str(tmp_path), "0a.0000", blockSize=2)
+    for document in documents:
+        writer.write(document)
+    [path] = writer.close()
+    index = recordStore.loadIndex(path)
+    assert len(index["offsets"]) == 3
+    assert index["ids"] == ["0", "1", "2", "3", "4"]
+    ranges = recordStore.getBlockRanges(index, 2)
+    assert ranges == [(0, 2), (2, 3)]
+    read = []
+    for blocks in ranges:
+        with recordStore.openDocuments(path, blocks) as part:
+            read += list(part)
+    assert read == documents
+    assert recordStore.findRecord(path, "3") == documents[3]
+    assert recordStore.findRecord(path, "missing") is None
+    # the positions of the ids are looked up once per index
+    for document in documents:
+        assert recordStore.findRecord(path, document["identifier"]["value"], index) == document
+    assert index["positions"] == {"0": 0, "1": 1, "2": 2, "3": 3, "4": 4}
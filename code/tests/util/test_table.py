@@ -0,0 +1,53 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+import numpy as np
+import pandas as pd
+import pytest
+import util.table as table
+import util.util as util
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+def getBatch(start, labels):
+    df = pd.DataFrame({
+        "id": ["id{}".format(i) for i in range(start, start + len(labels))],
+        "labels": labels,
+        "payload": ["some text"] * len(labels)
+    }, index=range(start, start + len(labels)))
+    df["labelsI"] = list(util.labels2bm(df.labels.values))
+    return df
+
+################################################################################
+# TESTS
+################################################################################
+def testCsvRoundTrip(tmp_path):
+    path = str(tmp_path / "useable")
+    writer = table.TableWriter(path)
+    writer.write(getBatch(0, [2, 8]))
+    writer.write(getBatch(2, [40]))
+    writer.close()
+    assert table.getTableFormat(path) == "csv"
+    df = table.readTable(path, columns=["id", "labels"])
+    assert df.index.tolist() == [0, 1, 2]
+    assert df.labels.tolist() == [2, 8, 40]
+
+@pytest.mark.skipif(not table.isFormatAvailable("parquet"), reason="needs pyarrow")
+def testParquetRoundTrip(tmp_path):
+    path = str(tmp_path / "useable")
+    writer = table.TableWriter(path, ["csv", "parquet"])
+    writer.write(getBatch(0, [2, 8]))
+    writer.write(getBatch(2, []))
+    writer.write(getBatch(2, [40]))
+    writer.close()
+    assert table.getTableFormat(path) == "parquet"
+    df = table.readTable(path)
+    assert df.index.tolist() == [0, 1, 2]
+    assert np.array_equal(np.stack(df.labelsI.values), util.labels2bm([2, 8, 40]))
+    assert table.readTable(path, columns=["id"]).columns.tolist() == ["id"]
+    # a later run without parquet must not leave the outdated file behind
+    writer = table.TableWriter(path, ["csv"])
+    writer.write(getBatch(0, [2]))
+    writer.close()
+    assert table.getTableFormat(path) == "csv"
+    assert len(table.readTable(path)) == 1
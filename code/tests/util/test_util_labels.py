@@ -0,0 +1,54 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+import numpy as np
+import pandas as pd
+import util.util as util
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+labels = np.array([2**1, 2**3 | 2**5, 2**20, 2**3, 2**3 | 2**5 | 2**7, 2**5, 2**3 | 2**5])
+
+################################################################################
+# TESTS
+################################################################################
+def testLabels2bm():
+    bm = util.labels2bm(labels)
+    assert bm.shape == (len(labels), 20)
+    for i, label in enumerate(labels):
+        assert np.array_equal(bm[i], util.int2bv(int(label), 21)[1:])
+
+def testGetBestLabelsEqualsGetBestLabel():
+    ssf = pd.Series([0] * 20)
+    ssf[2] = 3
+    expected = [util.getBestLabel(ssf, util.int2bv(int(l), 21)[1:]) for l in labels]
+    vssf = np.zeros(20, dtype=np.int64)
+    vssf[2] = 3
+    (bl, nol) = util.getBestLabels(vssf, util.labels2bm(labels))
+    assert bl.tolist() == expected
+    assert nol.tolist() == [1, 2, 1, 1, 3, 1, 2]
+    assert vssf.tolist() == ssf.tolist()
+
+def testLabelStatisticsEqualsMaskFilters():
+    config = {"labels": ["label{}".format(i) for i in range(1, 21)]}
+    df = pd.DataFrame({"labels": labels, "wc": [5, 10, 20, 30, 40, 50, 60]})
+    stats = util.LabelStatistics(df.labels.values, df.wc.values)
+    counts = stats.getDisciplineCounts(config)
+    for i in range(20):
+        for j in range(20):
+            mask = (1 << (i + 1)) | (1 << (j + 1))
+            expected = df[df.labels & mask == mask].labels.count() if j >= i else 0
+            assert counts.iloc[i, j] == expected
+    assert counts.index[0] == "label1"
+    labelCounts = stats.getLabelCounts()
+    for label in (1, 3, 5, 20):
+        has = df[df.labels & 2**label == 2**label]
+        nol = util.labels2bm(has.labels.values).sum(axis=1)
+        assert labelCounts["total"][label - 1] == len(has)
+        assert labelCounts["1-label"][label - 1] == (df.labels == 2**label).sum()
+        assert labelCounts["2-labels"][label - 1] == (nol == 2).sum()
+        assert labelCounts["geq-3-labels"][label - 1] == (nol >= 3).sum()
+        assert labelCounts["nol_mean"][label - 1] == nol.mean()
+        assert labelCounts["wc_mean"][label - 1] == has.wc.mean()
+        assert labelCounts["wc_median"][label - 1] == has.wc.median()
+    assert np.isnan(labelCounts["wc_median"][1])
@@ -0,0 +1,27 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+import numpy as np
+import util.vocabScores as vocabScores
+from sklearn.feature_selection import SelectKBest, f_classif
+
+################################################################################
+# TESTS
+################################################################################
+def testVocabScoresRoundTrip(tmp_path):
+    ngrams = ["ocean", "sea ice", "café", ""]
+    columns = np.array([17, 3, 120000, 5])
+    scores = np.array([0.5, 1.5, 2.5, 3.5])
+    vocabScores.saveVocabScores(str(tmp_path), ngrams, columns, scores)
+    loaded = vocabScores.loadVocabScores(str(tmp_path))
+    assert isinstance(loaded, np.memmap)
+    assert list(loaded["column"]) == list(columns)
+    assert list(loaded["score"]) == list(scores)
+    assert [vocabScores.getNgram(loaded, i) for i in range(len(loaded))] == ngrams
+    assert len(vocabScores.loadVocabScores(str(tmp_path), mmap=False)) == 4
+
+def testSelectedColumns():
+    x = np.array([[5, 1, 2, 1, 1], [3, 2, 1, 2, 2], [1, 3, 5, 3, 2], [2, 5, 3, 5, 1]])
+    selector = SelectKBest(f_classif, k=5).fit(x, [0, 0, 1, 1])
+    # ascending scores, ties in the order of the columns
+    assert list(selector.scores_) == [5, 5, 5, 5, 0]
+    assert list(vocabScores.getSelectedColumns(selector)) == [4, 0, 1, 2, 3]
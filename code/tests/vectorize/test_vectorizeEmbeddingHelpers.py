@@ -0,0 +1,48 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "vectorize"))
+import numpy as np
+import vectorizeEmbeddingHelpers
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+words = ["ocean", "sea_ice", "café", "Ocean", "ocean"]
+vectors = np.arange(len(words) * 3, dtype=np.float32).reshape(len(words), 3) / 7
+
+def writeWord2Vec(path):
+    # the binary format of word2vec (and gensim save_word2vec_format)
+    with open(path, "wb") as f:
+        f.write("{} {}\n".format(len(words), vectors.shape[1]).encode())
+        for (word, vector) in zip(words, vectors):
+            f.write(word.encode("utf-8") + b" " + vector.astype("<f4").tobytes() + b"\n")
+
+################################################################################
+# TESTS
+################################################################################
+def testReadWord2VecBinaryAcrossBuffers(tmp_path):
+    path = str(tmp_path / "w2v.bin")
+    writeWord2Vec(path)
+    with open(path, "rb") as f:
+        f.readline()
+        entries = list(vectorizeEmbeddingHelpers.iterWord2VecBinary(f, 12, bufferSize=5))
+    assert [word.decode("utf-8") for (word, vector) in entries] == words
+    assert np.array_equal(
+        np.frombuffer(b"".join(vector for (word, vector) in entries), "<f4").reshape(5, 3),
+        vectors)
+
+def testEmbeddingMatrix(tmp_path):
+    path = str(tmp_path / "w2v.bin")
+    writeWord2Vec(path)
+    embeddings = vectorizeEmbeddingHelpers.loadWordEmbeddings(path)
+    assert isinstance(embeddings.vectors, np.memmap)
+    assert sorted(os.listdir(str(tmp_path))) == [
+        "w2v.bin", "w2v.bin.keys.npy", "w2v.bin.rows.npy", "w2v.bin.vectors.npy"]
+    # the first vector of a word occurring twice
+    assert list(embeddings.getRows(["ocean", "unknown", "café", "Ocean"])) == [0, -1, 2, 3]
+    wordIndex = {"café": 1, "unknown": 2, "ocean": 3, "sea_ice": 4}
+    matrix = embeddings.getEmbeddingMatrix(wordIndex)
+    assert matrix.shape == (5, 3)
+    assert np.array_equal(matrix[[0, 2]], np.zeros((2, 3)))
+    assert np.array_equal(matrix[[1, 3, 4]], vectors[[2, 0, 1]])
@@ -0,0 +1,64 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "vectorize"))
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_selection import SelectKBest, f_classif
+from sklearn.utils import murmurhash3_32
+import vectorizeHashingHelpers
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+config = {
+    "vectorize": {"minDocFreq": 2},
+    "vectorizer": {"mode": "hashing", "features": 2**20, "chunkSize": 7}
+}
+kwargs = {
+    "ngram_range": (1, 2),
+    "dtype": np.float64,
+    "strip_accents": "unicode",
+    "decode_error": "replace",
+    "analyzer": "word",
+    "min_df": 2,
+    "stop_words": ["of", "the"]
+}
+
+words = ["ocean", "sediment", "core", "protein", "gene", "survey", "climate",
+         "model", "interview", "city", "soil", "river", "cell", "sample"]
+rng = np.random.RandomState(42)
+payloads = pd.Series([" ".join(rng.choice(words, rng.randint(3, 12)))
+                      for i in range(50)])
+classes = rng.randint(0, 3, len(payloads))
+
+################################################################################
+# TESTS
+################################################################################
+def testHashingEqualsTfidfVectorizer(tmp_path):
+    vectorizer = vectorizeHashingHelpers.getHashingVectorizer(config, kwargs)
+    files, nFeatures = vectorizeHashingHelpers.fitHashingVectorizer(
+        config, vectorizer, payloads, str(tmp_path))
+    assert len(files) == 8
+    selector, x = vectorizeHashingHelpers.selectHashedFeatures(
+        config, vectorizer, files, classes, 10)
+
+    tfidf = TfidfVectorizer(**kwargs)
+    xTfidf = tfidf.fit_transform(payloads)
+    assert nFeatures == xTfidf.shape[1]
+    selectorTfidf = SelectKBest(f_classif, k=10).fit(xTfidf, classes)
+    # the same features (no collisions in the hash space) with the same scores
+    columns = np.array([abs(murmurhash3_32(feature)) % config["vectorizer"]["features"]
+                        for feature in tfidf.get_feature_names_out()])
+    assert len(set(columns)) == nFeatures
+    assert np.allclose(selector.scores_[columns], selectorTfidf.scores_)
+    assert np.allclose(selector.pvalues_[columns], selectorTfidf.pvalues_)
+    selected = columns[selectorTfidf.get_support(indices=True)]
+    assert (np.sort(selected) == selector.get_support(indices=True)).all()
+    assert np.allclose(x.toarray(), selector.transform(vectorizer.transform(payloads)).toarray())
+    assert np.allclose(x.toarray()[:, np.argsort(np.argsort(selected))],
+                       selectorTfidf.transform(xTfidf).toarray())
+    scores = vectorizeHashingHelpers.getSelectedFeaturesAndScores(selector)
+    assert [feature[0] for feature in scores] == sorted(
+        selector.get_support(indices=True), key=lambda idx: selector.scores_[idx])
@@ -0,0 +1,68 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))))
+sys.path.append(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__)))), "vectorize"))
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+import vectorizeParallelHelpers
+
+################################################################################
+# TEST PREPARATION
+################################################################################
+config = {"worker": 3}
+kwargs = {
+    "ngram_range": (1, 2),
+    "dtype": np.float64,
+    "strip_accents": "unicode",
+    "decode_error": "replace",
+    "analyzer": "word",
+    "min_df": 2,
+    "stop_words": ["of", "the"]
+}
+
+words = ["ocean", "sediment", "core", "protein", "gene", "survey", "climate",
+         "model", "interview", "city", "soil", "river", "cell", "sample", "café"]
+rng = np.random.RandomState(7)
+payloads = pd.Series([" ".join(rng.choice(words, rng.randint(0, 12)))
+                      for i in range(40)])
+# the first shard only contains stop words
+stopWordPayloads = pd.Series(["the of", "of the", "ocean core", "ocean river"])
+
+################################################################################
+# TESTS
+################################################################################
+@pytest.mark.parametrize("minDocFreq", [1, 2, 0.2])
+@pytest.mark.parametrize("texts", [payloads, stopWordPayloads])
+def testParallelEqualsSerialTfidfVectorizer(minDocFreq, texts):
+    arguments = dict(kwargs, min_df=minDocFreq)
+    vectorizer, x = vectorizeParallelHelpers.fitTransformParallel(config, arguments, texts)
+    serial = TfidfVectorizer(**arguments)
+    xSerial = serial.fit_transform(texts)
+    assert vectorizer.vocabulary_ == serial.vocabulary_
+    assert np.allclose(vectorizer.idf_, serial.idf_)
+    assert np.allclose(x.toarray(), xSerial.toarray())
+    texts = ["ocean sediment of the river", "unknown words"]
+    vectorizer = pickle.loads(pickle.dumps(vectorizer))
+    assert np.allclose(vectorizer.transform(texts).toarray(), serial.transform(texts).toarray())
+
+def testMergeShards():
+    shards = [
+        (["a", "c"], scipy.sparse.csr_matrix([[1, 2]])),
+        ([], scipy.sparse.csr_matrix((1, 0), dtype=np.int64)),
+        (["b", "c", "d"], scipy.sparse.csr_matrix([[3, 0, 4]]))
+    ]
+    ngrams, counts = vectorizeParallelHelpers.mergeShards(shards)
+    assert ngrams == ["a", "b", "c", "d"]
+    assert counts.toarray().tolist() == [[1, 0, 2, 0], [0, 0, 0, 0], [0, 3, 0, 4]]
+
+def testShards():
+    assert [len(shard) for shard in vectorizeParallelHelpers.getShards(list(range(10)), 3)] == [3, 3, 4]
+    assert [len(shard) for shard in vectorizeParallelHelpers.getShards(list(range(2)), 3)] == [1, 1]
+
+def testOnlyStopWords():
+    with pytest.raises(ValueError, match="empty vocabulary"):
+        vectorizeParallelHelpers.fitTransformParallel(config, kwargs, stopWordPayloads[:2])
@@ -1,6 +1,7 @@
 import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from util.util import loadConfig, loadBinary, loadJsonFromFile
+from util.normalize import getNormalizer
 from tensorflow.python.keras import models
 import argparse
 import json
@@ -31,7 +32,7 @@ payload = []
 for field in config["dmode"].split("_"):
     payload.append(metadata[field + "s"][0][field])
 
-text = " ".join(payload)
+text = getNormalizer(config).normalize(" ".join(payload))
 x = vectorizer.transform([text])
 x = selector.transform(x).astype('float64')
 
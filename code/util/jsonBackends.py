@@ -0,0 +1,107 @@
+import json
+from decimal import Decimal
+import ijson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+    Parser layer for the retrieved documents and the worker output of clean:
+        ijson backend: streams json files with a list of documents, the C
+            backend yajl2_c is preferred, python is the slow fallback
+        codec: (de)serializes single documents (store lines) and the
+            .chunk.json files, orjson is preferred over the stdlib json
+    Both fall back to the stdlib where orjson is stricter (e.g. lone
+    surrogates in strings), so all backends read and write the same values.
+"""
+
+IJSON_BACKENDS = ("yajl2_c", "yajl2_cffi", "yajl2", "python")
+CODECS = ("orjson", "json")
+
+# One set of backends per process, see getJsonBackends
+_BACKENDS = None
+
+def getIjsonBackend(name="auto"):
+    """ Returns an ijson backend
+
+    # Arguments
+        name: name of the backend or "auto" for the fastest available one
+
+    # Returns
+        ijson backend module (with items, parse, ...)
+
+    # Raises
+        ImportError if the backend is not available
+    """
+    if name != "auto":
+        return ijson.get_backend(name)
+    for backend in IJSON_BACKENDS:
+        try:
+            return ijson.get_backend(backend)
+        except ImportError:
+            continue
+    raise ImportError("No ijson backend available")
+
+def toSerializable(obj):
+    # ijson returns numbers with a fraction as Decimal
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+class JsonCodec(object):
+    """ (De)serializes JSON with orjson or the stdlib json
+    """
+    def __init__(self, name="auto"):
+        if name == "auto":
+            name = "orjson" if orjson is not None else "json"
+        if name not in CODECS:
+            raise ValueError("Unknown codec {}".format(name))
+        if name == "orjson" and orjson is None:
+            raise ImportError("The codec orjson needs the orjson package")
+        self.name = name
+
+    def loads(self, data):
+        if self.name == "orjson":
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                pass
+        return json.loads(data)
+
+    def dumps(self, obj):
+        """ Returns the serialized obj as utf-8 encoded bytes
+        """
+        if self.name == "orjson":
+            try:
+                return orjson.dumps(obj, default=toSerializable)
+            except TypeError:
+                pass
+        return json.dumps(obj, default=toSerializable).encode("utf-8")
+
+class JsonBackends(object):
+    def __init__(self, ijsonName="auto", codecName="auto"):
+        self.ijson = getIjsonBackend(ijsonName)
+        self.codec = JsonCodec(codecName)
+
+    def getNames(self):
+        return (self.ijson.backend_name, self.codec.name)
+
+def getJsonBackends(config):
+    """ Returns the backends configured in config["json"] (ijson and codec,
+    both default to "auto") for this process
+
+    # Arguments
+        config: dictionary with the configuration
+
+    # Returns
+        JsonBackends
+    """
+    global _BACKENDS
+    names = config.get("json", {})
+    key = (names.get("ijson", "auto"), names.get("codec", "auto"))
+    if _BACKENDS is None or _BACKENDS[0] != key:
+        _BACKENDS = (key, JsonBackends(*key))
+    return _BACKENDS[1]
@@ -0,0 +1,71 @@
+import re
+import string
+import pandas as pd
+
+"""
+    Normalisation of the payload texts, shared by clean (useable payloads),
+    vectorize and use/cli.py so texts are normalised the same way for training
+    and inference. The settings are taken from config["clean"]["normalize"]
+    (see NORMALIZE_DEFAULTS):
+        lowercase: lowercase the text
+        printable: remove all characters not in string.printable
+"""
+
+NORMALIZE_DEFAULTS = {
+    "lowercase": True,
+    "printable": True
+}
+NON_PRINTABLE = re.compile("[^{}]+".format(re.escape(string.printable)))
+# Most payloads are ASCII, their characters are removed with a translate table
+NON_PRINTABLE_ASCII = {i: None for i in range(128) if chr(i) not in string.printable}
+
+class Normalizer(object):
+    def __init__(self, lowercase=True, printable=True):
+        self.lowercase = lowercase
+        self.printable = printable
+
+    def getSettings(self):
+        return {"lowercase": self.lowercase, "printable": self.printable}
+
+    def normalize(self, text):
+        """ Normalises a text
+
+        # Arguments
+            text: string
+
+        # Returns
+            string
+        """
+        if self.lowercase:
+            text = text.lower()
+        if self.printable:
+            if text.isascii():
+                text = text.translate(NON_PRINTABLE_ASCII)
+            else:
+                text = NON_PRINTABLE.sub("", text)
+        return text
+
+    def normalizeColumn(self, texts):
+        """ Normalises a column of texts
+
+        # Arguments
+            texts: pd.Series of strings
+
+        # Returns
+            pd.Series with the same index
+        """
+        normalize = self.normalize
+        return pd.Series([normalize(text) for text in texts], index=texts.index, dtype=object)
+
+def getNormalizer(config):
+    """ Returns the normaliser configured for the payloads
+
+    # Arguments
+        config: dict with the configuration
+
+    # Returns
+        Normalizer
+    """
+    settings = dict(NORMALIZE_DEFAULTS)
+    settings.update(config.get("clean", {}).get("normalize", {}))
+    return Normalizer(**settings)
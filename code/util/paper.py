@@ -1,13 +1,21 @@
 import os
 import json
+import numpy as np
 import pandas as pd
 import util
+import table
 import argparse
 import json
 
+def readCleanTable(config, name, columns):
+    return table.readTable(
+        os.path.join(config["clean"]["baseDir"], config["vectorize"]["cleanHash"], name),
+        columns=columns
+    )
+
 def get_base_data(config):
-    df = pd.read_csv(os.path.join(config["clean"]["baseDir"], config["vectorize"]["cleanHash"], "result.csv"), low_memory=False)
-    udf = pd.read_csv(os.path.join(config["clean"]["baseDir"], config["vectorize"]["cleanHash"], "useable.csv"), low_memory=False)
+    df = readCleanTable(config, "result", ["id", "notAnnot", "duplicate"])
+    udf = readCleanTable(config, "useable", ["id", "useable", "labels", "nol", "special", "wc"])
     with open(os.path.join(config["vectorize"]["outputDir"], "info.json"), "r") as f:
         info = json.load(f)
     stopWords = util.getStopWords(config)
@@ -20,7 +28,7 @@ def get_base_data(config):
             "duplicates": df[~df.notAnnot][df.duplicate].id.count(),
             "useable": udf[udf.useable].id.count(),
             "labelsets": udf.labels.nunique(),
-            "labelsetsOnce": udf.groupby(df.labels).labels.count().value_counts().get(1),
+            "labelsetsOnce": udf.groupby(udf.labels).labels.count().value_counts().get(1),
             "labelCardinality": sum(udf.nol)/len(udf),
             "labelDensity": sum(udf.nol)/(len(udf)*len(util.getLabels(config)[1:])),
             "special": udf[udf.special].id.count(),
@@ -39,7 +47,7 @@ def get_base_data(config):
 
 def get_schemes_data(config):
     data = []
-    df = pd.read_csv(os.path.join(config["clean"]["baseDir"], config["vectorize"]["cleanHash"], "useable.csv"), low_memory=False)
+    df = readCleanTable(config, "useable", list(util.getSchemes(config).keys()))
     for scheme, value in util.getSchemes(config).items():
         data.append(
             {
@@ -52,30 +60,32 @@ def get_schemes_data(config):
 def get_labels_data(config):
     data =  []
     label_names = util.getLabels(config)[1:]
-    df = pd.read_csv(os.path.join(config["clean"]["baseDir"], config["vectorize"]["cleanHash"], "useable.csv"), low_memory=False)
+    df = readCleanTable(config, "useable", ["id", "labels", "bl", "wc"])
+    stats = util.LabelStatistics(df.labels.values, df.wc.values, len(label_names))
+    counts = stats.getLabelCounts()
+    blcount = np.bincount(df.bl.values, minlength=len(label_names) + 1)[1:]
     for idx, label_name in enumerate(label_names):
-        label_no = idx + 1
         data.append({
             "name":         label_name,
-            "1-label":      df[df.labels == 2**label_no].id.count(),
-            "2-labels":     df[df.labels & 2**label_no == 2**label_no][df.nol == 2].id.count(), 
-            "geq-3-labels": df[df.labels & 2**label_no == 2**label_no][df.nol >= 3].id.count(), 
-            "nol_mean":     df[df.labels & 2**label_no == 2**label_no].nol.mean(), 
-            "blcount":      df.groupby(df.bl).bl.count().iloc[idx],
-            "total":        df[df.labels & 2**label_no == 2**label_no].id.count(), 
-            "percentage":   df[df.labels & 2**label_no == 2**label_no].id.count()/df.id.count(),
-            "wc_mean":      df[df.labels & 2**label_no == 2**label_no].wc.mean(),
-            "wc_median":      df[df.labels & 2**label_no == 2**label_no].wc.median()
+            "1-label":      counts["1-label"][idx],
+            "2-labels":     counts["2-labels"][idx],
+            "geq-3-labels": counts["geq-3-labels"][idx],
+            "nol_mean":     counts["nol_mean"][idx],
+            "blcount":      blcount[idx],
+            "total":        counts["total"][idx],
+            "percentage":   counts["total"][idx]/len(df),
+            "wc_mean":      counts["wc_mean"][idx],
+            "wc_median":    counts["wc_median"][idx]
         })
     data.append(
         {
             "name": "total", 
-            "1-label": df[df.nol == 1].id.count(), 
-            "2-labels": df[df.nol == 2].id.count(),
-            "geq-3-labels": df[df.nol >= 3].id.count(),
-            "nol_mean":     df.nol.mean(), 
+            "1-label": (stats.nol == 1).sum(),
+            "2-labels": (stats.nol == 2).sum(),
+            "geq-3-labels": (stats.nol >= 3).sum(),
+            "nol_mean":     stats.nol.mean(),
             "blcount": 0,
-            "total": df.id.count(),
+            "total": len(df),
             "percentage": 1.0,
             "wc_mean":      df.wc.mean(),
             "wc_median":    df.wc.median()
@@ -0,0 +1,297 @@
+import gzip
+import json
+import os
+import re
+from contextlib import contextmanager
+from util.jsonBackends import JsonBackends
+
+"""
+    Line-delimited record store of the retrieve step: gzip compressed files
+    with one DataCite document (JSON) per line, named
+        <retrievalId>.<shard>.<chunk>.jsonl.gz
+    e.g. 05.0002.0000.jsonl.gz for the first chunk of the third shard of
+    retrieval 05. Chunks become visible (are renamed from a temporary name)
+    once they are complete, hence they can be cleaned while later chunks are
+    still unloaded.
+
+    A chunk is a sequence of gzip members of BLOCK_SIZE lines each, i.e. any
+    gzip reader reads it as a whole, but each block can also be decompressed
+    on its own. The index next to the chunk (<chunk>.idx, JSON) holds the
+    offsets of the blocks and the record ids (identifier.value) in order, so
+    a chunk can be split into block ranges to be read in parallel and a
+    record can be found by decompressing a single block.
+"""
+
+STORE_EXTENSION = ".jsonl.gz"
+INDEX_EXTENSION = ".idx"
+BLOCK_SIZE = 1000
+COMPRESS_LEVEL = 6
+# Written by retrieve once it finished, cf. clean --follow
+DONE_MARKER = "retrieve.done"
+STORE_NAME = re.compile(r"^([a-f0-9]{2})\.(\d{4})\.(\d{4})\.jsonl\.gz$")
+
+def parseStoreName(fileName):
+    """ Parses the name of a store chunk
+
+    # Arguments
+        fileName: name or path of a file
+
+    # Returns
+        tuple of retrievalId, shard and chunk (strings), None if the file is
+        not a store chunk
+    """
+    match = STORE_NAME.match(os.path.basename(fileName))
+    if not match:
+        return None
+    return match.groups()
+
+def getStorePath(directory, shardId, chunk):
+    return os.path.join(directory, "{}.{:04d}{}".format(shardId, chunk, STORE_EXTENSION))
+
+def getDonePath(directory):
+    return os.path.join(directory, DONE_MARKER)
+
+def getIndexPath(path):
+    return path + INDEX_EXTENSION
+
+def getRecordId(document):
+    identifier = document.get("identifier")
+    if isinstance(identifier, dict):
+        return identifier.get("value")
+    return None
+
+def isStore(fileName):
+    return parseStoreName(fileName) is not None
+
+def loadIndex(path):
+    """ Loads the index of a store chunk
+
+    # Arguments
+        path: path of the store chunk
+
+    # Returns
+        dictionary with blockSize, offsets (of the blocks) and ids (of the
+        records), None if the chunk has no index
+    """
+    if not os.path.isfile(getIndexPath(path)):
+        return None
+    with open(getIndexPath(path), "r") as f:
+        return json.load(f)
+
+def iterBlocks(path, index, start=0, stop=None, backends=None):
+    """ Yields the documents of a range of blocks of a store chunk
+
+    # Arguments
+        path: path of the store chunk
+        index: dictionary as returned by loadIndex
+        start: first block
+        stop: block after the last one (None: up to the end)
+        backends: util.jsonBackends.JsonBackends (default: fastest available)
+
+    # Returns
+        generator of dictionaries
+    """
+    codec = (backends or JsonBackends()).codec
+    offsets = index["offsets"]
+    if stop is None:
+        stop = len(offsets)
+    if start >= stop:
+        return
+    with open(path, "rb") as f:
+        f.seek(offsets[start])
+        for block in range(start, stop):
+            if block + 1 < len(offsets):
+                data = f.read(offsets[block + 1] - offsets[block])
+            else:
+                data = f.read()
+            for line in gzip.decompress(data).splitlines():
+                yield codec.loads(line)
+
+def getBlockRanges(index, parts):
+    """ Splits the blocks of a store chunk into at most parts ranges of
+    (nearly) equal size
+
+    # Arguments
+        index: dictionary as returned by loadIndex
+        parts: number of ranges
+
+    # Returns
+        list of (start, stop) tuples
+    """
+    blocks = len(index["offsets"])
+    parts = max(1, min(parts, blocks))
+    bounds = [round(blocks * part / parts) for part in range(parts + 1)]
+    return [(bounds[part], bounds[part + 1]) for part in range(parts)]
+
+def getPositions(index):
+    """ Returns the positions of the records of a store chunk by their id,
+    built once per index
+
+    # Arguments
+        index: dictionary as returned by loadIndex
+
+    # Returns
+        dictionary
+    """
+    if "positions" not in index:
+        index["positions"] = {
+            recordId: position for (position, recordId) in enumerate(index["ids"])
+        }
+    return index["positions"]
+
+def findRecord(path, recordId, index=None):
+    """ Reads a single record of a store chunk by its id
+
+    # Arguments
+        path: path of the store chunk
+        recordId: identifier.value of the record
+        index: optional dictionary as returned by loadIndex, pass it to
+               look up several records of the chunk
+
+    # Returns
+        dictionary, None if the chunk has no such record
+    """
+    if index is None:
+        index = loadIndex(path)
+    if index is None:
+        return None
+    position = getPositions(index).get(recordId)
+    if position is None:
+        return None
+    block = position // index["blockSize"]
+    for (line, document) in enumerate(iterBlocks(path, index, block, block + 1)):
+        if line == position % index["blockSize"]:
+            return document
+
+@contextmanager
+def openDocuments(path, blocks=None, backends=None):
+    """ Opens a retrieved file, a store chunk or a json file with a list of
+    documents (cf. retrieveHelpers.unloadHarvester)
+
+    # Arguments
+        path: path of the file
+        blocks: optional (start, stop) tuple to read a range of blocks of a
+                store chunk only (cf. getBlockRanges)
+        backends: util.jsonBackends.JsonBackends (default: fastest available)
+
+    # Returns
+        context manager providing an iterator over the documents
+    """
+    backends = backends or JsonBackends()
+    if isStore(path) and blocks is not None:
+        yield iterBlocks(path, loadIndex(path), *blocks, backends=backends)
+    elif isStore(path):
+        with gzip.open(path, "rb") as f:
+            yield (backends.codec.loads(line) for line in f)
+    else:
+        with open(path, "rb") as f:
+            yield backends.ijson.items(f, "documents.item")
+
+class StoreWriter(object):
+    """ Writes documents of a shard to store chunks of at most chunkSize
+    documents (0: a single chunk) in blocks of blockSize documents. The
+    current chunk is written to a temporary file which is renamed (after
+    its index) once the chunk is complete.
+    """
+    def __init__(self, directory, shardId, chunkSize=0, blockSize=BLOCK_SIZE):
+        self.directory = directory
+        self.shardId = shardId
+        self.chunkSize = chunkSize
+        self.blockSize = blockSize
+        self.chunk = 0
+        self.count = 0
+        self.chunkCount = 0
+        self.f = None
+        self.block = []
+        self.offsets = []
+        self.ids = []
+        self.paths = []
+
+    def getTmpPath(self):
+        return getStorePath(self.directory, self.shardId, self.chunk) + ".tmp"
+
+    def write(self, document):
+        if self.f is None:
+            self.f = open(self.getTmpPath(), "wb")
+        self.block.append(json.dumps(document))
+        self.ids.append(getRecordId(document))
+        self.count += 1
+        self.chunkCount += 1
+        if len(self.block) >= self.blockSize:
+            self.writeBlock()
+        if self.chunkSize and self.chunkCount >= self.chunkSize:
+            self.closeChunk()
+
+    def writeBlock(self):
+        if not self.block:
+            return
+        self.offsets.append(self.f.tell())
+        self.f.write(gzip.compress(
+            ("\n".join(self.block) + "\n").encode("utf-8"),
+            compresslevel=COMPRESS_LEVEL
+        ))
+        self.block = []
+
+    def closeChunk(self):
+        if self.f is None:
+            return
+        self.writeBlock()
+        self.f.close()
+        self.f = None
+        path = getStorePath(self.directory, self.shardId, self.chunk)
+        with open(getIndexPath(self.getTmpPath()), "w") as f:
+            json.dump({
+                "blockSize": self.blockSize,
+                "offsets": self.offsets,
+                "ids": self.ids
+            }, f)
+        os.replace(getIndexPath(self.getTmpPath()), getIndexPath(path))
+        os.replace(self.getTmpPath(), path)
+        self.paths.append(path)
+        self.chunk += 1
+        self.chunkCount = 0
+        self.offsets = []
+        self.ids = []
+
+    def close(self):
+        """ Completes the last chunk
+
+        # Returns
+            list of paths of the written chunks
+        """
+        self.closeChunk()
+        return self.paths
+
+    def discard(self):
+        """ Drops the documents of the incomplete chunk, the complete chunks
+        are kept (cf. retrieveHelpers.streamHarvester)
+        """
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+            os.remove(self.getTmpPath())
+        self.count -= self.chunkCount
+        self.chunkCount = 0
+        self.block = []
+        self.offsets = []
+        self.ids = []
+
+    def abort(self):
+        """ Removes all chunks written so far, e.g. after a failed unload
+        """
+        self.discard()
+        removeShard(self.directory, self.shardId)
+        self.chunk = 0
+        self.count = 0
+        self.paths = []
+
+def removeShard(directory, shardId):
+    """ Removes the store chunks (and their indices) of a shard
+    """
+    for fileName in os.listdir(directory):
+        if fileName.endswith(INDEX_EXTENSION):
+            parsed = parseStoreName(fileName[:-len(INDEX_EXTENSION)])
+        else:
+            parsed = parseStoreName(fileName)
+        if parsed and "{}.{}".format(*parsed[:2]) == shardId:
+            os.remove(os.path.join(directory, fileName))
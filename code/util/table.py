@@ -0,0 +1,112 @@
+import os
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+"""
+    Tables written by clean (result, useable) and read by vectorize and
+    paper.py. A table is addressed by its path without extension and may
+    exist in two formats:
+        csv: <path>.csv, as before. Lists (labelsI) end up as strings.
+        parquet: <path>.parquet, columnar, compressed and typed (needs
+            pyarrow). Label vectors are stored as list<uint8> and the index
+            is kept, columns can be read selectively and memory-mapped.
+"""
+
+FORMATS = ("csv", "parquet")
+
+def isFormatAvailable(tableFormat):
+    return tableFormat == "csv" or pq is not None
+
+def getTableFormat(path):
+    """ Returns the format a table will be read from, parquet is preferred
+
+    # Arguments
+        path: path of the table without extension
+
+    # Returns
+        "parquet" or "csv"
+    """
+    if pq is not None and os.path.isfile(path + ".parquet"):
+        return "parquet"
+    return "csv"
+
+def readTable(path, columns=None):
+    """ Reads a table in its preferred format (cf. getTableFormat)
+
+    # Arguments
+        path: path of the table without extension
+        columns: optional list of columns to read, the parquet format only
+                 reads these from disk
+
+    # Returns
+        pd.DataFrame
+    """
+    if getTableFormat(path) == "parquet":
+        return pq.read_table(
+            path + ".parquet",
+            columns=columns,
+            memory_map=True
+        ).to_pandas()
+    df = pd.read_csv(path + ".csv", index_col=0, low_memory=False)
+    if columns is not None:
+        df = df[columns]
+    return df
+
+class TableWriter(object):
+    """ Writes a table in one or several formats batch by batch. All batches
+    must have the same columns; the csv header is written by the first
+    batch, the parquet schema is taken from the first non-empty batch.
+    """
+    def __init__(self, path, formats=("csv",)):
+        for tableFormat in formats:
+            if tableFormat not in FORMATS:
+                raise ValueError("Unknown table format {}".format(tableFormat))
+            if not isFormatAvailable(tableFormat):
+                raise ValueError("Table format {} needs pyarrow".format(tableFormat))
+        self.path = path
+        self.formats = formats
+        # an outdated file of another format would be read instead
+        for tableFormat in FORMATS:
+            if tableFormat not in formats and os.path.isfile(path + "." + tableFormat):
+                os.remove(path + "." + tableFormat)
+        self.header = True
+        self.parquetWriter = None
+        self.emptyBatch = None
+
+    def write(self, df):
+        if "csv" in self.formats:
+            df.to_csv(self.path + ".csv", mode="w" if self.header else "a", header=self.header)
+            self.header = False
+        if "parquet" in self.formats:
+            if len(df) == 0:
+                # the types of an empty batch cannot be inferred
+                self.emptyBatch = df
+                return
+            if self.parquetWriter is None:
+                table = pa.Table.from_pandas(df, preserve_index=True)
+                self.parquetWriter = pq.ParquetWriter(
+                    self.path + ".parquet",
+                    table.schema,
+                    compression="zstd"
+                )
+            else:
+                table = pa.Table.from_pandas(
+                    df,
+                    schema=self.parquetWriter.schema,
+                    preserve_index=True
+                )
+            self.parquetWriter.write_table(table)
+
+    def close(self):
+        if "parquet" not in self.formats:
+            return
+        if self.parquetWriter is not None:
+            self.parquetWriter.close()
+        elif self.emptyBatch is not None:
+            pq.write_table(pa.Table.from_pandas(self.emptyBatch, preserve_index=True),
+                           self.path + ".parquet")
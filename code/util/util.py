@@ -9,9 +9,17 @@ import re
 import numpy as np
 import pandas as pd
 
+import nltk
 from sklearn.metrics import confusion_matrix, precision_recall_fscore_support
 from nltk.tokenize import word_tokenize
 
+# punkt models used by word_tokenize (name, path), newer nltk versions load
+# them from punkt_tab instead of pickles
+if hasattr(nltk.tokenize.punkt, "PunktTokenizer"):
+    TOKENIZER_RESOURCE = ("punkt_tab", "tokenizers/punkt_tab/english/")
+else:
+    TOKENIZER_RESOURCE = ("punkt", "tokenizers/punkt/english.pickle")
+
 def loadConfig(path="config.json"):
     """Loads the file with all configuration
 
@@ -54,8 +62,7 @@ def loadConfig(path="config.json"):
     return config
 
 def createDirIfNotExists(path):
-    if not os.path.isdir(path):
-        os.makedirs(path)
+    os.makedirs(path, exist_ok=True)
 
 def setupLogging(config, step):
     # LOGGING
@@ -182,23 +189,135 @@ def getBestLabel(ssf, labels):
     ssf[bl] += 1
     return bl + 1
 
+def labels2bm(labels, length=20):
+    """ Decodes label bit masks to a bit matrix in one go
+
+    # Arguments
+        labels: array-like of label bit masks (bit i set for label i, bit 0
+                is not a label)
+        length: number of labels
+
+    # Returns
+        np.array (uint8) with one row per bit mask and one column per label,
+        column 0 being label 1 (cf. int2bv(i, length + 1)[1:])
+    """
+    labels = np.asarray(labels, dtype=np.int64).astype("<u8")
+    bits = np.unpackbits(labels.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    return np.ascontiguousarray(bits[:, 1:length + 1])
+
+def getBestLabels(ssf, bm):
+    """ Vectorized getBestLabel for all rows of a bit matrix
+
+    Single label rows are resolved at once, only the rows with more than one
+    label need to be visited in order, since each of them changes ssf.
+
+    # Arguments
+        ssf: np.array (int64) keeping track which label has been selected how
+             often so far, zero-based. It is updated in place.
+        bm: bit matrix as returned by labels2bm
+
+    # Returns
+        tuple of np.arrays: best label (bl, one-based) and number of labels
+        (nol) per row
+    """
+    nol = bm.sum(axis=1, dtype=np.int64)
+    bl = np.argmax(bm, axis=1) + 1
+    for row in np.flatnonzero(nol > 1):
+        candidates = np.flatnonzero(bm[row])
+        best = candidates[np.argmin(ssf[candidates])]
+        ssf[best] += 1
+        bl[row] = best + 1
+    return bl, nol
+
+class LabelStatistics(object):
+    """ Label statistics of a table, computed from its label bit masks
+    decoded once to a bit matrix (cf. labels2bm)
+    """
+    # rows per matrix product (float32 counts are exact up to 2**24)
+    CHUNK_ROWS = 1 << 20
+
+    def __init__(self, labels, wc=None, length=20):
+        """
+        # Arguments
+            labels: array-like of label bit masks
+            wc: optional array-like with the word count of each row
+            length: number of labels
+        """
+        self.bm = labels2bm(labels, length)
+        self.nol = self.bm.sum(axis=1, dtype=np.int64)
+        self.wc = None if wc is None else np.asarray(wc, dtype=np.float64)
+
+    def getCooccurrence(self):
+        """ Returns np.array (int64, labels x labels) with the number of rows
+        having both labels, the diagonal holds the number of rows per label
+        """
+        length = self.bm.shape[1]
+        cooccurrence = np.zeros((length, length), dtype=np.int64)
+        for start in range(0, len(self.bm), self.CHUNK_ROWS):
+            chunk = self.bm[start:start + self.CHUNK_ROWS].astype(np.float32)
+            cooccurrence += (chunk.T @ chunk).astype(np.int64)
+        return cooccurrence
+
+    def getDisciplineCounts(self, config):
+        """ Returns the co-occurrence of the labels as pd.DataFrame (upper
+        triangle, columns 1-20, rows named by config["labels"])
+        """
+        counts = pd.DataFrame(np.triu(self.getCooccurrence()).astype(np.int32))
+        counts.columns = range(1, self.bm.shape[1] + 1)
+        rows = {i: config["labels"][i] for i in range(0, len(config["labels"]))}
+        counts.rename(index=rows, inplace=True)
+        return counts
+
+    def getLabelCounts(self):
+        """ Returns dictionary with np.arrays (one value per label) of the
+        number of rows with the label (total) and thereof with one, two or
+        more labels as well as the mean number of labels and, if word counts
+        were given, the mean and median word count of these rows
+        """
+        counts = {
+            "total": self.bm.sum(axis=0, dtype=np.int64),
+            "1-label": self.bm[self.nol == 1].sum(axis=0, dtype=np.int64),
+            "2-labels": self.bm[self.nol == 2].sum(axis=0, dtype=np.int64),
+            "geq-3-labels": self.bm[self.nol >= 3].sum(axis=0, dtype=np.int64)
+        }
+        with np.errstate(invalid="ignore", divide="ignore"):
+            counts["nol_mean"] = (self.nol @ self.bm) / counts["total"]
+            if self.wc is not None:
+                counts["wc_mean"] = (self.wc @ self.bm) / counts["total"]
+                counts["wc_median"] = np.array([
+                    np.median(self.wc[self.bm[:, i] == 1]) if counts["total"][i] else np.nan
+                    for i in range(self.bm.shape[1])
+                ])
+        return counts
+
 def getDisciplineCounts(config, df):
-    t = np.zeros((20,20),np.int32)
-    for i in range(0,20):
-        label = i + 1
-        for j in range(0,20):
-            if j < i:
-                continue
-            clabel = j + 1
-            mask = 0
-            mask |= 1 << label
-            mask |= 1 << clabel
-            t[i][j] = df[df.labels & mask == mask].labels.count()
-    counts = pd.DataFrame(t)
-    counts.columns = range(1,21)
-    rows = {i: config["labels"][i] for i in range(0, len(config["labels"]))}
-    counts.rename(index=rows, inplace=True)
-    return counts
+    return LabelStatistics(df.labels.values).getDisciplineCounts(config)
+
+def getNltkDataDir(config):
+    return os.path.join(config["base"]["dir"], "nltk_data")
+
+def addNltkDataDir(config):
+    """ Lets nltk find the resources in the local cache (cf. loadTokenizer)
+    """
+    dataDir = getNltkDataDir(config)
+    if dataDir not in nltk.data.path:
+        nltk.data.path.insert(0, dataDir)
+
+def loadTokenizer(config):
+    """ Makes the models of word_tokenize available without network access
+    if they are cached already: looks them up in the local cache
+    (<base dir>/nltk_data) and the nltk data directories and downloads them to
+    the local cache only if they are missing
+
+    # Arguments
+        config: dict with the configuration
+    """
+    addNltkDataDir(config)
+    (name, path) = TOKENIZER_RESOURCE
+    try:
+        nltk.data.find(path)
+    except LookupError:
+        nltk.download(name, download_dir=getNltkDataDir(config), quiet=True)
 
 def stem(payload, stemmer):
     return_value = []
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+
+"""
+    Binary copy of vocab_scores.json written by vectorize: a structured numpy
+    array (np.save) that evaluate and use/cli.py can memory-map with
+    loadVocabScores instead of parsing the json. One record per selected
+    feature, sorted by the score like the json:
+        column: column of the feature in the output of the vectorizer
+        score: score of the selector (f_classif)
+        ngram: utf-8 encoded n-gram (empty for the hash features)
+"""
+
+VOCAB_SCORES_FILE = "vocab_scores.npy"
+
+def getSelectedColumns(selector):
+    """ Returns the columns of the selected features sorted by their score,
+    the order of vocab_scores.json and of the records
+
+    # Arguments
+        selector: fitted SelectKBest
+
+    # Returns
+        np.array with the columns
+    """
+    columns = selector.get_support(indices=True)
+    return columns[np.argsort(selector.scores_[columns], kind="stable")]
+
+def getVocabScoresArray(ngrams, columns, scores):
+    """ Returns the records of the selected features
+
+    # Arguments
+        ngrams: list of strings
+        columns: np.array with the columns of the features
+        scores: np.array with the scores of the features
+
+    # Returns
+        structured np.array
+    """
+    encoded = [ngram.encode("utf-8") for ngram in ngrams]
+    width = max([len(ngram) for ngram in encoded] + [1])
+    array = np.empty(len(encoded), dtype=[
+        ("column", "<i8"), ("score", "<f8"), ("ngram", "S{}".format(width))])
+    array["column"] = columns
+    array["score"] = scores
+    array["ngram"] = encoded
+    return array
+
+def saveVocabScores(directory, ngrams, columns, scores):
+    np.save(os.path.join(directory, VOCAB_SCORES_FILE),
+            getVocabScoresArray(ngrams, columns, scores))
+
+def loadVocabScores(directory, mmap=True):
+    """ Loads the binary vocab scores
+
+    # Arguments
+        directory: output directory of vectorize
+        mmap: memory-map the file instead of reading it
+
+    # Returns
+        structured np.array (ngram: bytes, see getNgram)
+    """
+    return np.load(os.path.join(directory, VOCAB_SCORES_FILE),
+                   mmap_mode="r" if mmap else None)
+
+def getNgram(vocabScores, i):
+    return vocabScores["ngram"][i].decode("utf-8")
@@ -4,7 +4,11 @@ import argparse
 import json
 import re
 import util.util as util
+import util.table as table
+import util.normalize as normalize
+import util.vocabScores as vocabScores
 import vectorizeHelpers
+import vectorizeHashingHelpers
 import glob
 import pandas as pd
 import numpy as np
@@ -21,14 +25,36 @@ def prepare():
     parser.add_argument('--config',
             required = True,
             help = "File with the configuration, must contain key 'vectorize'")
+    parser.add_argument('--worker',
+            default = 1,
+            help = "Number of workers counting the n-grams of the TfidfVectorizer"
+                   " (default 1: serial TfidfVectorizer)")
+    parser.add_argument('--vectorizer',
+            default = "tfidf",
+            choices = ("tfidf", "hashing"),
+            help = "Bag of words with the vocabulary of a TfidfVectorizer or"
+                   " out-of-core with feature hashing (for corpora whose"
+                   " vocabulary does not fit in memory)")
+    parser.add_argument('--hashFeatures',
+            default = 2**20,
+            help = "Number of hash features with --vectorizer hashing")
+    parser.add_argument('--chunkSize',
+            default = 100000,
+            help = "Number of payloads hashed as one chunk with --vectorizer hashing")
 
     args = parser.parse_args()
     config = util.loadConfig(args.config)
+    config["worker"] = int(args.worker)
+    config["vectorizer"] = {
+        "mode": args.vectorizer,
+        "features": int(args.hashFeatures),
+        "chunkSize": int(args.chunkSize)
+    }
     print("Starting vectorize with config {}".format(config["vectorize"]["hash"]))
     config["logger"] = util.setupLogging(config, "vectorize")
     config["src"] = os.path.join(config["clean"]["baseDir"],
                  config["vectorize"]["cleanHash"],
-                "useable.csv"
+                "useable"
     )
     config["labels"] = util.getLabels(config)[1:]
     config["stop_words"] = util.getStopWords(config)
@@ -53,14 +79,23 @@ def prepare():
 if __name__ == "__main__":
     config = prepare()
     info = { "seed" : config["vectorize"].get("seed", randint(0,2**32-1)) }
-    df = pd.read_csv(config["src"], index_col=0)
+    df = table.readTable(config["src"])
+    # clean normalised the payloads already, this keeps tables of other
+    # settings in line with the inference in use/cli.py
+    normalizer = normalize.getNormalizer(config)
+    df["payload"] = normalizer.normalizeColumn(df.payload.fillna(""))
+    info["normalize"] = normalizer.getSettings()
 
     ########################################  
     # SPLIT
     ########################################
     config["logger"].info("Splitting {} with seed {}".format(config["src"], info["seed"]))
-    # we need to recalculate, because pandas saves the lists as strings.
-    df['labelsI'] = df.labels.apply(lambda x: util.int2bv(x, 21)[1:]).tolist()
+    labelStatistics = util.LabelStatistics(df.labels.values, df.wc.values)
+    if table.getTableFormat(config["src"]) == "csv":
+        # we need to recalculate, because pandas saves the lists as strings.
+        df['labelsI'] = list(labelStatistics.bm)
+    labelStatistics.getDisciplineCounts(config).to_csv(
+        os.path.join(config["vectorize"]["outputDir"], "discipline_counts.csv"))
     df_train, df_test = (train_test_split(
         df,
         random_state=info["seed"],
@@ -73,8 +108,11 @@ if __name__ == "__main__":
     info["noTrain"] = len(df_train)
     info["noTest"] = len(df_test) 
 
-    df_train_train, df_train_val = (train_test_split(
+    # the positions of the rows in df_train, the matrices of train_train and
+    # train_val are sliced from those of train
+    df_train_train, df_train_val, trainTrainRows, trainValRows = (train_test_split(
         df_train,
+        np.arange(len(df_train)),
         random_state=info["seed"],
         test_size=config["vectorize"]["test_size"],
         shuffle = True,
@@ -93,14 +131,28 @@ if __name__ == "__main__":
     ####################
     # BAG OF WORDS
     ####################
-    vectorizer, selector, x = vectorizeHelpers.getVectorizerAndSelector(config, df_train)
+    info["vectorizer"] = config["vectorizer"]
+    if config["vectorizer"]["mode"] == "hashing":
+        vectorizer, selector, x_train_bow, info["allFeatures_bow"] = (
+            vectorizeHelpers.getHashingVectorizerAndSelector(config, df_train))
+        # there is no vocabulary, the features are the hash columns
+        scores = vectorizeHashingHelpers.getSelectedFeaturesAndScores(selector)
+        ngrams = [""] * len(scores)
+    else:
+        vectorizer, selector, x = vectorizeHelpers.getVectorizerAndSelector(config, df_train)
+        scores = vectorizeHelpers.getSelectedVocabularyAndScores(
+            vectorizer.vocabulary_, selector)
+        ngrams = [ngram for (ngram, score) in scores]
+        info["allFeatures_bow"] = x.shape[1]
+        x_train_bow = selector.transform(x).astype(np.float64)
     with open(os.path.join(config["vectorize"]["outputDir"], "vocab_scores.json"), "w") as f:
-        json.dump(
-            vectorizeHelpers.getSelectedVocabularyAndScores(vectorizer.vocabulary_, selector),
-            f
-        )
-    info["allFeatures_bow"] = x.shape[1]
-    x_train_bow = selector.transform(x).astype(np.float64)
+        json.dump(scores, f)
+    vocabScores.saveVocabScores(
+        config["vectorize"]["outputDir"],
+        ngrams,
+        vocabScores.getSelectedColumns(selector),
+        [score for (feature, score) in scores]
+    )
     info["selectedFeatures_bow"] = x_train_bow.shape[1]
 
     scipy.sparse.save_npz(
@@ -109,15 +161,15 @@ if __name__ == "__main__":
     )
     scipy.sparse.save_npz(
         os.path.join(config["vectorize"]["outputDir"], "x_test_bow.npz"),
-        selector.transform(vectorizer.transform(df_test["payload"])).astype(np.float64)
+        selector.transform(vectorizer.transform(df_test[config["payload"]])).astype(np.float64)
     )
     scipy.sparse.save_npz(
         os.path.join(config["vectorize"]["outputDir"], "x_train_train_bow.npz"),
-        selector.transform(vectorizer.transform(df_train_train["payload"])).astype(np.float64)
+        x_train_bow[trainTrainRows]
     )
     scipy.sparse.save_npz(
         os.path.join(config["vectorize"]["outputDir"], "x_train_val_bow.npz"),
-        selector.transform(vectorizer.transform(df_train_val["payload"])).astype(np.float64)
+        x_train_bow[trainValRows]
     )
     vectorizeHelpers.dumpBinary(config, "vectorizer.bin", vectorizer)
     vectorizeHelpers.dumpBinary(config, "selector.bin", selector)
@@ -134,12 +186,13 @@ if __name__ == "__main__":
         os.path.join(config["vectorize"]["outputDir"], "embedding_matrix.npy"),
         embedding_matrix 
     )
+    x_train_emb = pad_sequences(
+        tokenizer.texts_to_sequences(df_train["payload"]),
+        maxlen=config["vectorize"]["maxlen"]
+    )
     np.save(
         os.path.join(config["vectorize"]["outputDir"], "x_train_emb.npy"),
-        pad_sequences(
-            tokenizer.texts_to_sequences(df_train["payload"]),
-            maxlen=config["vectorize"]["maxlen"]
-        )
+        x_train_emb
     )
     np.save(
         os.path.join(config["vectorize"]["outputDir"], "x_test_emb.npy"),
@@ -150,17 +203,11 @@ if __name__ == "__main__":
     )
     np.save(
         os.path.join(config["vectorize"]["outputDir"], "x_train_train_emb.npy"),
-        pad_sequences(
-            tokenizer.texts_to_sequences(df_train_train["payload"]),
-            maxlen=config["vectorize"]["maxlen"]
-        )
+        x_train_emb[trainTrainRows]
     )
     np.save(
         os.path.join(config["vectorize"]["outputDir"], "x_train_val_emb.npy"),
-        pad_sequences(
-            tokenizer.texts_to_sequences(df_train_val["payload"]),
-            maxlen=config["vectorize"]["maxlen"]
-        )
+        x_train_emb[trainValRows]
     )
 
     ####################
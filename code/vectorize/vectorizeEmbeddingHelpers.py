@@ -0,0 +1,140 @@
+import os
+import hashlib
+import numpy as np
+
+"""
+    Memory-mapped word2vec embeddings: the binary word2vec file (e.g. the
+    GoogleNews vectors) is converted once into numpy files next to it
+        <word2vec>.vectors.npy: float32 matrix with one row per word
+        <word2vec>.keys.npy: sorted 64 bit hashes of the (utf-8) words
+        <word2vec>.rows.npy: row of the word of each key
+    which are memory-mapped, so only the rows of the words looked up are read.
+"""
+
+EMBEDDING_FILES = ("vectors", "rows", "keys")
+# Number of words written to the vectors at once during the conversion
+CONVERT_BATCH_SIZE = 100000
+
+def getEmbeddingPath(source, name):
+    return "{}.{}.npy".format(source, name)
+
+def getWordKey(word):
+    """ Returns the 64 bit key of a word (str or utf-8 bytes) """
+    if isinstance(word, str):
+        word = word.encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(word, digest_size=8).digest(), "little")
+
+def iterWord2VecBinary(f, size, bufferSize=2**24):
+    """ Yields the words (bytes) and vectors (bytes) of a binary word2vec file
+        after its header
+    """
+    buffer = b""
+    start = 0
+    while True:
+        end = buffer.find(b" ", start)
+        if end < 0 or end + 1 + size > len(buffer):
+            block = f.read(bufferSize)
+            if not block:
+                break
+            buffer = buffer[start:] + block
+            start = 0
+            continue
+        yield buffer[start:end].lstrip(b"\n"), buffer[end + 1:end + 1 + size]
+        start = end + 1 + size
+
+def convertWord2Vec(source):
+    """ Converts a binary word2vec file into the memory-mappable numpy files
+
+    # Arguments
+        source: path of the binary word2vec file
+    """
+    with open(source, "rb") as f:
+        (nWords, dim) = [int(value) for value in f.readline().split()]
+        tmp = getEmbeddingPath(source, "vectors") + ".tmp"
+        vectors = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32,
+                                            shape=(nWords, dim))
+        keys = np.zeros(nWords, dtype=np.uint64)
+        row = 0
+        batch = []
+        for (word, vector) in iterWord2VecBinary(f, dim * 4):
+            keys[row + len(batch)] = getWordKey(word)
+            batch.append(vector)
+            if len(batch) == CONVERT_BATCH_SIZE:
+                vectors[row:row + len(batch)] = np.frombuffer(
+                    b"".join(batch), dtype="<f4").reshape(len(batch), dim)
+                row += len(batch)
+                batch = []
+        if batch:
+            vectors[row:row + len(batch)] = np.frombuffer(
+                b"".join(batch), dtype="<f4").reshape(len(batch), dim)
+            row += len(batch)
+        vectors.flush()
+        del vectors
+    if row != nWords:
+        os.remove(tmp)
+        raise ValueError("{} has {} instead of {} words".format(source, row, nWords))
+    os.replace(tmp, getEmbeddingPath(source, "vectors"))
+
+    # the first row of a word if it occurs several times
+    (keys, rows) = np.unique(keys, return_index=True)
+    # keys last, their existence marks a finished conversion
+    for (name, payload) in (("rows", rows.astype(np.int64)), ("keys", keys)):
+        with open(getEmbeddingPath(source, name) + ".tmp", "wb") as f:
+            np.save(f, payload)
+        os.replace(getEmbeddingPath(source, name) + ".tmp", getEmbeddingPath(source, name))
+
+class WordEmbeddings(object):
+    """
+        Memory-mapped embeddings of convertWord2Vec
+    """
+    def __init__(self, source):
+        (self.vectors, self.rows, self.keys) = [
+            np.load(getEmbeddingPath(source, name), mmap_mode="r")
+            for name in EMBEDDING_FILES]
+
+    def getRows(self, words):
+        """ Returns the rows of the words in the vectors (-1 if unknown)
+
+        # Arguments
+            words: list of strings
+
+        # Returns
+            np.array
+        """
+        keys = np.fromiter((getWordKey(word) for word in words),
+                           dtype=np.uint64, count=len(words))
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        return np.where(found, self.rows[positions], -1)
+
+    def getEmbeddingMatrix(self, wordIndex):
+        """ Returns the embedding matrix of a word index, zero for unknown words
+
+        # Arguments
+            wordIndex: dict word: index (>= 1) of the keras Tokenizer
+
+        # Returns
+            np.array with one row per index (row 0 is zero)
+        """
+        words = list(wordIndex.keys())
+        indices = np.fromiter(wordIndex.values(), dtype=np.int64, count=len(words))
+        rows = self.getRows(words)
+        found = rows >= 0
+        # read the rows in the order of the file
+        order = np.argsort(rows[found])
+        matrix = np.zeros((len(words) + 1, self.vectors.shape[1]))
+        matrix[indices[found][order]] = self.vectors[rows[found][order]]
+        return matrix
+
+def loadWordEmbeddings(source):
+    """ Returns the embeddings of a binary word2vec file, converts it on first use
+
+    # Arguments
+        source: path of the binary word2vec file
+
+    # Returns
+        WordEmbeddings
+    """
+    if not os.path.exists(getEmbeddingPath(source, "keys")):
+        convertWord2Vec(source)
+    return WordEmbeddings(source)
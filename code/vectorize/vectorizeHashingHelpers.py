@@ -0,0 +1,166 @@
+import os
+import numpy as np
+import scipy.sparse
+from scipy import special
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.feature_selection import SelectKBest, f_classif
+from sklearn.pipeline import Pipeline
+from util.vocabScores import getSelectedColumns
+
+"""
+    Out-of-core bag of words (vectorize --vectorizer hashing): the payloads are
+    hashed chunk by chunk into config["vectorizer"]["features"] columns instead
+    of building the vocabulary of a TfidfVectorizer. The hashed counts of a
+    chunk are kept in a file, the document frequencies, the idf and the ANOVA
+    F-values of f_classif are accumulated over the chunks. The memory is bounded
+    by the chunk size and the hash space.
+"""
+
+def getHashingVectorizer(config, kwargs):
+    """ Returns the (unfitted) hashing vectorizer
+
+    # Arguments
+        config: dict with the configuration (key: vectorizer)
+        kwargs: dict with the arguments of the TfidfVectorizer, min_df is
+                applied by fitHashingVectorizer
+
+    # Returns
+        sklearn Pipeline of a HashingVectorizer and a TfidfTransformer
+    """
+    kwargs = {key: value for key, value in kwargs.items() if key != "min_df"}
+    return Pipeline([
+        ("hashing", HashingVectorizer(
+            n_features=config["vectorizer"]["features"],
+            alternate_sign=False,
+            norm=None,
+            **kwargs
+        )),
+        ("tfidf", TfidfTransformer())
+    ])
+
+def iterChunks(payloads, chunkSize):
+    for start in range(0, len(payloads), chunkSize):
+        yield payloads[start:start + chunkSize]
+
+def fitHashingVectorizer(config, vectorizer, payloads, directory):
+    """ Hashes the payloads chunk by chunk and sets the idf of the vectorizer
+
+    # Arguments
+        config: dict with the configuration (keys: vectorize, vectorizer)
+        vectorizer: Pipeline of getHashingVectorizer
+        payloads: pd.Series with the payloads
+        directory: directory to keep the hashed counts of the chunks in
+
+    # Returns
+        list with the files of the hashed counts, number of features of at
+        least minDocFreq documents
+    """
+    hashing = vectorizer.named_steps["hashing"]
+    nFeatures = config["vectorizer"]["features"]
+    documentFrequency = np.zeros(nFeatures, dtype=np.int64)
+    files = []
+    for chunk in iterChunks(payloads, config["vectorizer"]["chunkSize"]):
+        counts = hashing.transform(chunk).tocsr()
+        documentFrequency += np.bincount(counts.indices, minlength=nFeatures)
+        files.append(os.path.join(directory, "counts.{:06d}.npz".format(len(files))))
+        scipy.sparse.save_npz(files[-1], counts, compressed=False)
+
+    # the same weights as TfidfVectorizer (smooth_idf) with min_df
+    minDocFreq = config["vectorize"]["minDocFreq"]
+    if isinstance(minDocFreq, float):
+        minDocFreq = minDocFreq * len(payloads)
+    used = (documentFrequency >= minDocFreq) & (documentFrequency > 0)
+    idf = np.log((len(payloads) + 1) / (documentFrequency + 1.0)) + 1.0
+    idf[~used] = 0.0
+    tfidf = vectorizer.named_steps["tfidf"]
+    tfidf.idf_ = idf
+    tfidf.n_features_in_ = nFeatures
+    return files, int(used.sum())
+
+def iterTfidfChunks(vectorizer, files):
+    tfidf = vectorizer.named_steps["tfidf"]
+    for name in files:
+        x = scipy.sparse.csr_matrix(tfidf.transform(scipy.sparse.load_npz(name)))
+        x.eliminate_zeros()
+        yield x
+
+class AnovaStatistics(object):
+    """
+        Accumulates the sums of f_classif (sklearn f_oneway) over row chunks
+    """
+    def __init__(self, nFeatures, nClasses):
+        self.counts = np.zeros(nClasses, dtype=np.int64)
+        self.sums = np.zeros((nClasses, nFeatures))
+        self.squares = np.zeros(nFeatures)
+
+    def add(self, x, classes):
+        """ Adds a chunk
+
+        # Arguments
+            x: csr_matrix with the rows of the chunk
+            classes: np.array with the class index (0..nClasses-1) of the rows
+        """
+        nClasses = len(self.counts)
+        self.counts += np.bincount(classes, minlength=nClasses)
+        indicator = scipy.sparse.csr_matrix(
+            (np.ones(len(classes)), (classes, np.arange(len(classes)))),
+            shape=(nClasses, len(classes))
+        )
+        self.sums += (indicator @ x).toarray()
+        self.squares += np.asarray(x.multiply(x).sum(axis=0)).ravel()
+
+    def getScores(self):
+        """ Returns the F-values and p-values like f_classif
+
+        # Returns
+            np.array with the F-values, np.array with the p-values
+        """
+        counts = self.counts[self.counts > 0]
+        sums = self.sums[self.counts > 0]
+        nSamples = float(counts.sum())
+        squareOfSums = sums.sum(axis=0) ** 2
+        sstot = self.squares - squareOfSums / nSamples
+        ssbn = ((sums ** 2) / counts[:, None]).sum(axis=0) - squareOfSums / nSamples
+        sswn = sstot - ssbn
+        dfbn = len(counts) - 1
+        dfwn = nSamples - len(counts)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            f = (ssbn / float(dfbn)) / (sswn / float(dfwn))
+        return f, special.fdtrc(dfbn, dfwn, f)
+
+def selectHashedFeatures(config, vectorizer, files, classes, k):
+    """ Fits the selector on the hashed chunks and returns the selected features
+
+    # Arguments
+        config: dict with the configuration (key: vectorizer)
+        vectorizer: Pipeline fitted by fitHashingVectorizer
+        files: list with the files of the hashed counts
+        classes: np.array with the class (df.bl) of the rows
+        k: number of features to select
+
+    # Returns
+        SelectKBest, csr_matrix with the selected features of all rows
+    """
+    (labels, classes) = np.unique(classes, return_inverse=True)
+    statistics = AnovaStatistics(config["vectorizer"]["features"], len(labels))
+    start = 0
+    for x in iterTfidfChunks(vectorizer, files):
+        statistics.add(x, classes[start:start + x.shape[0]])
+        start += x.shape[0]
+
+    selector = SelectKBest(f_classif, k=k)
+    (selector.scores_, selector.pvalues_) = statistics.getScores()
+    selector.n_features_in_ = config["vectorizer"]["features"]
+    selected = [selector.transform(x) for x in iterTfidfChunks(vectorizer, files)]
+    return selector, scipy.sparse.vstack(selected, format="csr").astype(np.float64)
+
+def getSelectedFeaturesAndScores(selector):
+    """ Returns the selected hash features (column index) and their scores
+
+    # Arguments
+        selector: SelectKBest of selectHashedFeatures
+
+    # Returns
+        list of [index, score] sorted by the score
+    """
+    return [[int(idx), float(selector.scores_[idx])] for idx in getSelectedColumns(selector)]
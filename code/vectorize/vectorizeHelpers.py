@@ -4,6 +4,7 @@ import json
 import os
 import re
 import pickle
+import tempfile
 import math
 import nltk
 import scipy.sparse
@@ -11,13 +12,15 @@ from nltk import util, stem
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.feature_selection import SelectKBest
 from sklearn.feature_selection import f_classif
-from gensim.models import KeyedVectors
 from keras.preprocessing.text import Tokenizer
 
 from nltk.stem.lancaster import LancasterStemmer
 from nltk.stem.porter import PorterStemmer
-
-from operator import itemgetter
+from util.util import loadTokenizer, LabelStatistics
+from util.vocabScores import getSelectedColumns
+import vectorizeEmbeddingHelpers
+import vectorizeHashingHelpers
+import vectorizeParallelHelpers
 
 def getTokenizerAndEmbeddingMatrix(config, payload):
     """ Vectorize the payload in df as embeddings
@@ -35,17 +38,11 @@ def getTokenizerAndEmbeddingMatrix(config, payload):
     tokenizer = Tokenizer(lower=config["vectorize"]["case_sensitivity"])
     tokenizer.fit_on_texts(payload)
 
-    model = KeyedVectors.load_word2vec_format(
-        os.path.join(config["vectorize"]["baseDir"], config["vectorize"]["word2vec"]),
-        binary=True
+    # converted once into memory-mapped numpy files, see vectorizeEmbeddingHelpers
+    embeddings = vectorizeEmbeddingHelpers.loadWordEmbeddings(
+        os.path.join(config["vectorize"]["baseDir"], config["vectorize"]["word2vec"])
     )
-
-    embedding_matrix = np.zeros((len(tokenizer.word_index)+1, 300))
-    for word, i in tokenizer.word_index.items():
-        try:
-            embedding_matrix[i] = model.wv[word]
-        except KeyError:
-            pass
+    embedding_matrix = embeddings.getEmbeddingMatrix(tokenizer.word_index)
     return tokenizer, embedding_matrix
 
 def dumpBinary(config, name, payload):
@@ -72,9 +69,9 @@ def loadBinary(config, name):
     with open(os.path.join(config["vectorize"]["outputDir"], name), "rb") as f:
         return pickle.load(f)
 
-def getVectorizerAndSelector(config, df):
+def getVectorizerArguments(config):
     kwargs = {
-            'ngram_range': config["vectorize"]["ngramRange"],
+            'ngram_range': tuple(config["vectorize"]["ngramRange"]),
             'dtype': np.float64,
             'strip_accents': 'unicode',
             'decode_error': 'replace',
@@ -83,7 +80,7 @@ def getVectorizerAndSelector(config, df):
             'stop_words': config["stop_words"]
     }
     if config["vectorize"]["stemming"] != "none":
-        nltk.download('punkt')
+        loadTokenizer(config)
         if config["vectorize"]["stemming"] == "lancaster":
             stemmer = LancasterStemmer()
         if config["vectorize"]["stemming"] == "porter":
@@ -92,45 +89,55 @@ def getVectorizerAndSelector(config, df):
         config["stop_words"] = (
             [util.stem(stop_word, stemmer) for stop_word in ( 
                 config["stop_words"])])
-    vectorizer =  TfidfVectorizer(**kwargs)
-    x = vectorizer.fit_transform(df[config["payload"]])
+    return kwargs
+
+def getTopK(config, nFeatures):
     if config["vectorize"]["feature_selection"]["mode"] == "multipleOfLabels":
         topK = len(config["labels"] * config["vectorize"]["feature_selection"]["value"])
     elif config["vectorize"]["feature_selection"]["mode"] == "fractionOfFeatures":
-        topK = math.floor(x.shape[1]/config["vectorize"]["feature_selection"]["value"])
+        topK = math.floor(nFeatures/config["vectorize"]["feature_selection"]["value"])
     elif config["vectorize"]["feature_selection"]["mode"] == "static":
         topK = config["vectorize"]["feature_selection"]["value"]
+    return min(topK, nFeatures)
 
-    selector = SelectKBest(f_classif, k=min(topK, x.shape[1]))
+def getVectorizerAndSelector(config, df):
+    if config.get("worker", 1) > 1:
+        vectorizer, x = vectorizeParallelHelpers.fitTransformParallel(
+            config, getVectorizerArguments(config), df[config["payload"]])
+    else:
+        vectorizer =  TfidfVectorizer(**getVectorizerArguments(config))
+        x = vectorizer.fit_transform(df[config["payload"]])
+    selector = SelectKBest(f_classif, k=getTopK(config, x.shape[1]))
     # we need the labels, otherwise we cannot guarantee that the selector selects
     # something for every label ?
     selector.fit(x, df.bl)
     return vectorizer, selector, x
 
+def getHashingVectorizerAndSelector(config, df):
+    """ Out-of-core variant of getVectorizerAndSelector, see vectorizeHashingHelpers
+
+    # Arguments
+        config: a dictionary with the configuration (keys: vectorize, vectorizer)
+        df: a pandas dataFrame with the data (keys: config["payload"], bl)
+
+    # Returns
+        The vectorizer, the selector, the selected features of df as a sparse
+        matrix and the number of features
+    """
+    vectorizer = vectorizeHashingHelpers.getHashingVectorizer(
+        config, getVectorizerArguments(config))
+    with tempfile.TemporaryDirectory(dir=config["vectorize"]["outputDir"]) as directory:
+        files, nFeatures = vectorizeHashingHelpers.fitHashingVectorizer(
+            config, vectorizer, df[config["payload"]], directory)
+        selector, x = vectorizeHashingHelpers.selectHashedFeatures(
+            config, vectorizer, files, df.bl.values, getTopK(config, nFeatures))
+    return vectorizer, selector, x, nFeatures
+
 def getDisciplineCounts(config, df):
-    t = np.zeros((20,20), np.int32)
-    for i in range(0,20):
-        label = i + 1
-        for j in range(0,20):
-            if j < i:
-                continue
-            clabel = j + 1
-            mask = 0
-            mask |= 1 << label
-            mask |= 1 << clabel
-            t[i][j] = df[df.labels & mask == mask].labels.count()
-    counts = pd.DataFrame(t)
-    counts.columns = range(1,21)
-    rows = { i: config["labels"][i] for i in range(0,len(config["labels"])) }
-    counts.rename(index = rows, inplace=True)
-    return counts
+    return LabelStatistics(df.labels.values).getDisciplineCounts(config)
 
 def getSelectedVocabularyAndScores(vocab, selector):
-     retval = []
-     keys = list(vocab.keys())
-     values = list(vocab.values())
-     for idx in selector.get_support(indices=True):
-         ngram = keys[values.index(idx)]
-         score = selector.scores_[idx]
-         retval.append([ngram, score])
-     return sorted(retval, key=itemgetter(1))
+    # invert the vocabulary once instead of searching it per selected feature
+    ngrams = np.empty(len(vocab), dtype=object)
+    ngrams[np.fromiter(vocab.values(), dtype=np.int64, count=len(vocab))] = list(vocab.keys())
+    return [[ngrams[idx], selector.scores_[idx]] for idx in getSelectedColumns(selector)]
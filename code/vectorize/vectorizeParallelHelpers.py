@@ -0,0 +1,117 @@
+import heapq
+import itertools
+import numpy as np
+import scipy.sparse
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+"""
+    Parallel fitting of the TfidfVectorizer (vectorize --worker): the payloads
+    are divided into one shard per worker, each worker counts the n-grams of its
+    shard with a CountVectorizer. The sorted n-grams of the shards are merged
+    as lists (k-way merge), the counts are mapped onto the merged vocabulary, and
+    min_df and the idf are applied to all rows, so vocabulary and idf equal
+    those of the serial TfidfVectorizer.fit_transform.
+"""
+
+def countShard(kwargs, payloads):
+    """ Counts the n-grams of a shard (runs in the workers)
+
+    # Arguments
+        kwargs: dict with the arguments of the TfidfVectorizer
+        payloads: list with the payloads of the shard
+
+    # Returns
+        list with the sorted n-grams, csr_matrix with the counts (no n-grams
+        and no columns if the shard only contains stop words)
+    """
+    kwargs = {key: value for key, value in kwargs.items() if key != "min_df"}
+    vectorizer = CountVectorizer(**kwargs)
+    try:
+        counts = vectorizer.fit_transform(payloads)
+    except ValueError as e:
+        if "empty vocabulary" not in str(e):
+            raise
+        return [], scipy.sparse.csr_matrix((len(payloads), 0), dtype=np.int64)
+    return vectorizer.get_feature_names_out().tolist(), counts.tocsr()
+
+def getShards(payloads, nShards):
+    bounds = np.linspace(0, len(payloads), nShards + 1).astype(int)
+    return [payloads[start:end] for (start, end) in zip(bounds[:-1], bounds[1:])
+            if end > start]
+
+def mergeShards(shards):
+    """ Maps the counts of the shards onto the merged vocabulary, the sorted
+        n-grams of the shards are merged in a single pass
+
+    # Arguments
+        shards: list of (list with the sorted n-grams, csr_matrix with the counts)
+
+    # Returns
+        list with the sorted n-grams, csr_matrix with the counts
+    """
+    ngrams = []
+    columns = [np.empty(len(shardNgrams), dtype=np.int64) for (shardNgrams, counts) in shards]
+    positions = [0] * len(shards)
+    for (ngram, shard) in heapq.merge(*[zip(shardNgrams, itertools.repeat(shard))
+                                        for (shard, (shardNgrams, counts)) in enumerate(shards)]):
+        if not ngrams or ngrams[-1] != ngram:
+            ngrams.append(ngram)
+        columns[shard][positions[shard]] = len(ngrams) - 1
+        positions[shard] += 1
+    matrices = []
+    for ((shardNgrams, counts), shardColumns) in zip(shards, columns):
+        matrices.append(scipy.sparse.csr_matrix(
+            (counts.data, shardColumns[counts.indices], counts.indptr),
+            shape=(counts.shape[0], len(ngrams))
+        ))
+    return ngrams, scipy.sparse.vstack(matrices, format="csr")
+
+def limitFeatures(ngrams, counts, minDocFreq):
+    """ Removes the n-grams of less than minDocFreq documents like
+        TfidfVectorizer (min_df)
+
+    # Returns
+        list with the n-grams, csr_matrix with the counts
+    """
+    if isinstance(minDocFreq, float):
+        minDocFreq = minDocFreq * counts.shape[0]
+    mask = np.bincount(counts.indices, minlength=counts.shape[1]) >= minDocFreq
+    if mask.all():
+        return ngrams, counts
+    if not mask.any():
+        raise ValueError("After pruning, no terms remain. Try a lower minDocFreq.")
+    columns = np.where(mask)[0]
+    return [ngrams[column] for column in columns], counts[:, columns]
+
+def fitTransformParallel(config, kwargs, payloads):
+    """ Parallel TfidfVectorizer(**kwargs).fit_transform(payloads)
+
+    # Arguments
+        config: dict with the configuration (key: worker)
+        kwargs: dict with the arguments of the TfidfVectorizer
+        payloads: pd.Series with the payloads
+
+    # Returns
+        fitted TfidfVectorizer, csr_matrix with the tf-idf of the payloads
+    """
+    shards = getShards(list(payloads), config["worker"])
+    with ProcessPoolExecutor(max_workers = config["worker"]) as ex:
+        shards = list(ex.map(countShard, [kwargs] * len(shards), shards))
+    ngrams, counts = mergeShards(shards)
+    if not ngrams:
+        raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+    ngrams, counts = limitFeatures(ngrams, counts, kwargs.get("min_df", 1))
+    counts.sort_indices()
+
+    vectorizer = TfidfVectorizer(**kwargs)
+    vectorizer.vocabulary_ = {ngram: column for (column, ngram) in enumerate(ngrams)}
+    vectorizer.fixed_vocabulary_ = False
+    tfidf = TfidfTransformer(
+        norm=vectorizer.norm,
+        use_idf=vectorizer.use_idf,
+        smooth_idf=vectorizer.smooth_idf,
+        sublinear_tf=vectorizer.sublinear_tf
+    ).fit(counts)
+    vectorizer.idf_ = tfidf.idf_
+    return vectorizer, tfidf.transform(counts, copy=False)